@@ -0,0 +1,436 @@
+"""Benchmark of the N-dimensional interpolation kernels against the fixed-dimension ones,
+and of the multi-threaded kernels against the serial ones, and of lookups with a
+cell cache against lookups without, along a random walk.
+
+Grids are synthetic, with shapes similar to those of the MIST isochrone grid
+(age, feh, eep; irregular, irregular, uniform) and bolometric correction grid
+(Teff, logg, [Fe/H], Av), so no model data needs to be downloaded.
+
+    python benchmarks/bench_interp.py [--n-points N] [--repeat R]
+"""
+import argparse
+import time
+
+import numpy as np
+import numba as nb
+
+from isochrones.interp import (
+    find_index,
+    interp_value_nd,
+    interp_values_nd,
+    interp_values_nd_parallel,
+    grid_axes,
+    grid_strides,
+    uniform_steps,
+    dense_rows,
+    CellCache,
+)
+from isochrones.mags import interp_mags, interp_mags_parallel
+
+
+# Fixed-dimension kernels, as they were before `interp_value_nd`, for comparison
+
+
+@nb.jit(nopython=True)
+def find_indices_3d(x0, x1, x2, ii0, ii1, ii2, steps):
+
+    n0 = len(ii0)
+    n1 = len(ii1)
+    n2 = len(ii2)
+
+    indices = np.empty(3, dtype=nb.uint32)
+    norm_distances = np.empty(3, dtype=nb.float64)
+
+    if (
+        (x0 < ii0[0])
+        or (x0 > ii0[n0 - 1])
+        or (x1 < ii1[0])
+        or (x1 > ii1[n1 - 1])
+        or (x2 < ii2[0])
+        or (x2 > ii2[n2 - 1])
+    ):
+        return indices, norm_distances, True  # Out of bounds
+
+    ix, eq = find_index(ii0, x0, steps[0])
+    if eq:
+        indices[0] = ix
+        norm_distances[0] = 0
+    else:
+        indices[0] = ix - 1
+        c0 = ii0[ix - 1]
+        norm_distances[0] = (x0 - c0) / (ii0[ix] - c0)
+
+    ix, eq = find_index(ii1, x1, steps[1])
+    if eq:
+        indices[1] = ix
+        norm_distances[1] = 0
+    else:
+        indices[1] = ix - 1
+        c0 = ii1[ix - 1]
+        norm_distances[1] = (x1 - c0) / (ii1[ix] - c0)
+
+    ix, eq = find_index(ii2, x2, steps[2])
+    if eq:
+        indices[2] = ix
+        norm_distances[2] = 0
+    else:
+        indices[2] = ix - 1
+        c0 = ii2[ix - 1]
+        norm_distances[2] = (x2 - c0) / (ii2[ix] - c0)
+
+    return indices, norm_distances, False
+
+
+@nb.jit(nopython=True)
+def find_indices_4d(x0, x1, x2, x3, ii0, ii1, ii2, ii3, steps):
+
+    n0 = len(ii0)
+    n1 = len(ii1)
+    n2 = len(ii2)
+    n3 = len(ii3)
+
+    indices = np.empty(4, dtype=nb.uint32)
+    norm_distances = np.empty(4, dtype=nb.float64)
+
+    if (
+        (x0 < ii0[0])
+        or (x0 > ii0[n0 - 1])
+        or (x1 < ii1[0])
+        or (x1 > ii1[n1 - 1])
+        or (x2 < ii2[0])
+        or (x2 > ii2[n2 - 1])
+        or (x3 < ii3[0])
+        or (x3 > ii3[n3 - 1])
+    ):
+        return indices, norm_distances, True  # Out of bounds
+
+    ix, eq = find_index(ii0, x0, steps[0])
+    if eq:
+        indices[0] = ix
+        norm_distances[0] = 0
+    else:
+        indices[0] = ix - 1
+        c0 = ii0[ix - 1]
+        norm_distances[0] = (x0 - c0) / (ii0[ix] - c0)
+
+    ix, eq = find_index(ii1, x1, steps[1])
+    if eq:
+        indices[1] = ix
+        norm_distances[1] = 0
+    else:
+        indices[1] = ix - 1
+        c0 = ii1[ix - 1]
+        norm_distances[1] = (x1 - c0) / (ii1[ix] - c0)
+
+    ix, eq = find_index(ii2, x2, steps[2])
+    if eq:
+        indices[2] = ix
+        norm_distances[2] = 0
+    else:
+        indices[2] = ix - 1
+        c0 = ii2[ix - 1]
+        norm_distances[2] = (x2 - c0) / (ii2[ix] - c0)
+
+    ix, eq = find_index(ii3, x3, steps[3])
+    if eq:
+        indices[3] = ix
+        norm_distances[3] = 0
+    else:
+        indices[3] = ix - 1
+        c0 = ii3[ix - 1]
+        norm_distances[3] = (x3 - c0) / (ii3[ix] - c0)
+
+    return indices, norm_distances, False
+
+
+@nb.jit(nopython=True)
+def interp_value_3d(x0, x1, x2, grid, icols, ii0, ii1, ii2, steps):
+    if x0 != x0 or x1 != x1 or x2 != x2:
+        return np.array([np.nan for i in icols])
+
+    indices, norm_distances, out_of_bounds = find_indices_3d(x0, x1, x2, ii0, ii1, ii2, steps)
+
+    if out_of_bounds:
+        return np.array([np.nan for i in icols])
+    # The following should be equivalent to
+    #  edges = np.array(list(itertools.product(*[[i, i+1] for i in indices])))
+
+    ndim = 3
+    n_edges = 2 ** ndim
+    edges = np.zeros((n_edges, ndim))
+    for i in range(n_edges):
+        for j in range(ndim):
+            edges[i, j] = indices[j] + ((i >> (ndim - 1 - j)) & 1)  # woohoo!
+
+    n_values = len(icols)
+    values = np.zeros(n_values, dtype=nb.float64)
+
+    for j in range(n_edges):
+        edge_indices = np.zeros(ndim, dtype=nb.uint32)
+        for k in range(ndim):
+            edge_indices[k] = edges[j, k]
+
+        weight = 1.0
+        for ei, i, yi in zip(edge_indices, indices, norm_distances):
+            if ei == i:
+                weight *= 1 - yi
+            else:
+                weight *= yi
+
+        for i_icol in range(n_values):
+            icol = icols[i_icol]
+
+            # Now, get the value; this is why general ND doesn't work
+            grid_indices = (edge_indices[0], edge_indices[1], edge_indices[2], icol)
+            values[i_icol] += grid[grid_indices] * weight
+
+    return values
+
+
+@nb.jit(nopython=True)
+def interp_value_4d(x0, x1, x2, x3, grid, icols, ii0, ii1, ii2, ii3, steps):
+    if x0 != x0 or x1 != x1 or x2 != x2 or x3 != x3:
+        return np.array([np.nan for i in icols])
+
+    indices, norm_distances, out_of_bounds = find_indices_4d(x0, x1, x2, x3, ii0, ii1, ii2, ii3, steps)
+
+    if out_of_bounds:
+        return np.array([np.nan for i in icols])
+
+    # The following should be equivalent to
+    #  edges = np.array(list(itertools.product(*[[i, i+1] for i in indices])))
+
+    ndim = 4
+    n_edges = 2 ** ndim
+    edges = np.zeros((n_edges, ndim))
+    for i in range(n_edges):
+        for j in range(ndim):
+            edges[i, j] = indices[j] + ((i >> (ndim - 1 - j)) & 1)  # woohoo!
+
+    n_values = len(icols)
+    values = np.zeros(n_values, dtype=nb.float64)
+
+    for j in range(n_edges):
+        edge_indices = np.zeros(ndim, dtype=nb.uint32)
+        for k in range(ndim):
+            edge_indices[k] = edges[j, k]
+
+        weight = 1.0
+        for ei, i, yi in zip(edge_indices, indices, norm_distances):
+            if ei == i:
+                weight *= 1 - yi
+            else:
+                weight *= yi
+
+        for i_icol in range(n_values):
+            icol = icols[i_icol]
+
+            # Now, get the value; this is why general ND doesn't work
+            grid_indices = (edge_indices[0], edge_indices[1], edge_indices[2], edge_indices[3], icol)
+            values[i_icol] += grid[grid_indices] * weight
+
+    return values
+
+
+@nb.jit(nopython=True)
+def interp_values_3d(xx0, xx1, xx2, grid, icols, ii0, ii1, ii2, steps):
+    """xx1, xx2, xx3 are all arrays at which values are desired
+
+
+    """
+
+    N = len(xx0)
+    ncols = len(icols)
+    results = np.empty((N, ncols), dtype=nb.float64)
+    for i in range(N):
+        res = interp_value_3d(xx0[i], xx1[i], xx2[i], grid, icols, ii0, ii1, ii2, steps)
+        for j in range(ncols):
+            results[i, j] = res[j]
+
+    return results
+
+
+@nb.jit(nopython=True)
+def interp_values_4d(xx0, xx1, xx2, xx3, grid, icols, ii0, ii1, ii2, ii3, steps):
+    """xx1, xx2, xx3 are all arrays at which values are desired
+
+
+    """
+
+    N = len(xx0)
+    ncols = len(icols)
+    results = np.empty((N, ncols), dtype=nb.float64)
+    for i in range(N):
+        res = interp_value_4d(xx0[i], xx1[i], xx2[i], xx3[i], grid, icols, ii0, ii1, ii2, ii3, steps)
+        for j in range(ncols):
+            results[i, j] = res[j]
+
+    return results
+
+
+
+def make_grid(index_columns, n_cols, seed=0):
+    rng = np.random.RandomState(seed)
+    shape = tuple(len(ii) for ii in index_columns) + (n_cols,)
+    grid = rng.normal(size=shape)
+    layout = (
+        grid.reshape(-1),
+        *grid_axes(index_columns),
+        uniform_steps(index_columns),
+        grid_strides(shape),
+        dense_rows(),
+    )
+    return grid, layout
+
+
+def random_points(index_columns, n, seed=1):
+    rng = np.random.RandomState(seed)
+    return np.array([rng.uniform(ii[0], ii[-1], size=n) for ii in index_columns])
+
+
+@nb.jit(nopython=True)
+def fixed_dim_interp_mags(pars, model_grid, model_ii, model_steps, bc_grid, bc_cols, bc_ii, bc_steps):
+    """interp_mags as it was implemented with the 3-d and 4-d kernels
+    """
+    n = pars.shape[1]
+    mags = np.empty((n, len(bc_cols)))
+    icols = np.array([0, 1, 2, 3])
+    for i in range(n):
+        props = interp_value_3d(
+            pars[0, i], pars[1, i], pars[2, i], model_grid, icols, model_ii[0], model_ii[1], model_ii[2], model_steps
+        )
+        bc = interp_value_4d(
+            props[0], props[1], props[2], pars[4, i], bc_grid, bc_cols, bc_ii[0], bc_ii[1], bc_ii[2], bc_ii[3], bc_steps
+        )
+        for j in range(len(bc_cols)):
+            mags[i, j] = props[3] + 5 * np.log10(pars[3, i] / 10.0) - bc[j]
+    return mags
+
+
+@nb.jit(nopython=True)
+def walk_values(walk, icols, grid, axes, lengths, steps, strides, rows):
+    total = 0.0
+    for i in range(walk.shape[0]):
+        total += interp_value_nd(walk[i], icols, grid, axes, lengths, steps, strides, rows)[0]
+    return total
+
+
+@nb.jit(nopython=True)
+def walk_values_cached(walk, icols, grid, axes, lengths, steps, strides, rows, cache):
+    total = 0.0
+    for i in range(walk.shape[0]):
+        total += interp_value_nd(walk[i], icols, grid, axes, lengths, steps, strides, rows, cache)[0]
+    return total
+
+
+def best_time(fn, args, repeat):
+    fn(*args)  # compile
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def report(name, t_fixed, t_nd, n):
+    print(
+        "{:<24s} {:>12.3f} {:>12.3f} {:>8.2f}".format(name, t_fixed / n * 1e9, t_nd / n * 1e9, t_fixed / t_nd)
+    )
+
+
+def main(n_points=100000, repeat=5):
+    ages = np.concatenate([np.arange(5.0, 8.0, 0.1), np.arange(8.0, 10.3, 0.03)])
+    fehs = np.array([-4, -3.5, -3, -2.5, -2, -1.75, -1.5, -1.25, -1, -0.75, -0.5, -0.25, 0, 0.25, 0.5])
+    eeps = np.arange(1, 1711, dtype=float)
+    model_ii = (ages, fehs, eeps)
+    model_grid, model_layout = make_grid(model_ii, 4)
+    model_steps = uniform_steps(model_ii)
+
+    Teffs = np.concatenate([np.arange(2500.0, 13000, 250), np.arange(13000.0, 50001, 1000)])
+    loggs = np.arange(-4, 9.51, 0.5)
+    bc_fehs = np.array([-4, -3, -2, -1.5, -1, -0.75, -0.5, -0.25, 0, 0.25, 0.5, 0.75])
+    AVs = np.arange(0, 6.01, 0.25)
+    bc_ii = (Teffs, loggs, bc_fehs, AVs)
+    bc_grid, bc_layout = make_grid(bc_ii, 3)
+    bc_steps = uniform_steps(bc_ii)
+    bc_cols = np.arange(3)
+
+    print("ns per point; {} points, best of {}".format(n_points, repeat))
+    print("{:<24s} {:>12s} {:>12s} {:>8s}".format("", "fixed-dim", "N-d", "ratio"))
+
+    icols = np.arange(4)
+    pts = random_points(model_ii, n_points)
+    args = (*pts, model_grid, icols, *model_ii, model_steps)
+    t_fixed = best_time(interp_values_3d, args, repeat)
+    t_nd = best_time(interp_values_nd, (pts, icols) + model_layout, repeat)
+    assert np.allclose(interp_values_3d(*args), interp_values_nd(pts, icols, *model_layout), equal_nan=True)
+    report("3d values", t_fixed, t_nd, n_points)
+
+    pts = random_points(bc_ii, n_points)
+    args = (*pts, bc_grid, bc_cols, *bc_ii, bc_steps)
+    t_fixed = best_time(interp_values_4d, args, repeat)
+    t_nd = best_time(interp_values_nd, (pts, bc_cols) + bc_layout, repeat)
+    assert np.allclose(interp_values_4d(*args), interp_values_nd(pts, bc_cols, *bc_layout), equal_nan=True)
+    report("4d values", t_fixed, t_nd, n_points)
+
+    # Single points, including the python-level call overhead
+    n_single = min(n_points, 10000)
+    pts = random_points(model_ii, n_single)
+    x0, x1, x2 = [float(x) for x in pts[:, 0]]
+    args = (x0, x1, x2, model_grid, icols, *model_ii, model_steps)
+    t_fixed = best_time(lambda: [interp_value_3d(*args) for _ in range(n_single)], (), repeat)
+    point = pts[:, 0].copy()
+    t_nd = best_time(lambda: [interp_value_nd(point, icols, *model_layout) for _ in range(n_single)], (), repeat)
+    report("3d single value", t_fixed, t_nd, n_single)
+
+    # Magnitudes: model grid, then BC grid, at (age, feh, eep, distance, AV)
+    bc_model_grid = model_grid.copy()
+    bc_model_grid[..., 0] = np.random.uniform(3000, 10000, size=bc_model_grid.shape[:-1])
+    bc_model_grid[..., 1] = np.random.uniform(0, 5, size=bc_model_grid.shape[:-1])
+    bc_model_grid[..., 2] = np.random.uniform(-2, 0.5, size=bc_model_grid.shape[:-1])
+    mag_layout = (bc_model_grid.reshape(-1),) + model_layout[1:]
+    pars = np.concatenate(
+        [random_points(model_ii, n_points), np.full((1, n_points), 100.0), np.full((1, n_points), 0.3)]
+    )
+    args = (pars, bc_model_grid, model_ii, model_steps, bc_grid, bc_cols, bc_ii, bc_steps)
+    t_fixed = best_time(fixed_dim_interp_mags, args, repeat)
+    index_order = np.arange(5)
+    mag_args = (pars, index_order, 0, 1, 2, 3) + mag_layout + (bc_cols,) + bc_layout + (3.1,)
+    t_nd = best_time(interp_mags, mag_args, repeat)
+    assert np.allclose(fixed_dim_interp_mags(*args), interp_mags(*mag_args)[3], equal_nan=True)
+    report("interp_mags", t_fixed, t_nd, n_points)
+
+    # Multi-threaded kernels
+    print()
+    print("{:<24s} {:>12s} {:>12s} {:>8s}".format("", "serial", "parallel", "speedup"))
+    print("({} numba threads)".format(nb.get_num_threads()))
+    pts = random_points(model_ii, n_points)
+    t_serial = best_time(interp_values_nd, (pts, icols) + model_layout, repeat)
+    t_parallel = best_time(interp_values_nd_parallel, (pts, icols) + model_layout, repeat)
+    report("3d values", t_serial, t_parallel, n_points)
+    t_serial = best_time(interp_mags, mag_args, repeat)
+    t_parallel = best_time(interp_mags_parallel, mag_args, repeat)
+    report("interp_mags", t_serial, t_parallel, n_points)
+
+    # Cell cache, along a random walk in the BC grid (irregular Teff and [Fe/H] axes)
+    print()
+    print("{:<24s} {:>12s} {:>12s} {:>8s}".format("", "no cache", "cache", "speedup"))
+    rng = np.random.RandomState(2)
+    lo, hi = [ii[0] for ii in bc_ii], [ii[-1] for ii in bc_ii]
+    steps = np.array([ii[-1] - ii[0] for ii in bc_ii]) * 0.002
+    walk = random_points(bc_ii, 1)[:, 0] + np.cumsum(rng.normal(size=(n_points, 4)) * steps, axis=0)
+    walk = np.ascontiguousarray(np.clip(walk, lo, hi))
+    cache = CellCache(4)
+    t_search = best_time(walk_values, (walk, bc_cols) + bc_layout, repeat)
+    t_cached = best_time(walk_values_cached, (walk, bc_cols) + bc_layout + (cache.array[0],), repeat)
+    report("4d random walk", t_search, t_cached, n_points)
+    print("cache: {}".format(cache.stats()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-points", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(n_points=args.n_points, repeat=args.repeat)
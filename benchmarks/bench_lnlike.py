@@ -0,0 +1,95 @@
+"""Per-call cost of `BasicStarModel.lnlike`, `lnprior`, and `lnpost` with the frozen likelihood context
+
+Compares each call against the same call with its arguments rebuilt from the
+observations every time (as before the context existed), for single, binary,
+and triple star models; then `lnpost` with ``compiled_lnpost=True`` against
+`lnpost` with the context.  Requires the MIST grids, which are downloaded on first use.
+
+    python benchmarks/bench_lnlike.py [--n-calls N] [--repeat R]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from isochrones import get_ichrone
+from isochrones.starmodel import BasicStarModel
+from isochrones.likelihood import star_lnlike, gauss_lnprob
+
+props = dict(Teff=(5800, 100), logg=(4.5, 0.1), feh=(0.0, 0.1), J=(3.58, 0.05), H=(3.3, 0.05), K=(3.22, 0.05))
+
+
+def rebuilt_lnlike(mod, pars):
+    """lnlike, rebuilding the observation arrays and grid layouts on every call
+    """
+    pars = np.array(pars[: mod.n_params], dtype=float)
+    lnlike = star_lnlike(pars, *mod._lnlike_args())
+    plax, plax_unc = mod.kwargs["parallax"]
+    return lnlike + gauss_lnprob(plax, plax_unc, 1000.0 / pars[mod.distance_index])
+
+
+def rebuilt_lnprior(mod, pars):
+    """lnprior, looking up the priors by name on every call
+    """
+    lnp = 0
+    for val, par in zip(pars, mod.param_names):
+        if par in ["eep", "eep_0", "eep_1", "eep_2"]:
+            lnp += mod._priors["eep"].lnpdf(val, age=pars[mod.age_index], feh=pars[mod.feh_index])
+        else:
+            lnp += mod._priors[par].lnpdf(val)
+    return lnp
+
+
+def best_time(fn, points, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for p in points:
+            fn(p)
+        times.append(time.perf_counter() - start)
+    return min(times) / len(points)
+
+
+def report(name, t_rebuilt, t_context):
+    print("{:<16s} {:>12.2f} {:>12.2f} {:>8.2f}".format(name, t_rebuilt * 1e6, t_context * 1e6, t_rebuilt / t_context))
+
+
+def main(n_calls=2000, repeat=5):
+    ic = get_ichrone("mist", bands=["J", "H", "K"])
+    print("us per call; {} calls, best of {}".format(n_calls, repeat))
+    print("{:<16s} {:>12s} {:>12s} {:>8s}".format("", "rebuilt", "context", "speedup"))
+    for N in [1, 2, 3]:
+        mod = BasicStarModel(ic, N=N, parallax=(10, 0.1), cell_cache=False, **props)
+        points = mod.sample_from_prior(n_calls, values=True)
+        points = points[np.isfinite(mod.lnpost_batch(points))]
+        mod.lnpost(points[0])  # compile, and build the context
+
+        assert np.allclose([rebuilt_lnlike(mod, p) for p in points], [mod.lnlike(p) for p in points])
+        assert np.allclose([rebuilt_lnprior(mod, p) for p in points], [mod.lnprior(p) for p in points])
+
+        t_rebuilt = best_time(lambda p: rebuilt_lnlike(mod, p), points, repeat)
+        t_context = best_time(mod.lnlike, points, repeat)
+        report("N={} lnlike".format(N), t_rebuilt, t_context)
+
+        t_rebuilt = best_time(lambda p: rebuilt_lnprior(mod, p), points, repeat)
+        t_context = best_time(mod.lnprior, points, repeat)
+        report("N={} lnprior".format(N), t_rebuilt, t_context)
+
+        t_rebuilt = best_time(lambda p: rebuilt_lnprior(mod, p) + rebuilt_lnlike(mod, p), points, repeat)
+        t_context = best_time(mod.lnpost, points, repeat)
+        report("N={} lnpost".format(N), t_rebuilt, t_context)
+
+        # Whole posterior in one kernel (`compiled_lnpost`), against lnprior + lnlike with the context
+        lnpost = [mod.lnpost(p) for p in points]
+        mod.compiled_lnpost = True
+        assert np.allclose([mod.lnpost(p) for p in points], lnpost)
+        t_compiled = best_time(mod.lnpost, points, repeat)
+        report("N={} compiled".format(N), t_context, t_compiled)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-calls", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(n_calls=args.n_calls, repeat=args.repeat)
@@ -0,0 +1,112 @@
+"""Scaling of the MPI master/worker queue (`batch.mpi_map`) with the number of worker ranks
+
+Each task evaluates magnitudes (`interp_mags`) at random points of synthetic
+grids shaped like the MIST model and BC grids (built once per rank), so no
+model data is needed.  Runs itself under mpirun for each number of ranks,
+and reports throughput relative to a single worker rank (2 ranks, as rank 0
+only hands out tasks).  Requires mpi4py.
+
+    python benchmarks/bench_mpi.py [--ranks N [N ...]] [--n-tasks T] [--mpirun "mpirun --oversubscribe"]
+"""
+import argparse
+import shlex
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from isochrones.interp import grid_axes, grid_strides, uniform_steps, dense_rows
+from isochrones.mags import interp_mags
+
+
+def make_layout(index_columns, lo, hi, seed=0):
+    """Layout of a grid of uniform random values between lo and hi (one per column)
+    """
+    rng = np.random.RandomState(seed)
+    shape = tuple(len(ii) for ii in index_columns) + (len(lo),)
+    grid = rng.uniform(lo, hi, size=shape)
+    return (
+        grid.reshape(-1),
+        *grid_axes(index_columns),
+        uniform_steps(index_columns),
+        grid_strides(shape),
+        dense_rows(),
+    )
+
+
+class mag_task(object):
+    """Sum of magnitudes at n_points random points, given a seed
+    """
+
+    def __init__(self, n_points=20000):
+        ages = np.concatenate([np.arange(5.0, 8.0, 0.1), np.arange(8.0, 10.3, 0.03)])
+        fehs = np.array([-4, -3.5, -3, -2.5, -2, -1.75, -1.5, -1.25, -1, -0.75, -0.5, -0.25, 0, 0.25, 0.5])
+        self.model_ii = (ages, fehs, np.arange(1, 1711, dtype=float))
+        # Teff, logg, feh, Mbol
+        model_layout = make_layout(self.model_ii, [3000, 0, -2, -5], [10000, 5, 0.5, 10])
+
+        Teffs = np.concatenate([np.arange(2500.0, 13000, 250), np.arange(13000.0, 50001, 1000)])
+        bc_fehs = np.array([-4, -3, -2, -1.5, -1, -0.75, -0.5, -0.25, 0, 0.25, 0.5, 0.75])
+        bc_ii = (Teffs, np.arange(-4, 9.51, 0.5), bc_fehs, np.arange(0, 6.01, 0.25))
+        bc_layout = make_layout(bc_ii, [-1, -1, -1], [1, 1, 1])
+
+        self.args = (np.arange(5), 0, 1, 2, 3) + model_layout + (np.arange(3),) + bc_layout + (3.1,)
+        self.n_points = n_points
+        self(0)  # compile
+
+    def __call__(self, seed):
+        rng = np.random.RandomState(seed)
+        pars = [rng.uniform(ii[0], ii[-1], size=self.n_points) for ii in self.model_ii]
+        pars = np.array(pars + [np.full(self.n_points, 100.0), np.full(self.n_points, 0.3)])
+        return np.nansum(interp_mags(pars, *self.args)[3])
+
+
+def run(n_tasks):
+    """Runs the tasks with mpi_map; prints the time taken on rank 0
+    """
+    from mpi4py import MPI
+    from isochrones.batch import mpi_map
+
+    comm = MPI.COMM_WORLD
+    task = mag_task()
+    comm.barrier()
+
+    results = []
+    start = time.perf_counter()
+    mpi_map(task, list(range(n_tasks)), results.append, comm=comm)
+    elapsed = time.perf_counter() - start
+    if comm.Get_rank() == 0:
+        assert len(results) == n_tasks
+        print(elapsed)
+
+
+def main(ranks=(2, 3, 5, 9), n_tasks=200, mpirun="mpirun"):
+    print("{} tasks; rank 0 hands out tasks, the others run them".format(n_tasks))
+    print("{:>8s} {:>8s} {:>10s} {:>12s} {:>10s}".format("ranks", "workers", "time (s)", "tasks/s", "efficiency"))
+    t1 = None
+    for n in ranks:
+        cmd = shlex.split(mpirun) + ["-n", str(n), sys.executable, __file__, "--child", "--n-tasks", str(n_tasks)]
+        output = subprocess.run(cmd, stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+        elapsed = float(output.strip().splitlines()[-1])
+        n_workers = max(n - 1, 1)
+        if t1 is None:
+            t1 = elapsed * n_workers
+        print(
+            "{:>8d} {:>8d} {:>10.2f} {:>12.1f} {:>10.2f}".format(
+                n, n_workers, elapsed, n_tasks / elapsed, t1 / (elapsed * n_workers)
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ranks", type=int, nargs="+", default=[2, 3, 5, 9])
+    parser.add_argument("--n-tasks", type=int, default=200)
+    parser.add_argument("--mpirun", type=str, default="mpirun")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run(args.n_tasks)
+    else:
+        main(ranks=args.ranks, n_tasks=args.n_tasks, mpirun=args.mpirun)
@@ -0,0 +1,95 @@
+"""Time to build an `ObservationTree` of a crowded field, finding parents with the
+KD-tree index (`ObsNodeIndex`) and by scanning the whole tree (`_find_closest`),
+as `_build_tree` did before the index.
+
+Each tree has seeing-limited, AO, and speckle observations of hundreds of
+sources within a few arcsec, over unresolved 2MASS photometry; no model
+data is needed.
+
+    python benchmarks/bench_tree.py [--n-sources N [N ...]] [--repeat R]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from isochrones.observation import ObservationTree, Observation, ObsNode, Source
+
+
+def crowded_observations(n_sources, seed=0):
+    rng = np.random.RandomState(seed)
+    separation = np.concatenate([[0], rng.uniform(0, 5, n_sources - 1)])
+    pa = np.concatenate([[0], rng.uniform(0, 360, n_sources - 1)])
+    mag = np.concatenate([[10], rng.uniform(11, 20, n_sources - 1)])
+
+    observations = [
+        Observation("2MASS", "J", 4.0, sources=[Source(10, 0.02)]),
+        Observation("2MASS", "K", 4.0, sources=[Source(9.5, 0.02)]),
+    ]
+    # Fainter sources are detected only at higher resolution
+    for name, band, resolution, mag_limit in [
+        ("Seeing", "K", 1.0, 15),
+        ("AO", "J", 0.1, 18),
+        ("AO", "K", 0.1, 18),
+        ("Speckle", "I", 0.02, 20),
+    ]:
+        detected = mag <= mag_limit
+        sources = [
+            Source(m - mag[0], 0.05, separation=sep, pa=p, relative=True)
+            for sep, p, m in zip(separation[detected], pa[detected], mag[detected])
+        ]
+        observations.append(Observation(name, band, resolution, sources=sources, relative=True))
+    return observations
+
+
+def scan_tree(tree):
+    """`_build_tree`, finding each parent with `_find_closest`
+    """
+    tree._clear_all_leaves()
+    tree.children = []
+    for i, o in enumerate(tree._observations):
+        ref_node = ObsNode(o, o.brightest)
+        for s in o.sources:
+            if s.relative and not s.is_reference:
+                node = ObsNode(o, s, ref_node=ref_node)
+            elif s.relative and s.is_reference:
+                node = ref_node
+            else:
+                node = ObsNode(o, s)
+            parent = tree if i == 0 else tree._find_closest(node)
+            parent.add_child(node)
+    return tree
+
+
+def best_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(n_sources=(50, 100, 200, 400), repeat=3):
+    print("ms per tree; best of {}".format(repeat))
+    print("{:>10s} {:>8s} {:>12s} {:>12s} {:>8s}".format("sources", "nodes", "scan", "KD-tree", "speedup"))
+    for n in n_sources:
+        tree = ObservationTree(crowded_observations(n))
+        n_nodes = len(tree.get_obs_nodes())
+        t_index = best_time(tree._build_tree, repeat)
+        parents = [(n.source, getattr(n.parent, "source", None)) for n in tree.get_obs_nodes()]
+        t_scan = best_time(lambda: scan_tree(tree), repeat)
+        assert parents == [(n.source, getattr(n.parent, "source", None)) for n in tree.get_obs_nodes()]
+        print(
+            "{:>10d} {:>8d} {:>12.1f} {:>12.1f} {:>8.1f}".format(
+                n, n_nodes, t_scan * 1e3, t_index * 1e3, t_scan / t_index
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-sources", type=int, nargs="+", default=[50, 100, 200, 400])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(n_sources=args.n_sources, repeat=args.repeat)
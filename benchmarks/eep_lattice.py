@@ -0,0 +1,55 @@
+"""Accuracy and speed of the EEP lattice lookup, compared with the other get_eep methods
+
+Reports error statistics of `get_eep(..., lattice=True)` (with and without the
+refinement step) relative to the exact solution of `get_eeps_accurate`, and the
+time per point of each way of computing EEP.  Requires the MIST grids, which
+are downloaded on first use; the lattice is built on first use as well.
+
+    python benchmarks/eep_lattice.py [--n-points N] [--tracks]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from isochrones import get_ichrone
+
+
+def main(n_points=100000, tracks=False):
+    ic = get_ichrone("mist", tracks=tracks)
+    ic.eep_lattice
+
+    print("|EEP error| relative to get_eeps_accurate; {} random points".format(n_points))
+    columns = ("", "median", "90%", "99%", "99.9%", "max", "exact only", "approx only")
+    print("{:<12s} {:>10s} {:>10s} {:>10s} {:>10s} {:>10s} {:>11s} {:>11s}".format(*columns))
+    for refine in [False, True]:
+        stats = ic.eep_lattice_errors(n_points, refine=refine, seed=0)
+        print(
+            "{:<12s} {:>10.4f} {:>10.4f} {:>10.4f} {:>10.4f} {:>10.4f} {:>11.4f} {:>11.4f}".format(
+                "refined" if refine else "lattice", *stats.values()
+            )
+        )
+
+    rng = np.random.RandomState(1)
+    log_mass, age, feh = [rng.uniform(ii[0], ii[-1], size=n_points) for ii in ic.eep_lattice.index_columns]
+    mass = 10 ** log_mass
+    print()
+    print("{:<24s} {:>12s}".format("", "us per point"))
+    for name, kwargs in [
+        ("lattice", dict(lattice=True)),
+        ("lattice, refined", dict(lattice=True, refine=True)),
+        ("arrays (default)", dict()),
+        ("accurate", dict(accurate=True, return_nan=True)),
+    ]:
+        ic.get_eep(mass[:10], age[:10], feh[:10], **kwargs)  # compile/load
+        start = time.perf_counter()
+        ic.get_eep(mass, age, feh, **kwargs)
+        print("{:<24s} {:>12.3f}".format(name, (time.perf_counter() - start) / n_points * 1e6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-points", type=int, default=100000)
+    parser.add_argument("--tracks", action="store_true")
+    args = parser.parse_args()
+    main(n_points=args.n_points, tracks=args.tracks)
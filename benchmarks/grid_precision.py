@@ -0,0 +1,66 @@
+"""Accuracy of interpolation in float32-stored grids, compared with float64 ones
+
+Interpolates magnitudes (and Teff, logg, [Fe/H]) at random points over the
+MIST isochrone grid, using grids stored as float64 and as float32, and reports
+the distribution of the absolute differences.  Requires the MIST grids, which
+are downloaded on first use.
+
+    python benchmarks/grid_precision.py [--n-points N] [--bands G BP RP ...]
+"""
+import argparse
+
+import numpy as np
+
+from isochrones.mist import MIST_Isochrone
+
+
+def random_pars(ic, n, seed=0):
+    rng = np.random.RandomState(seed)
+    ages, fehs, eeps = ic.model_grid.interp.index_columns
+    return np.array(
+        [
+            rng.uniform(ages[0], ages[-1], size=n),
+            rng.uniform(fehs[0], fehs[-1], size=n),
+            rng.uniform(eeps[0], eeps[-1], size=n),
+            rng.uniform(10, 5000, size=n),
+            rng.uniform(0, 3, size=n),
+        ]
+    )
+
+
+def main(n_points=100000, bands=None):
+    ic64 = MIST_Isochrone(bands=bands, dtype="float64")
+    ic32 = MIST_Isochrone(bands=bands, dtype="float32")
+
+    pars = random_pars(ic64, n_points)
+    Teff64, logg64, feh64, mags64 = ic64.interp_mag(pars, ic64.bands)
+    Teff32, logg32, feh32, mags32 = ic32.interp_mag(pars, ic32.bands)
+
+    # Points outside the populated part of the grid are NaN in both.
+    ok = np.isfinite(mags64).all(axis=1)
+    assert (np.isfinite(mags32).all(axis=1) == ok).all()
+
+    nbytes64 = ic64.model_grid.interp.grid.nbytes + ic64.bc_grid.interp.grid.nbytes
+    nbytes32 = ic32.model_grid.interp.grid.nbytes + ic32.bc_grid.interp.grid.nbytes
+    print("Grid memory: {:.1f} MB (float64), {:.1f} MB (float32)".format(nbytes64 / 1e6, nbytes32 / 1e6))
+    print("{} of {} random points inside the grid".format(ok.sum(), n_points))
+    print()
+    print("{:<12s} {:>12s} {:>12s} {:>12s}".format("|difference|", "median", "99.9%", "max"))
+
+    rows = [
+        ("Teff [K]", Teff64 - Teff32),
+        ("logg", logg64 - logg32),
+        ("feh", feh64 - feh32),
+    ]
+    rows += [(b, mags64[:, i] - mags32[:, i]) for i, b in enumerate(ic64.bands)]
+    for name, diff in rows:
+        d = np.abs(diff[ok])
+        print("{:<12s} {:>12.2e} {:>12.2e} {:>12.2e}".format(name, np.median(d), np.percentile(d, 99.9), d.max()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-points", type=int, default=100000)
+    parser.add_argument("--bands", nargs="*", default=None)
+    args = parser.parse_args()
+    main(n_points=args.n_points, bands=args.bands)
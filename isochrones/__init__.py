@@ -8,3 +8,4 @@ except NameError:
 if not __ISOCHRONES_SETUP__:
     from .isochrone import get_ichrone
     from .starmodel import StarModel, SingleStarModel, BinaryStarModel, TripleStarModel
+    from .compilation import warmup
@@ -0,0 +1,542 @@
+"""Local execution of batches of fits, without a cluster scheduler
+
+`run_tasks` runs a list of tasks on a pool of worker processes.  Tasks are
+handed out one at a time, to whichever worker is free, so a few slow tasks
+(e.g., triple-star fits among single-star ones) never hold up the tasks
+queued behind them.  A task that takes longer than the timeout, raises, or
+brings its worker down is retried, on a fresh worker if needed.  Every attempt
+is recorded in a `Ledger` file, so a rerun of the same batch only runs the
+tasks that are not done yet.
+
+`batch_starfit` uses this to run `starfit.starfit` on many folders, with each
+worker process loading the model grids once, for all its fits::
+
+    batch_starfit(folders, processes=16, timeout=3600, ledger="stars.ledger")
+
+Across several nodes, `mpi_fit_all` does the same with MPI (via the optional
+`mpi4py`): rank 0 hands out stars (of a `StarCatalog`) or folders to the other
+ranks, and writes all their results to a single `catalog.FitResults` file.
+It is run under ``mpirun``, e.g. with scripts/mpi_starfit::
+
+    mpirun -n 64 mpi_starfit results.h5 --catalog stars.csv
+"""
+import os
+import time
+import traceback
+import multiprocessing
+from multiprocessing.connection import wait
+from collections import OrderedDict, deque
+
+from .logger import getLogger
+
+DONE = "done"
+RETRY = "retry"
+FAILED = "failed"
+
+
+class Ledger(object):
+    """Record of task attempts, in an append-only, tab-separated text file
+
+    Each line is: time, status, attempt number, duration in seconds, message,
+    and then the fields of the task's key (a tuple of strings).  The status
+    is `DONE`, `RETRY` (failed, to be retried), or `FAILED` (failed, and
+    out of retries).
+
+    filename: file to read previous attempts from and append new ones to; if None,
+        attempts are only kept in memory.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self._last = OrderedDict()
+        if filename is not None and os.path.exists(filename):
+            with open(filename) as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    if len(fields) < 6:  # partly written line
+                        continue
+                    _, status, attempt, seconds, _ = fields[:5]
+                    self._last[tuple(fields[5:])] = (status, int(attempt), float(seconds))
+
+    def status(self, key):
+        """Status of the last attempt of a task (None if never attempted)
+        """
+        return self._last.get(tuple(key), (None, 0, None))[0]
+
+    def attempts(self, key):
+        return self._last.get(tuple(key), (None, 0, None))[1]
+
+    def duration(self, key):
+        """Duration in seconds of the last attempt of a task (None if never attempted)
+        """
+        return self._last.get(tuple(key), (None, 0, None))[2]
+
+    def record(self, key, status, attempt, seconds, message=""):
+        key = tuple(str(k) for k in key)
+        self._last[key] = (status, attempt, seconds)
+        if self.filename is not None:
+            message = " ".join(message.split())  # one line, no tabs
+            fields = [time.strftime("%Y-%m-%dT%H:%M:%S"), status, str(attempt), "{:.1f}".format(seconds), message]
+            with open(self.filename, "a") as f:
+                f.write("\t".join(fields + list(key)) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def counts(self):
+        """Number of tasks with each status
+        """
+        counts = OrderedDict((s, 0) for s in [DONE, RETRY, FAILED])
+        for status, _, _ in self._last.values():
+            counts[status] += 1
+        return counts
+
+
+def _worker_loop(conn, fn):
+    """Runs fn(*args) for each (key, args) received, and sends back (ok, message, seconds)
+
+    Sends None first, once the process has started up.
+    """
+    conn.send(None)
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        key, args = task
+        start = time.time()
+        try:
+            fn(*args)
+            ok, message = True, ""
+        except KeyboardInterrupt:
+            break
+        except Exception:
+            ok, message = False, traceback.format_exc().strip().splitlines()[-1]
+        conn.send((ok, message, time.time() - start))
+
+
+class _Worker(object):
+    def __init__(self, context, fn):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_loop, args=(child_conn, fn), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.task = None
+        self.start = None
+
+    def send(self, task):
+        self.task = task
+        self.start = time.time()
+        self.conn.send(task)
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.terminate()
+        else:
+            try:
+                self.conn.send(None)
+            except (OSError, EOFError):
+                pass
+        self.process.join()
+        self.conn.close()
+
+
+def run_tasks(tasks, fn, processes=None, timeout=None, retries=1, ledger=None, retry_failed=False):
+    """Runs fn(*args) for every (key, args) in tasks, on a pool of worker processes
+
+    Tasks are started in the order given, each on the next free worker.
+
+    Parameters
+    ----------
+    tasks : list
+        (key, args) pairs, key being a tuple of strings that identifies the task in the ledger.
+
+    fn : callable
+        Function run by the workers; must be picklable (e.g., defined at module level).
+        A task fails if fn raises.
+
+    processes : int, optional
+        Number of worker processes (default: number of cores).
+
+    timeout : float, optional
+        Seconds after which a task is stopped (by terminating its worker) and failed.
+
+    retries : int
+        Number of times a failed task is retried in this run.
+
+    ledger : `Ledger` or str, optional
+        Ledger (or its filename) of task attempts.  Tasks that are done in it are
+        skipped, as are those that failed for good, unless `retry_failed` is True.
+
+    Returns
+    -------
+    counts : OrderedDict
+        Number of tasks of the ledger with each status.
+    """
+    logger = getLogger()
+    if not isinstance(ledger, Ledger):
+        ledger = Ledger(ledger)
+    if processes is None:
+        processes = os.cpu_count()
+
+    skip = [DONE] if retry_failed else [DONE, FAILED]
+    queue = deque((tuple(key), args) for key, args in tasks if ledger.status(key) not in skip)
+    n_skipped = len(tasks) - len(queue)
+    logger.info("Running {} tasks ({} skipped) on {} processes.".format(len(queue), n_skipped, processes))
+
+    tries = {key: 0 for key, _ in queue}
+
+    def finish(worker, ok, message, seconds):
+        key, args = worker.task
+        worker.task = None
+        tries[key] += 1
+        attempt = ledger.attempts(key) + 1
+        if ok:
+            status = DONE
+        elif tries[key] <= retries:
+            status = RETRY
+            queue.append((key, args))
+        else:
+            status = FAILED
+        ledger.record(key, status, attempt, seconds, message)
+        log = logger.info if ok else logger.warning
+        log("{}: {} ({:.0f} s){}".format(" ".join(key), status, seconds, "; " + message if message else ""))
+
+    # Forking after numba has started its parallel threads may hang, so spawn.
+    context = multiprocessing.get_context("spawn")
+    workers = [_Worker(context, fn) for _ in range(min(processes, len(queue)))]
+    try:
+        while queue or any(w.task is not None for w in workers):
+            for w in workers:
+                if w.ready and w.task is None and queue:
+                    w.send(queue.popleft())
+
+            # Timeouts start once tasks are sent, so only after the workers have started up.
+            busy = [w for w in workers if w.task is not None]
+            wait_time = None
+            if timeout is not None and busy:
+                wait_time = max(0, min(w.start + timeout for w in busy) - time.time())
+            ready = wait([w.conn for w in workers if w.task is not None or not w.ready], timeout=wait_time)
+
+            for i, w in enumerate(workers):
+                if w.conn in ready:
+                    try:
+                        result = w.conn.recv()
+                    except EOFError:
+                        # Worker died (e.g., a crash in compiled code)
+                        w.process.join()
+                        if w.task is None:
+                            raise RuntimeError("Worker process exited (code {})".format(w.process.exitcode))
+                        message = "worker died (exit code {})".format(w.process.exitcode)
+                        finish(w, False, message, time.time() - w.start)
+                        w.stop(kill=True)
+                        workers[i] = _Worker(context, fn)
+                        continue
+                    if not w.ready:
+                        w.ready = True
+                    else:
+                        finish(w, *result)
+                elif w.task is not None and timeout is not None and time.time() - w.start > timeout:
+                    w.stop(kill=True)
+                    finish(w, False, "timed out after {:.0f} s".format(timeout), time.time() - w.start)
+                    workers[i] = _Worker(context, fn)
+    finally:
+        for w in workers:
+            w.stop(kill=w.task is not None)
+
+    counts = ledger.counts()
+    logger.info(", ".join("{} {}".format(n, s) for s, n in counts.items()))
+    return counts
+
+
+# Interpolators of a worker process, by (models, bands); see `starfit_task`
+_ichrones = {}
+
+
+def starfit_task(folder, multiplicity, models, bands, kwargs):
+    """Runs `starfit` on one folder, for one multiplicity, reusing this process's interpolator
+
+    Returns the fit star model.  Raises RuntimeError if no star model file was
+    written (`starfit` logs errors to the folder's starfit.log rather than raising them).
+    """
+    from .starfit import starfit
+    from .isochrone import get_ichrone
+    import tables
+
+    key = (models, tuple(bands))
+    if key not in _ichrones:
+        _ichrones[key] = get_ichrone(models, bands=list(bands))
+
+    # Passing the logger makes starfit replace its handlers, rather than add to them for every folder.
+    kwargs = dict(kwargs, logger=getLogger())
+    mod, _ = starfit(folder, multiplicities=[multiplicity], models=models, ichrone=_ichrones[key], **kwargs)
+
+    # Files are sometimes left open by starfit; see scripts/starfit.
+    tables.file._open_files.close_all()
+
+    model_filename = os.path.join(folder, "{}_starmodel_{}.h5".format(models, multiplicity))
+    if not os.path.exists(model_filename):
+        raise RuntimeError("{} not written; see {}".format(model_filename, os.path.join(folder, "starfit.log")))
+    return mod
+
+
+def batch_starfit(
+    folders,
+    multiplicities=["single"],
+    models="mist",
+    processes=None,
+    timeout=None,
+    retries=1,
+    ledger=None,
+    retry_failed=False,
+    ini_file="star.ini",
+    **kwargs
+):
+    """Runs `starfit` on every folder, with `run_tasks`
+
+    Each (folder, multiplicity) is a separate task, and tasks are started
+    from the slowest expected (more stars, then longer previous attempts in
+    the ledger) to the fastest, which keeps the slow ones from finishing last.
+    Each worker creates a single interpolator, with the bands of all folders
+    (and `bands`, if given).
+
+    Other keyword arguments are passed to `starfit`; see `run_tasks` for the others.
+    """
+    from .starmodel import StarModel
+
+    if not isinstance(ledger, Ledger):
+        ledger = Ledger(ledger)
+
+    bands = set(kwargs.pop("bands", None) or [])
+    for folder in folders:
+        bands.update(StarModel.get_bands(os.path.join(folder, ini_file)))
+    bands = sorted(bands)
+
+    nstars = {"single": 1, "binary": 2, "triple": 3}
+    tasks = []
+    for folder in folders:
+        for mult in multiplicities:
+            key = (os.path.abspath(folder), mult)
+            args = (folder, mult, models, bands, dict(kwargs, ini_file=ini_file))
+            tasks.append((key, args))
+
+    def expected_time(task):
+        key = task[0]
+        return nstars[key[1]], ledger.duration(key) or 0
+
+    tasks.sort(key=expected_time, reverse=True)
+
+    return run_tasks(
+        tasks,
+        starfit_task,
+        processes=processes,
+        timeout=timeout,
+        retries=retries,
+        ledger=ledger,
+        retry_failed=retry_failed,
+    )
+
+
+# MPI message tags
+_TASK = 1
+_STOP = 2
+
+
+def mpi_map(fn, tasks, on_result, comm=None):
+    """Runs fn(task) for every task, on all ranks of an MPI communicator but the first
+
+    Rank 0 hands out tasks one at a time, to whichever rank asks for one, and
+    calls on_result(result) with the result of each, as it comes back.  With a
+    single rank, rank 0 runs all the tasks itself.  Must be called by all ranks;
+    only the `tasks` of rank 0 are used.
+    """
+    from mpi4py import MPI
+
+    if comm is None:
+        comm = MPI.COMM_WORLD
+    rank, size = comm.Get_rank(), comm.Get_size()
+    if size == 1:
+        for task in tasks:
+            on_result(fn(task))
+        return
+
+    status = MPI.Status()
+    if rank == 0:
+        queue = deque(tasks)
+        n_workers = size - 1
+        while n_workers:
+            result = comm.recv(source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG, status=status)
+            worker = status.Get_source()
+            if queue:
+                comm.send(queue.popleft(), dest=worker, tag=_TASK)
+            else:
+                comm.send(None, dest=worker, tag=_STOP)
+                n_workers -= 1
+            # Results are handled after the worker has its next task, so that it does not wait for them.
+            if result is not None:
+                on_result(result)
+    else:
+        comm.send(None, dest=0)  # ready
+        while True:
+            task = comm.recv(source=0, tag=MPI.ANY_TAG, status=status)
+            if status.Get_tag() == _STOP:
+                break
+            comm.send(fn(task), dest=0)
+
+
+class starfit_worker(object):
+    """Runs `starfit_task` for (folder, multiplicity), returning the same as `catalog.fit_worker`
+
+    The name of the result is "<folder name>_<multiplicity>".
+    """
+
+    def __init__(self, models="mist", bands=None, samples=True, columns=None, qs=None, kwargs=None):
+        self.models = models
+        self.bands = bands
+        self.samples = samples
+        self.columns = columns
+        self.qs = qs
+        self.kwargs = kwargs or {}
+
+    def __call__(self, task):
+        from .summary import sample_quantiles
+
+        folder, multiplicity = task
+        name = "{}_{}".format(os.path.basename(os.path.abspath(folder)), multiplicity)
+        try:
+            mod = starfit_task(folder, multiplicity, self.models, self.bands, self.kwargs)
+            samples = mod.derived_samples
+            summary = sample_quantiles(samples, name, columns=self.columns, qs=self.qs)
+        except KeyboardInterrupt:
+            raise
+        except Exception:
+            return name, None, None, traceback.format_exc()
+        return name, summary, samples if self.samples else None, None
+
+
+def mpi_fit_all(
+    filename,
+    catalog=None,
+    folders=None,
+    models="mist",
+    N=1,
+    multiplicities=["single"],
+    mmap_mode="r",
+    samples=True,
+    columns=["eep", "mass", "radius", "age", "feh", "distance", "AV"],
+    qs=[0.05, 0.16, 0.5, 0.84, 0.95],
+    model_kwargs=None,
+    comm=None,
+    **fit_kwargs
+):
+    """Fits the stars of a `StarCatalog`, or the folders of star.ini files, with `mpi_map`
+
+    Must be called by every rank (e.g., of a script run with ``mpirun``).
+    Every rank loads the grids of `models` once, memory-mapped if `mmap_mode`
+    is "r" (so that the ranks of a node share them in the page cache), after
+    rank 0 has loaded them first, so that grid files and compiled kernels are
+    written only once.  Fits are then spread over ranks 1 and up (see
+    `catalog.fit_worker` and `starfit_worker`), and rank 0 writes all
+    results to `filename` (see `catalog.FitResults`).  Stars or folders already
+    in the file are skipped.
+
+    MultiNest is run without MPI (`force_no_MPI`), one fit per rank.  With
+    `folders`, `starfit` is run with `fit_kwargs`, and also writes its usual
+    files to each folder.
+
+    Returns the summary of all results on rank 0, None on the other ranks.
+    """
+    from mpi4py import MPI
+    from .catalog import FitResults, fit_worker, _init_fit_worker
+    from .isochrone import get_ichrone
+    from .starmodel import StarModel, BasicStarModel
+
+    if comm is None:
+        comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    logger = getLogger()
+
+    if (catalog is None) == (folders is None):
+        raise ValueError("Provide either a catalog or folders.")
+
+    model_kwargs = dict(model_kwargs or {})
+    if not model_kwargs.get("use_emcee", fit_kwargs.get("use_emcee", False)):
+        fit_kwargs.setdefault("force_no_MPI", True)
+
+    if catalog is not None:
+        bands = list(catalog.bands)
+        model_kwargs.update(N=N, directory=os.path.dirname(os.path.abspath(filename)))
+    else:
+        bands = set()
+        for folder in folders:
+            bands.update(StarModel.get_bands(os.path.join(folder, fit_kwargs.get("ini_file", "star.ini"))))
+        bands = sorted(bands)
+
+    def load_ic():
+        ic = get_ichrone(models, bands=bands, mmap_mode=mmap_mode)
+        ic.initialize()
+        if catalog is not None:
+            _init_fit_worker(ic)
+        else:
+            _ichrones[(models, tuple(bands))] = ic
+        return ic
+
+    tasks = None
+    results = None
+    if rank == 0:
+        ic = load_ic()
+        if catalog is not None:
+            name_size = max((len(str(name)) for name in catalog.df.index), default=1)
+        else:
+            name_size = max((len(os.path.basename(os.path.abspath(f))) + 8 for f in folders), default=1)
+        results = FitResults(filename, name_size=name_size)
+
+        if catalog is not None:
+            tasks = [(name, m) for name, m in catalog.iter_measurements() if str(name) not in results.done]
+            if tasks:
+                # Load the column-subset grids of the likelihood as well
+                BasicStarModel(ic, name=tasks[0][0], **model_kwargs, **tasks[0][1]).sample_from_prior(1)
+        else:
+            tasks = []
+            for folder in folders:
+                for mult in multiplicities:
+                    name = "{}_{}".format(os.path.basename(os.path.abspath(folder)), mult)
+                    if name not in results.done:
+                        tasks.append((folder, mult))
+            if tasks:
+                ini_file = fit_kwargs.get("ini_file", "star.ini")
+                BasicStarModel.from_ini(ic, folder=tasks[0][0], N=1, ini_file=ini_file).sample_from_prior(1)
+
+        logger.info(
+            "Fitting {} on {} ranks ({} already in {})".format(len(tasks), comm.Get_size(), len(results.done), filename)
+        )
+
+    comm.barrier()
+    if rank != 0:
+        load_ic()
+
+    if catalog is not None:
+        fn = fit_worker(model_kwargs=model_kwargs, samples=samples, columns=columns, qs=qs, fit_kwargs=fit_kwargs)
+    else:
+        fn = starfit_worker(models=models, bands=bands, samples=samples, columns=columns, qs=qs, kwargs=fit_kwargs)
+
+    start = time.time()
+    n_done = [0]
+
+    def on_result(result):
+        name, summary, star_samples, error = result
+        if error is not None:
+            logger.error("Fit failed for {}:\n{}".format(name, error))
+            return
+        results.append(name, summary, star_samples)
+        n_done[0] += 1
+        rate = n_done[0] / (time.time() - start) * 3600
+        logger.info("{} of {}: {} ({:.0f} per hour)".format(n_done[0], len(tasks), name, rate))
+
+    try:
+        mpi_map(fn, tasks, on_result, comm=comm)
+    finally:
+        if results is not None:
+            summary = results.summary
+            results.close()
+
+    return summary if rank == 0 else None
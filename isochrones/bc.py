@@ -1,8 +1,9 @@
 import pandas as pd
 import os
 import glob
+import hashlib
 
-from .config import ISOCHRONES
+from .config import ISOCHRONES, GRID_MMAP_MODE, GRID_DTYPE
 from .grid import Grid
 
 
@@ -20,14 +21,28 @@ class BolometricCorrectionGrid(Grid):
     bands : list(str)
         List of band names, each parsed with `get_band` method.
         Tables are downloaded when requested.
+
+    mmap_mode : str, optional
+        Passed to `DFInterpolator`; e.g., "r" to memory-map the full grid.
+
+    dtype : str, optional
+        Storage dtype of the grid, passed to `DFInterpolator`; e.g., "float32".
+
+    Rv : float or None
+        Value of Rv at which to slice the tables, leaving a 4-d grid in
+        (Teff, logg, [Fe/H], Av).  If None, the Rv dimension is kept.
     """
 
     index_cols = ("Teff", "logg", "[Fe/H]", "Av", "Rv")
     name = None
     is_full = True
+    default_Rv = 3.1
 
-    def __init__(self, bands=None):
+    def __init__(self, bands=None, mmap_mode=GRID_MMAP_MODE, Rv=default_Rv, dtype=GRID_DTYPE):
 
+        self.mmap_mode = mmap_mode
+        self.dtype = dtype
+        self.Rv = Rv
         self.bands = bands if bands is not None else list(self.default_bands)
 
         self._band_map = None
@@ -65,6 +80,15 @@ class BolometricCorrectionGrid(Grid):
     def datadir(self):
         return os.path.join(ISOCHRONES, "BC", self.name)
 
+    @property
+    def interp_grid_npz_filename(self):
+        band_tag = hashlib.md5(",".join(sorted(self.bands)).encode()).hexdigest()[:10]
+        if self.Rv == self.default_Rv:
+            Rv_tag = ""
+        else:
+            Rv_tag = "_allRv" if self.Rv is None else "_Rv{}".format(self.Rv)
+        return os.path.join(self.datadir, "full_grid_{}{}.npz".format(band_tag, Rv_tag))
+
     def get_filename(self, phot, feh):
         rootdir = self.datadir
         sign_str = "m" if feh < 0 else "p"
@@ -1,5 +1,8 @@
 import re
 import os
+import time
+import traceback
+import multiprocessing
 
 import pandas as pd
 import numpy as np
@@ -10,9 +13,12 @@ except ImportError:
     hv = None
 
 from . import StarModel, get_ichrone
-from .starmodel import SingleStarModel, BinaryStarModel, TripleStarModel
+from .starmodel import BasicStarModel, SingleStarModel, BinaryStarModel, TripleStarModel
 from .priors import PowerLawPrior, FlatLogPrior, FehPrior, FlatPrior, GaussianPrior
 from .utils import addmags, band_pairs
+from .shared import SharedGridRegistry
+from .summary import sample_quantiles
+from .logger import getLogger
 
 
 class StarCatalog(object):
@@ -112,18 +118,23 @@ class StarCatalog(object):
             self._hr = hv.Layout(layout)
         return self._hr
 
+    def iter_measurements(self):
+        """Yields (name, measurements) for each star, measurements being {band or prop: (value, unc)}
+        """
+        for i in range(len(self.df)):
+            row = self.df.iloc[i]
+            measurements = {b: (row["{}_mag".format(b)], row["{}_mag_unc".format(b)]) for b in self.bands}
+            measurements.update({p: (row[p], row["{}_unc".format(p)]) for p in self.props})
+            yield row.name, measurements
+
     def iter_models(self, ic=None, N=1):
         if ic is None:
             ic = get_ichrone("mist", bands=self.bands)
 
         mod_type = {1: SingleStarModel, 2: BinaryStarModel, 3: TripleStarModel}
 
-        for i in range(len(self.df)):
-            row = self.df.iloc[i]
-            mags = {b: (row["{}_mag".format(b)], row["{}_mag_unc".format(b)]) for b in self.bands}
-            props = {p: (row[p], row["{}_unc".format(p)]) for p in self.props}
-            yield mod_type[N](ic, **mags, **props, name=row.name)
-            i += 1
+        for name, measurements in self.iter_measurements():
+            yield mod_type[N](ic, **measurements, name=name)
 
     def write_ini(self, ic=None, root=".", N=1):
         if ic is None:
@@ -137,3 +148,211 @@ class StarCatalog(object):
             dirs.append(os.path.abspath(os.path.join(path, mod.name)))
 
         return dirs
+
+    def fit_all(
+        self,
+        filename,
+        ic=None,
+        N=1,
+        processes=None,
+        directory=None,
+        samples=True,
+        columns=["eep", "mass", "radius", "age", "feh", "distance", "AV"],
+        qs=[0.05, 0.16, 0.5, 0.84, 0.95],
+        model_kwargs=None,
+        **fit_kwargs
+    ):
+        """Fits every star in the catalog, writing all results to a single HDF5 file
+
+        The model grids are loaded once, and placed in shared memory (see
+        `shared.SharedGridRegistry`) for a pool of worker processes, which fit
+        stars as they become free.  As each fit finishes, its summary quantiles
+        (see `summary.sample_quantiles`) and, if `samples` is True, its derived
+        samples are appended to `filename` (see `FitResults`).  Stars already in
+        the file are skipped, so an interrupted run picks up where it stopped;
+        stars whose fit fails are logged, and retried on the next run.
+
+        Parameters
+        ----------
+        filename : str
+            HDF5 results file.
+
+        ic : `ModelGridInterpolator`, optional
+            Defaults to MIST, with the bands of the catalog.
+
+        N : int
+            Number of (unresolved) stars per model; see `BasicStarModel`.
+
+        processes : int, optional
+            Number of worker processes (default: number of cores).  If 1, then
+            stars are fit in this process, one after the other.
+
+        directory : str, optional
+            Directory of the models, where fits write their working files (e.g.,
+            MultiNest chains).  Defaults to that of `filename`.
+
+        samples : bool
+            Whether to store the derived samples of every star, or only their quantiles.
+
+        columns, qs : list
+            Patterns of sample columns to summarize, and quantiles; see `summary.sample_quantiles`.
+
+        model_kwargs : dict, optional
+            Additional keyword arguments of `BasicStarModel`.
+
+        **fit_kwargs
+            Keyword arguments of `BasicStarModel.fit`.
+
+        Returns
+        -------
+        summary : `pandas.DataFrame`
+            Summary quantiles of all the stars in `filename`.
+        """
+        logger = getLogger()
+        if ic is None:
+            ic = get_ichrone("mist", bands=self.bands)
+        if directory is None:
+            directory = os.path.dirname(os.path.abspath(filename))
+        if processes is None:
+            processes = os.cpu_count()
+
+        model_kwargs = dict(model_kwargs or {}, N=N, directory=directory)
+        worker = fit_worker(model_kwargs=model_kwargs, samples=samples, columns=columns, qs=qs, fit_kwargs=fit_kwargs)
+
+        with FitResults(filename, name_size=max((len(str(name)) for name in self.df.index), default=1)) as results:
+            tasks = [(name, m) for name, m in self.iter_measurements() if str(name) not in results.done]
+            logger.info("Fitting {} stars ({} already in {}).".format(len(tasks), len(self) - len(tasks), filename))
+            if not tasks:
+                return results.summary
+
+            # Load everything the fits use (including the column-subset grids of the
+            # likelihood) once, before the grids are shared with the workers.
+            name, measurements = tasks[0]
+            mod = BasicStarModel(ic, name=name, **model_kwargs, **measurements)
+            mod.sample_from_prior(1)
+
+            start = time.time()
+
+            def record(i, result):
+                name, summary, star_samples, error = result
+                if error is not None:
+                    logger.error("Fit failed for {}:\n{}".format(name, error))
+                    return
+                results.append(name, summary, star_samples)
+                rate = (i + 1) / (time.time() - start) * 3600
+                logger.info("{} of {}: {} ({:.0f} stars/hour)".format(i + 1, len(tasks), name, rate))
+
+            if processes == 1:
+                _init_fit_worker(ic)
+                for i, result in enumerate(map(worker, tasks)):
+                    record(i, result)
+            else:
+                with SharedGridRegistry() as registry:
+                    registry.share(ic)
+                    # Forking after numba has started its parallel threads may hang, so spawn.
+                    context = multiprocessing.get_context("spawn")
+                    with context.Pool(processes, initializer=_init_fit_worker, initargs=(ic,)) as pool:
+                        for i, result in enumerate(pool.imap_unordered(worker, tasks)):
+                            record(i, result)
+
+            return results.summary
+
+
+# Model grid interpolator of a fitting process; see `StarCatalog.fit_all`
+_fit_ic = None
+
+
+def _init_fit_worker(ic):
+    global _fit_ic
+    _fit_ic = ic
+
+
+class fit_worker(object):
+    """Fits one star of a `StarCatalog`, with the interpolator given to `_init_fit_worker`
+
+    Called with (name, measurements), returns (name, summary, samples, error),
+    where error is the traceback of a failed fit (and summary and samples are None),
+    or None.
+    """
+
+    def __init__(self, model_kwargs=None, samples=True, columns=None, qs=None, fit_kwargs=None):
+        self.model_kwargs = model_kwargs or {}
+        self.samples = samples
+        self.columns = columns
+        self.qs = qs
+        self.fit_kwargs = fit_kwargs or {}
+
+    def __call__(self, task):
+        name, measurements = task
+        try:
+            mod = BasicStarModel(_fit_ic, name=name, **self.model_kwargs, **measurements)
+            mod.fit(**self.fit_kwargs)
+            samples = mod.derived_samples
+            summary = sample_quantiles(samples, str(name), columns=self.columns, qs=self.qs)
+        except KeyboardInterrupt:
+            raise
+        except Exception:
+            return name, None, None, traceback.format_exc()
+        return name, summary, samples if self.samples else None, None
+
+
+class FitResults(object):
+    """Results of fitting many stars, in a single HDF5 file
+
+    Summary quantiles are in the "summary" table (one row per star, indexed
+    by name), and samples in the "samples" table, with a "name" column.
+    A star's samples are written before its summary, so the stars in the
+    summary are those whose results are complete; on opening, samples of any
+    other star (from an interrupted write) are removed.
+
+    name_size: maximum length of star names (string columns of HDF5 tables
+        have a fixed size, set by the first write).
+    """
+
+    def __init__(self, filename, name_size=64):
+        self.filename = filename
+        self.name_size = name_size
+        self.store = pd.HDFStore(filename)
+
+        self.done = set()
+        if "/summary" in self.store.keys():
+            self.done = set(self.store.select_column("summary", "index"))
+        if "/samples" in self.store.keys():
+            for star in set(self.store.select_column("samples", "name").unique()) - self.done:
+                self.store.remove("samples", where="name == star")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.store.close()
+
+    @property
+    def summary(self):
+        if "/summary" in self.store.keys():
+            return self.store["summary"]
+        return pd.DataFrame()
+
+    def samples(self, name):
+        """Samples of one star
+        """
+        star = str(name)
+        return self.store.select("samples", where="name == star")
+
+    def append(self, name, summary, samples=None):
+        """Writes the results of one star (summary: one-row DataFrame)
+        """
+        name = str(name)
+        min_itemsize = {"name": self.name_size}
+        if samples is not None:
+            samples = samples.copy()
+            samples["name"] = name
+            self.store.append("samples", samples, data_columns=["name"], min_itemsize=min_itemsize)
+        summary = summary.copy()
+        summary.index = [name]
+        self.store.append("summary", summary, min_itemsize={"index": self.name_size})
+        self.store.flush(fsync=True)
+        self.done.add(name)
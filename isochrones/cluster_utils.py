@@ -6,13 +6,13 @@ from .utils import trapz
 from .priors import powerlaw_lnpdf
 
 
-@nb.jit(nopython=True)
+@nb.jit(nopython=True, cache=True)
 def logaddexp(x1, x2):
     xmax = max(x1, x2)
     return xmax + log(exp(x1 - xmax) + exp(x2 - xmax))
 
 
-@nb.jit(nopython=True)
+@nb.jit(nopython=True, cache=True)
 def logsumexp(xx):
     xmax = xx[0]
     n = len(xx)
@@ -27,7 +27,7 @@ def logsumexp(xx):
     return xmax + log(expsum)
 
 
-@nb.jit(nopython=True, parallel=True, nogil=True, fastmath=True)
+@nb.jit(nopython=True, parallel=True, nogil=True, fastmath=True, cache=True)
 def calc_lnlike_grid(
     lnlike_prop,
     model_mags,
@@ -105,7 +105,7 @@ def calc_lnlike_grid(
     return lnlikes
 
 
-@nb.jit(nopython=True, parallel=True, nogil=True, fastmath=True)
+@nb.jit(nopython=True, parallel=True, nogil=True, fastmath=True, cache=True)
 def integrate_over_eeps(lnlike_grid, eeps, Nstars):
 
     likes_marginalized = np.zeros(Nstars)
@@ -0,0 +1,205 @@
+"""Eager compilation of the numba kernels
+
+All kernels are jitted with ``cache=True``, so each call signature is compiled
+once and then loaded from numba's on-disk cache by every later process.
+:func:`warmup` exercises every signature used by the package, so that the cache
+can be filled ahead of time (e.g., once per node, before launching fitting workers),
+and reports the time spent per kernel.
+"""
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .config import GRID_MMAP_MODE, GRID_DTYPE
+from .logger import getLogger
+from .interp import interp_value_nd, interp_values_nd, interp_values_nd_parallel, interp_value_and_grad_nd
+from .interp import interp_inverses_nd, interp_inverses_nd_parallel, grid_axes, grid_strides
+from .interp import interp_eep, interp_eeps, interp_eeps_parallel, uniform_steps, dense_rows, CellCache
+from .mags import interp_mag, interp_mags, interp_mags_parallel, interp_mag_and_grad
+from .likelihood import star_lnlike, star_lnlikes, star_lnlikes_parallel, star_lnlike_and_grad
+from .likelihood import star_lnpost, star_lnposts, star_lnposts_parallel, tree_lnlike, gauss_lnprob, gauss_lnprobs
+from .priors import prior_lnpdf, FlatPrior, ChabrierPrior
+from .cluster_utils import calc_lnlike_grid, integrate_over_eeps
+from .utils import fast_addmags, trapz
+
+
+def time_call(fn, *args):
+    """Returns wall time of fn(*args), in seconds
+    """
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def _dummy_grids(n=4, n_model_cols=4, n_bc_cols=2):
+    """Small grids with the same types/layouts as the ones loaded by DFInterpolator
+
+    Grids memory-mapped with mmap_mode="r" are read-only, which numba
+    compiles as a separate signature, as are grids stored as float32.
+    """
+    model_ii = tuple(np.arange(n, dtype=float) for _ in range(3))
+    model_grid = np.ones((n, n, n, n_model_cols), dtype=GRID_DTYPE)
+    bc_ii = tuple(np.arange(n, dtype=float) for _ in range(4))
+    bc_grid = np.ones((n, n, n, n, n_bc_cols), dtype=GRID_DTYPE)
+    if GRID_MMAP_MODE == "r":
+        model_grid.setflags(write=False)
+        bc_grid.setflags(write=False)
+    return model_grid, model_ii, bc_grid, bc_ii
+
+
+def kernel_calls():
+    """Yields (name, function, args) for every kernel signature used by the package
+
+    Arguments are small dummy arrays, with dtypes and layouts matching those
+    constructed at the real call sites, so that compiling them here fills the
+    cache for the real calls as well.
+    """
+    model_grid, model_ii, bc_grid, bc_ii = _dummy_grids()
+    model_steps = uniform_steps(model_ii)
+    model_layout = (
+        model_grid.reshape(-1),
+        *grid_axes(model_ii),
+        model_steps,
+        grid_strides(model_grid.shape),
+        dense_rows(),
+    )
+    bc_layout = (
+        bc_grid.reshape(-1),
+        *grid_axes(bc_ii),
+        uniform_steps(bc_ii),
+        grid_strides(bc_grid.shape),
+        dense_rows(),
+    )
+    icols = np.arange(model_grid.shape[-1])
+    bc_cols = np.arange(bc_grid.shape[-1])
+    x = np.ones(3)
+
+    model_cache = CellCache(len(model_ii), 3).array
+    bc_cache = CellCache(len(bc_ii), 3).array
+
+    yield "interp_value_nd", interp_value_nd, (x, icols) + model_layout
+    yield "interp_value_nd:cached", interp_value_nd, (x, icols) + model_layout + (model_cache[0],)
+    yield "interp_value_and_grad_nd", interp_value_and_grad_nd, (x, icols) + model_layout
+    yield "interp_values_nd", interp_values_nd, (np.ones((3, 3)), icols) + model_layout
+    inverse_args = (x, np.ones((3, 3)), x, x, icols[:1]) + model_layout + (0.0,)
+    yield "interp_inverses_nd", interp_inverses_nd, inverse_args
+    yield "interp_inverses_nd_parallel", interp_inverses_nd_parallel, inverse_args
+    yield "interp_values_nd_parallel", interp_values_nd_parallel, (np.ones((3, 3)), icols) + model_layout
+
+    index_order = np.array([1, 2, 0, 3, 4], dtype=int)
+    pars = np.array([1.5, 1.5, 1.5, 100.0, 1.5])
+    mag_args = (index_order, 0, 1, 2, 3) + model_layout + (bc_cols,) + bc_layout + (3.1,)
+    yield "interp_mag", interp_mag, (pars,) + mag_args
+    yield "interp_mag:cached", interp_mag, (pars,) + mag_args + (model_cache[0], bc_cache[0])
+    yield "interp_mag_and_grad", interp_mag_and_grad, (pars,) + mag_args
+    yield "interp_mags", interp_mags, (np.ones((5, 3)),) + mag_args
+    yield "interp_mags_parallel", interp_mags_parallel, (np.ones((5, 3)),) + mag_args
+
+    arrays = np.tile(np.arange(10, dtype=float), (16, 1))
+    lengths = np.full(16, 10, dtype=int)
+    eep_args = grid_axes(model_ii[:2]) + (arrays, arrays, lengths, np.ones(16), model_steps[:2])
+    yield "interp_eep", interp_eep, (1.5, 1.5, 1.5) + eep_args
+    yield "interp_eeps", interp_eeps, (x, x, x) + eep_args
+    yield "interp_eeps_parallel", interp_eeps_parallel, (x, x, x) + eep_args
+
+    spec = np.ones(3)
+    mags = np.ones(len(bc_cols))
+    lnlike_args = (spec, spec, mags, mags, bc_cols, 0, 1, 2, 3) + model_layout + bc_layout + (3.1,)
+    yield "star_lnlike", star_lnlike, (pars, index_order) + lnlike_args
+    yield "star_lnlike:cached", star_lnlike, (pars, index_order) + lnlike_args + (model_cache, bc_cache)
+    yield "star_lnlike_and_grad", star_lnlike_and_grad, (pars, index_order) + lnlike_args
+    walkers = np.tile(pars, (3, 1))
+    yield "star_lnlikes", star_lnlikes, (walkers, index_order) + lnlike_args
+    yield "star_lnlikes_parallel", star_lnlikes_parallel, (walkers, index_order) + lnlike_args
+    prior_params = [FlatPrior((0.0, 2.0)).lnpdf_params() for _ in pars]
+    lnpost_args = (
+        np.concatenate(prior_params),
+        np.cumsum([0] + [len(a) for a in prior_params]),
+        np.tile(np.arange(5), (5, 1)),
+        icols[:2],
+        3,
+        np.ones(2),
+        icols[2:4],
+        np.ones(2),
+        np.ones(2),
+    )
+    yield "star_lnpost", star_lnpost, (pars,) + lnpost_args + (index_order,) + lnlike_args
+    yield "star_lnpost:cached", star_lnpost, (pars,) + lnpost_args + (index_order,) + lnlike_args + (
+        model_cache,
+        bc_cache,
+    )
+    yield "star_lnposts", star_lnposts, (walkers,) + lnpost_args + (index_order,) + lnlike_args
+    yield "star_lnposts_parallel", star_lnposts_parallel, (walkers,) + lnpost_args + (index_order,) + lnlike_args
+    # `observation.FlatTree` of a single star, with one observation of each kind
+    one, ones = np.zeros(1, dtype=int), np.ones(1)
+    tree = (np.arange(5).reshape(1, 5), one, np.arange(2), one, one, one - 1, ones, ones)
+    tree += (one, one, ones, ones) * 2 + (one + 3, ones, ones, one + 4, ones, ones)
+    tree_args = (index_order, 0, 1, 2, 3) + model_layout + (bc_cols,) + bc_layout + (3.1,)
+    yield "tree_lnlike", tree_lnlike, (pars,) + tree + tree_args
+    yield "prior_lnpdf", prior_lnpdf, (ChabrierPrior().lnpdf_params(), 1.0)
+    yield "gauss_lnprob", gauss_lnprob, (1.0, 0.1, 1.1)
+    yield "gauss_lnprobs", gauss_lnprobs, (1.0, 0.1, x)
+    yield "fast_addmags", fast_addmags, (mags,)
+    yield "trapz", trapz, (x, x)
+
+    n_eep, n_stars, n_bands = 5, 2, 2
+    grid_args = (
+        np.zeros((n_eep, n_stars)),
+        np.ones((n_eep, n_bands)),
+        n_bands,
+        np.linspace(0.5, 1.0, n_eep),
+        np.zeros(n_eep),
+        np.arange(n_eep, dtype=float),
+        np.ones((n_stars, n_bands)),
+        np.ones((n_stars, n_bands)),
+        -2.35,
+        0.3,
+        0.4,
+        0.1,
+        10.0,
+        0.1,
+    )
+    yield "calc_lnlike_grid", calc_lnlike_grid, grid_args
+    lnlike_grid = np.zeros((n_stars, n_eep, n_eep))
+    yield "integrate_over_eeps", integrate_over_eeps, (lnlike_grid, grid_args[5], n_stars)
+
+
+def warmup(ic=None, verbose=True):
+    """Compiles (or loads from cache) all numba kernels, and reports time per kernel
+
+    Parameters
+    ----------
+    ic : `ModelGridInterpolator` or str, optional
+        If provided (as an object or a name to pass to `get_ichrone`), then
+        `ic.initialize()` is also called, which loads its grids and runs
+        the kernels on them.
+
+    verbose : bool
+        Whether to log the time taken by each kernel.
+
+    Returns
+    -------
+    timings : OrderedDict
+        Time in seconds spent on the first call of each kernel.  On a cold
+        cache this is dominated by compilation; on a warm one, by loading.
+    """
+    timings = OrderedDict()
+    for name, fn, args in kernel_calls():
+        timings[name] = time_call(fn, *args)
+
+    if ic is not None:
+        if isinstance(ic, str):
+            from .isochrone import get_ichrone
+
+            ic = get_ichrone(ic)
+        for name, t in ic.initialize().items():
+            timings["{}:{}".format(ic.name, name)] = t
+
+    if verbose:
+        logger = getLogger()
+        for name, t in timings.items():
+            logger.info("{}: {:.2f} s".format(name, t))
+        logger.info("total: {:.2f} s".format(sum(timings.values())))
+
+    return timings
@@ -4,4 +4,24 @@ on_rtd = os.environ.get("READTHEDOCS") == "True"
 
 ISOCHRONES = os.getenv("ISOCHRONES", os.path.expanduser(os.path.join("~", ".isochrones")))
 
+# Default mmap_mode for loading full model/BC grids (e.g., "r" to share pages across processes)
+GRID_MMAP_MODE = os.getenv("ISOCHRONES_MMAP_MODE") or None
+
+# Storage dtype of model/BC grids ("float32" halves their memory; interpolation is still done in float64)
+GRID_DTYPE = os.getenv("ISOCHRONES_GRID_DTYPE") or "float64"
+
+# Whether to store NaN-padded model grids compactly (only the valid EEPs of each track/isochrone)
+GRID_RAGGED = os.getenv("ISOCHRONES_RAGGED_GRIDS", "False") == "True"
+
+# Whether star models remember the grid cells of the last likelihood evaluation (see `interp.CellCache`)
+CELL_CACHE = os.getenv("ISOCHRONES_CELL_CACHE", "False") == "True"
+
+# Whether star models evaluate their whole log-posterior (priors included) in a single compiled kernel
+COMPILED_LNPOST = os.getenv("ISOCHRONES_COMPILED_LNPOST", "False") == "True"
+
+# Vectorized interpolation switches to multi-threaded kernels for at least this many points,
+# using this many threads (default: numba's, i.e., the number of cores)
+PARALLEL_THRESHOLD = int(os.getenv("ISOCHRONES_PARALLEL_THRESHOLD", 10000))
+NUM_THREADS = int(os.getenv("ISOCHRONES_NUM_THREADS", 0)) or None
+
 POLYCHORD = os.getenv("POLYCHORD", os.path.expanduser(os.path.join("~", "PolyChord")))
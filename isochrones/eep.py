@@ -2,7 +2,7 @@ import numba as nb
 import numpy as np
 
 
-@nb.jit(nopython=True)
+@nb.jit(nopython=True, cache=True)
 def eep_fn(x, p5, p4, p3, p2, p1, p0, A, x0, tau, order=5):
     """Polynomial + exponential to approximate eep(age) for given track
     """
@@ -18,7 +18,7 @@ def eep_fn(x, p5, p4, p3, p2, p1, p0, A, x0, tau, order=5):
     return p5 * x ** 5 + p4 * x ** 4 + p3 * x ** 3 + p2 * x ** 2 + p1 * x + p0 + A * np.exp((x - x0) / tau)
 
 
-@nb.jit(nopython=True)
+@nb.jit(nopython=True, cache=True)
 def eep_jac(x, p5, p4, p3, p2, p1, p0, A, x0, tau, order=5):
     """Jacobian of eep_fn
     """
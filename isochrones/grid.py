@@ -2,12 +2,14 @@ import pandas as pd
 import os
 import tarfile
 
+from .config import GRID_MMAP_MODE, GRID_DTYPE, GRID_RAGGED
 from .utils import download_file
 from .interp import DFInterpolator
+from .shared import SharedArrayMixin
 from .logger import getLogger
 
 
-class Grid(object):
+class Grid(SharedArrayMixin):
     """Generalized model grid manager object
 
     This is the base class for model grids, defined as a set of
@@ -25,13 +27,20 @@ class Grid(object):
     **isochrones**, each of which is subclassed for specific cases: `StellarModelGrid`
     and `BolometricCorrectionGrid`.
 
-    Arbitrary keywords may be passed, and will be stored in the `.kwargs` attribute.
+    Arbitrary keywords may be passed, and will be stored in the `.kwargs` attribute,
+    except for `mmap_mode`, `dtype` and `ragged`, which are passed on to `DFInterpolator`
+    (defaults are the ``ISOCHRONES_MMAP_MODE``, ``ISOCHRONES_GRID_DTYPE`` and
+    ``ISOCHRONES_RAGGED_GRIDS`` environment variables, if set).
 
     The key attributes are
 
     * `.df`: the grid data as a single dataframe, and
     * `.interp`: `DFInterpolator` object of the grid data.
 
+    If the grid has been saved to disk by the interpolator (``interp_grid_npz_filename``,
+    along with its metadata file), then `.interp` is constructed from that alone,
+    and `.df` is only loaded when it is explicitly accessed.
+
     To subclass this, please see `StellarModelGrid` and `BolometricCorrectionGrid`
     as examples for the various methods that need to be implemented.
 
@@ -39,10 +48,14 @@ class Grid(object):
 
     index_cols = None
     is_full = False
+    ragged = False
     bounds = tuple()
 
-    def __init__(self, **kwargs):
+    def __init__(self, mmap_mode=GRID_MMAP_MODE, dtype=GRID_DTYPE, ragged=GRID_RAGGED, **kwargs):
 
+        self.mmap_mode = mmap_mode
+        self.dtype = dtype
+        self.ragged = ragged
         if hasattr(self, "default_kwargs"):
             self.kwargs = self.default_kwargs.copy()
         else:
@@ -54,10 +67,22 @@ class Grid(object):
         self._interp = None
         self._interp_orig = None
         self._limits = dict(self.bounds)
+        self._shared_arrays = {}
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        if self._interp is not None and self._interp.is_shared:
+            # Don't ship the dataframes along with a shared grid; they reload if needed.
+            state["_df"] = None
+            state["_df_orig"] = None
+        return state
 
     def get_limits(self, prop):
         if prop not in self._limits:
-            self._limits[prop] = self.df[prop].min(), self.df[prop].max()
+            try:
+                self._limits[prop] = self.interp.get_limits(prop)
+            except KeyError:
+                self._limits[prop] = self.df[prop].min(), self.df[prop].max()
         return self._limits[prop]
 
     @property
@@ -133,12 +158,28 @@ class Grid(object):
     def interp(self):
         if self._interp is None:
             filename = getattr(self, "interp_grid_npz_filename", None)
-            self._interp = DFInterpolator(self.df, filename=filename, is_full=self.is_full)
+            df = None if DFInterpolator.has_metadata(filename) else self.df
+            self._interp = DFInterpolator(
+                df,
+                filename=filename,
+                is_full=self.is_full,
+                mmap_mode=self.mmap_mode,
+                dtype=self.dtype,
+                ragged=self.ragged and not self.is_full,
+            )
         return self._interp
 
     @property
     def interp_orig(self):
         if self._interp_orig is None:
             filename = getattr(self, "interp_grid_orig_npz_filename", None)
-            self._interp_orig = DFInterpolator(self.df_orig, filename=filename, is_full=self.is_full)
+            df = None if DFInterpolator.has_metadata(filename) else self.df_orig
+            self._interp_orig = DFInterpolator(
+                df,
+                filename=filename,
+                is_full=self.is_full,
+                mmap_mode=self.mmap_mode,
+                dtype=self.dtype,
+                ragged=self.ragged and not self.is_full,
+            )
         return self._interp_orig
@@ -1,4 +1,6 @@
 import os
+import copy
+import json
 import itertools
 
 import numba as nb
@@ -6,8 +8,52 @@ from math import sqrt
 import numpy as np
 import pandas as pd
 
+from .config import PARALLEL_THRESHOLD, NUM_THREADS
+from .shared import SharedArrayMixin
 
-@nb.jit(nopython=True)
+# Settings for multi-threaded interpolation; see `set_parallel`.
+_parallel = {"threshold": PARALLEL_THRESHOLD, "num_threads": NUM_THREADS}
+
+
+def set_parallel(threshold=None, num_threads=None):
+    """Sets when and how vectorized interpolation uses multi-threaded kernels
+
+    Parameters
+    ----------
+    threshold : int, optional
+        Minimum number of points for which to use the parallel kernels
+        (default from ``ISOCHRONES_PARALLEL_THRESHOLD``, or 10000).
+
+    num_threads : int, optional
+        Number of threads for the parallel kernels (default from
+        ``ISOCHRONES_NUM_THREADS``, or all available to numba).
+    """
+    if threshold is not None:
+        _parallel["threshold"] = threshold
+    if num_threads is not None:
+        _parallel["num_threads"] = num_threads
+
+
+def use_parallel(n):
+    return n >= _parallel["threshold"]
+
+
+def call_parallel(fn, *args):
+    """Calls parallel kernel fn(*args) using the configured number of threads
+    """
+    num_threads = _parallel["num_threads"]
+    if num_threads is None:
+        return fn(*args)
+
+    previous = nb.get_num_threads()
+    nb.set_num_threads(min(num_threads, nb.config.NUMBA_NUM_THREADS))
+    try:
+        return fn(*args)
+    finally:
+        nb.set_num_threads(previous)
+
+
+@nb.jit(nopython=True, cache=True)
 def searchsorted(arr, x, N=-1):
     """N is length of arr
     """
@@ -35,7 +81,50 @@ def searchsorted(arr, x, N=-1):
     return L, eq
 
 
-@nb.jit(nopython=True)
+@nb.jit(nopython=True, cache=True)
+def find_index(arr, x, step):
+    """Same as searchsorted(arr, x), in constant time if arr is uniformly spaced by step
+
+    If step is 0 (irregular spacing), falls back to binary search.
+    """
+    if step <= 0:
+        return searchsorted(arr, x)
+
+    n = len(arr)
+    if x < arr[0]:
+        return 0, False
+
+    i = int((x - arr[0]) / step)
+    if i > n - 1:
+        i = n - 1
+
+    # Correct for round-off
+    while i > 0 and arr[i] > x:
+        i -= 1
+    while i < n - 1 and arr[i + 1] <= x:
+        i += 1
+
+    if arr[i] == x:
+        return i, True
+    return i + 1, False
+
+
+def uniform_steps(index_columns, rtol=1e-6):
+    """Returns the spacing of each uniformly spaced index array, or 0 for irregular ones
+
+    This is passed along with the index arrays to the interpolation functions,
+    which then find indices along uniform axes arithmetically (see `find_index`).
+    """
+    steps = np.zeros(len(index_columns), dtype=float)
+    for i, ii in enumerate(index_columns):
+        if len(ii) > 1:
+            step = (ii[-1] - ii[0]) / (len(ii) - 1)
+            if step > 0 and np.allclose(np.diff(ii), step, rtol=rtol, atol=0):
+                steps[i] = step
+    return steps
+
+
+@nb.jit(nopython=True, cache=True)
 def find_indices(point, iis):
     ndim = len(point)
 
@@ -60,433 +149,537 @@ def find_indices(point, iis):
     return indices, norm_distances, out_of_bounds
 
 
-@nb.jit(nopython=True)
-def find_indices_2d(x0, x1, ii0, ii1):
+def grid_axes(index_columns):
+    """Returns index arrays as a single 2D array padded with nans, and their lengths
 
-    n0 = len(ii0)
-    n1 = len(ii1)
+    Together with the flattened grid, the index steps (see `uniform_steps`),
+    and the grid strides (see `grid_strides`), these are what the N-dimensional
+    interpolation functions need to know about the grid (see `DFInterpolator.layout`).
+    """
+    lengths = np.array([len(ii) for ii in index_columns], dtype=int)
+    axes = np.full((len(index_columns), lengths.max()), np.nan)
+    for i, ii in enumerate(index_columns):
+        axes[i, : len(ii)] = ii
+    return axes, lengths
 
-    indices = np.empty(2, dtype=nb.uint32)
-    norm_distances = np.empty(2, dtype=nb.float64)
 
-    if (x0 < ii0[0]) or (x0 > ii0[n0 - 1]) or (x1 < ii1[0]) or (x1 > ii1[n1 - 1]):
-        return indices, norm_distances, True  # Out of bounds
+def grid_strides(shape):
+    """Element strides of a C-contiguous array of given shape
+    """
+    strides = np.ones(len(shape), dtype=int)
+    for i in range(len(shape) - 2, -1, -1):
+        strides[i] = strides[i + 1] * shape[i + 1]
+    return strides
 
-    ix, eq = searchsorted(ii0, x0)
-    if eq:
-        indices[0] = ix
-        norm_distances[0] = 0
-    else:
-        indices[0] = ix - 1
-        c0 = ii0[ix - 1]
-        norm_distances[0] = (x0 - c0) / (ii0[ix] - c0)
-
-    ix, eq = searchsorted(ii1, x1)
-    if eq:
-        indices[1] = ix
-        norm_distances[1] = 0
-    else:
-        indices[1] = ix - 1
-        c0 = ii1[ix - 1]
-        norm_distances[1] = (x1 - c0) / (ii1[ix] - c0)
 
-    return indices, norm_distances, False
+def dense_rows():
+    """Row table of a grid stored in full (see `ragged_grid`)
+    """
+    return np.empty((0, 3), dtype=int)
 
 
-@nb.jit(nopython=True)
-def find_indices_3d(x0, x1, x2, ii0, ii1, ii2):
+def ragged_grid(grid):
+    """Compact copy of an N+1-dimensional NaN-padded grid, storing only valid runs along the last index axis
 
-    n0 = len(ii0)
-    n1 = len(ii1)
-    n2 = len(ii2)
+    Each "row" of the grid (all grid points sharing the first N-1 indices)
+    is stored as the run from its first to its last grid point that has
+    any non-NaN column; rows are concatenated into a 2D (points, columns) array.
 
-    indices = np.empty(3, dtype=nb.uint32)
-    norm_distances = np.empty(3, dtype=nb.float64)
+    Returns the compact grid, and a table of (start, first, length) for each row,
+    in C order: the position of the row's run in the compact grid, the index
+    along the last axis at which the run begins, and its length.
+    """
+    shape = grid.shape
+    n_last = shape[-2]
+    n_cols = shape[-1]
+    points = grid.reshape(-1, n_cols)
+    valid = ~np.isnan(points).all(axis=1).reshape(-1, n_last)
+
+    any_valid = valid.any(axis=1)
+    first = np.where(any_valid, valid.argmax(axis=1), 0)
+    last = np.where(any_valid, n_last - valid[:, ::-1].argmax(axis=1), 0)
+    lengths = last - first
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+    j = np.arange(n_last)
+    in_run = (j >= first[:, None]) & (j < last[:, None])
+    rows = np.array([starts, first, lengths], dtype=int).T.copy()
+    return np.ascontiguousarray(points[in_run.ravel()]), rows
+
+
+def dense_grid(grid, rows, shape):
+    """Inverse of `ragged_grid`: full grid of given shape, padded with NaN
+    """
+    n_last = shape[-2]
+    dense = np.full((len(rows), n_last, shape[-1]), np.nan, dtype=grid.dtype)
+    for r, (start, first, length) in enumerate(rows):
+        dense[r, first : first + length] = grid[start : start + length]
+    return dense.reshape(shape)
 
-    if (
-        (x0 < ii0[0])
-        or (x0 > ii0[n0 - 1])
-        or (x1 < ii1[0])
-        or (x1 > ii1[n1 - 1])
-        or (x2 < ii2[0])
-        or (x2 > ii2[n2 - 1])
-    ):
-        return indices, norm_distances, True  # Out of bounds
 
-    ix, eq = searchsorted(ii0, x0)
-    if eq:
-        indices[0] = ix
-        norm_distances[0] = 0
-    else:
-        indices[0] = ix - 1
-        c0 = ii0[ix - 1]
-        norm_distances[0] = (x0 - c0) / (ii0[ix] - c0)
-
-    ix, eq = searchsorted(ii1, x1)
-    if eq:
-        indices[1] = ix
-        norm_distances[1] = 0
-    else:
-        indices[1] = ix - 1
-        c0 = ii1[ix - 1]
-        norm_distances[1] = (x1 - c0) / (ii1[ix] - c0)
-
-    ix, eq = searchsorted(ii2, x2)
-    if eq:
-        indices[2] = ix
-        norm_distances[2] = 0
-    else:
-        indices[2] = ix - 1
-        c0 = ii2[ix - 1]
-        norm_distances[2] = (x2 - c0) / (ii2[ix] - c0)
+@nb.jit(nopython=True, cache=True)
+def find_index_near(arr, x, i0):
+    """Same as searchsorted(arr, x), looking first in cell [i0, i0 + 1] and its neighbours
 
-    return indices, norm_distances, False
+    x must be within the bounds of arr.  Returns (index, eq, status), where
+    status is 0 if x is in cell i0, 1 if in a neighbouring cell, and 2 if
+    a binary search was needed.
+    """
+    n = len(arr)
+    status = 0
+    i = i0
+    if x < arr[i]:
+        status = 1
+        i -= 1
+        if i < 0 or x < arr[i]:
+            status = 2
+    elif i < n - 1 and x >= arr[i + 1]:
+        status = 1
+        i += 1
+        if i < n - 1 and x >= arr[i + 1]:
+            status = 2
 
+    if status < 2:
+        if arr[i] == x:
+            return i, True, status
+        return i + 1, False, status
 
-@nb.jit(nopython=True)
-def find_indices_4d(x0, x1, x2, x3, ii0, ii1, ii2, ii3):
+    ix, eq = searchsorted(arr, x)
+    return ix, eq, 2
 
-    n0 = len(ii0)
-    n1 = len(ii1)
-    n2 = len(ii2)
-    n3 = len(ii3)
 
-    indices = np.empty(4, dtype=nb.uint32)
-    norm_distances = np.empty(4, dtype=nb.float64)
+class CellCache(object):
+    """Remembers the grid cell of the last point interpolated at each of n call sites
 
-    if (
-        (x0 < ii0[0])
-        or (x0 > ii0[n0 - 1])
-        or (x1 < ii1[0])
-        or (x1 > ii1[n1 - 1])
-        or (x2 < ii2[0])
-        or (x2 > ii2[n2 - 1])
-        or (x3 < ii3[0])
-        or (x3 > ii3[n3 - 1])
-    ):
-        return indices, norm_distances, True  # Out of bounds
+    Successive points passed to an interpolation function along with a
+    cache row (e.g., by an MCMC chain) are first looked for in the same cell as
+    the previous point, then in its neighbours, before falling back to a binary
+    search on each irregularly spaced axis.  Uniform axes need no search (see
+    `find_index`).  The outcome of each lookup is counted as a hit (same cell),
+    a neighbour hit, or a miss.
 
-    ix, eq = searchsorted(ii0, x0)
-    if eq:
-        indices[0] = ix
-        norm_distances[0] = 0
-    else:
-        indices[0] = ix - 1
-        c0 = ii0[ix - 1]
-        norm_distances[0] = (x0 - c0) / (ii0[ix] - c0)
-
-    ix, eq = searchsorted(ii1, x1)
-    if eq:
-        indices[1] = ix
-        norm_distances[1] = 0
-    else:
-        indices[1] = ix - 1
-        c0 = ii1[ix - 1]
-        norm_distances[1] = (x1 - c0) / (ii1[ix] - c0)
-
-    ix, eq = searchsorted(ii2, x2)
-    if eq:
-        indices[2] = ix
-        norm_distances[2] = 0
-    else:
-        indices[2] = ix - 1
-        c0 = ii2[ix - 1]
-        norm_distances[2] = (x2 - c0) / (ii2[ix] - c0)
-
-    ix, eq = searchsorted(ii3, x3)
-    if eq:
-        indices[3] = ix
-        norm_distances[3] = 0
-    else:
-        indices[3] = ix - 1
-        c0 = ii3[ix - 1]
-        norm_distances[3] = (x3 - c0) / (ii3[ix] - c0)
+    Parameters
+    ----------
+    ndim : int
+        Number of grid dimensions.
 
-    return indices, norm_distances, False
+    n : int
+        Number of call sites (e.g., one per star component), each using one
+        row of ``array``.
+    """
 
+    def __init__(self, ndim, n=1):
+        self.ndim = ndim
+        self.array = np.empty((n, ndim + 3), dtype=int)
+        self.reset()
 
-@nb.jit(nopython=True)
-def interp_value_2d(x0, x1, grid, icols, ii0, ii1):
-    if x0 != x0 or x1 != x1:
-        return np.array([np.nan for i in icols])
+    def reset(self):
+        self.array[:, : self.ndim] = -1
+        self.array[:, self.ndim :] = 0
 
-    indices, norm_distances, out_of_bounds = find_indices_2d(x0, x1, ii0, ii1)
+    @property
+    def hits(self):
+        return int(self.array[:, self.ndim].sum())
 
-    if out_of_bounds:
-        return np.array([np.nan for i in icols])
-    # The following should be equivalent to
-    #  edges = np.array(list(itertools.product(*[[i, i+1] for i in indices])))
+    @property
+    def neighbour_hits(self):
+        return int(self.array[:, self.ndim + 1].sum())
 
-    ndim = 2
-    n_edges = 2 ** ndim
-    edges = np.zeros((n_edges, ndim))
-    for i in range(n_edges):
-        for j in range(ndim):
-            edges[i, j] = indices[j] + ((i >> (ndim - 1 - j)) & 1)  # woohoo!
+    @property
+    def misses(self):
+        return int(self.array[:, self.ndim + 2].sum())
 
-    n_values = len(icols)
-    values = np.zeros(n_values, dtype=nb.float64)
+    @property
+    def hit_rate(self):
+        """Fraction of lookups that needed no binary search
+        """
+        total = self.hits + self.neighbour_hits + self.misses
+        return (self.hits + self.neighbour_hits) / total if total else np.nan
 
-    for j in range(n_edges):
-        edge_indices = np.zeros(ndim, dtype=nb.uint32)
-        for k in range(ndim):
-            edge_indices[k] = edges[j, k]
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "neighbour_hits": self.neighbour_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
 
-        weight = 1.0
-        for ei, i, yi in zip(edge_indices, indices, norm_distances):
-            if ei == i:
-                weight *= 1 - yi
-            else:
-                weight *= yi
 
-        for i_icol in range(n_values):
-            icol = icols[i_icol]
+@nb.jit(nopython=True, cache=True)
+def find_indices_nd(point, axes, lengths, steps, indices, norm_distances, cache=None):
+    """Fills indices and norm_distances of point in an N-dimensional grid
 
-            # Now, get the value; this is why general ND doesn't work
-            grid_indices = (edge_indices[0], edge_indices[1], icol)
-            values[i_icol] += grid[grid_indices] * weight
+    cache : optional row of a `CellCache` array: the lower indices of the
+        previous point's cell, followed by hit, neighbour hit and miss counters.
+        If given, these are used as a starting guess and updated.
 
-    return values
+    Returns True if point is out of bounds (or nan).
+    """
+    ndim = len(lengths)
+    status = 0
+    for k in range(ndim):
+        x = point[k]
+        n = lengths[k]
+        ii = axes[k, :n]
+        if not (x >= ii[0] and x <= ii[n - 1]):
+            return True
+
+        near = False
+        if cache is not None:
+            near = steps[k] <= 0 and cache[k] >= 0
+        if near:
+            ix, eq, s = find_index_near(ii, x, cache[k])
+            status = max(status, s)
+        else:
+            ix, eq = find_index(ii, x, steps[k])
+            if steps[k] <= 0:
+                status = 2
+        if eq:
+            indices[k] = ix
+            norm_distances[k] = 0
+        else:
+            indices[k] = ix - 1
+            c0 = ii[ix - 1]
+            norm_distances[k] = (x - c0) / (ii[ix] - c0)
+
+    if cache is not None:
+        for k in range(ndim):
+            cache[k] = indices[k]
+        cache[ndim + status] += 1
+    return False
 
 
-@nb.jit(nopython=True)
-def interp_value_3d(x0, x1, x2, grid, icols, ii0, ii1, ii2):
-    if x0 != x0 or x1 != x1 or x2 != x2:
-        return np.array([np.nan for i in icols])
+@nb.jit(nopython=True, cache=True)
+def ragged_offset(offset, n_last, n_cols, rows):
+    """Position in a ragged grid of the grid point at the given offset into the full grid
 
-    indices, norm_distances, out_of_bounds = find_indices_3d(x0, x1, x2, ii0, ii1, ii2)
+    Returns -1 if the point is outside the stored run of its row (i.e., is NaN).
+    """
+    ipoint = offset // n_cols
+    row = ipoint // n_last
+    j = ipoint - row * n_last - rows[row, 1]
+    if j < 0 or j >= rows[row, 2]:
+        return -1
+    return (rows[row, 0] + j) * n_cols
 
-    if out_of_bounds:
-        return np.array([np.nan for i in icols])
-    # The following should be equivalent to
-    #  edges = np.array(list(itertools.product(*[[i, i+1] for i in indices])))
 
-    ndim = 3
-    n_edges = 2 ** ndim
-    edges = np.zeros((n_edges, ndim))
-    for i in range(n_edges):
-        for j in range(ndim):
-            edges[i, j] = indices[j] + ((i >> (ndim - 1 - j)) & 1)  # woohoo!
+@nb.jit(nopython=True, cache=True)
+def interp_value_nd(point, icols, grid, axes, lengths, steps, strides, rows, cache=None):
+    """Multilinear interpolation of grid columns icols at point, in any number of dimensions
 
+    grid : flattened N+1-dimensional grid, the last dimension being columns.
+    axes, lengths : index arrays, padded into a 2D array, and their lengths (see `grid_axes`)
+    steps : spacing of each index array, or 0 if irregular (see `uniform_steps`)
+    strides : element strides of the full N+1-dimensional grid (see `grid_strides`)
+    rows : for a ragged grid, the row table from `ragged_grid` (grid is then the
+        flattened compact grid); empty for a grid stored in full.
+    cache : optional row of a `CellCache` array (see `find_indices_nd`)
+    """
+    ndim = len(lengths)
     n_values = len(icols)
     values = np.zeros(n_values, dtype=nb.float64)
 
-    for j in range(n_edges):
-        edge_indices = np.zeros(ndim, dtype=nb.uint32)
-        for k in range(ndim):
-            edge_indices[k] = edges[j, k]
+    indices = np.empty(ndim, dtype=nb.intp)
+    norm_distances = np.empty(ndim, dtype=nb.float64)
+    if find_indices_nd(point, axes, lengths, steps, indices, norm_distances, cache):
+        values[:] = np.nan
+        return values
 
+    base = 0
+    for k in range(ndim):
+        base += indices[k] * strides[k]
+    ragged = len(rows) > 0
+
+    for corner in range(1 << ndim):
         weight = 1.0
-        for ei, i, yi in zip(edge_indices, indices, norm_distances):
-            if ei == i:
-                weight *= 1 - yi
+        offset = base
+        valid = True
+        for k in range(ndim):
+            if (corner >> (ndim - 1 - k)) & 1:
+                # Upper corner; beyond the edge only when exactly on the last grid value
+                if indices[k] + 1 == lengths[k]:
+                    valid = False
+                    break
+                weight *= norm_distances[k]
+                offset += strides[k]
             else:
-                weight *= yi
+                weight *= 1 - norm_distances[k]
 
-        for i_icol in range(n_values):
-            icol = icols[i_icol]
-
-            # Now, get the value; this is why general ND doesn't work
-            grid_indices = (edge_indices[0], edge_indices[1], edge_indices[2], icol)
-            values[i_icol] += grid[grid_indices] * weight
+        if valid:
+            if ragged:
+                offset = ragged_offset(offset, lengths[ndim - 1], strides[ndim - 1], rows)
+                if offset < 0:
+                    values[:] = np.nan
+                    return values
+            for i in range(n_values):
+                values[i] += grid[offset + icols[i]] * weight
 
     return values
 
 
-@nb.jit(nopython=True)
-def interp_value_4d(x0, x1, x2, x3, grid, icols, ii0, ii1, ii2, ii3):
-    if x0 != x0 or x1 != x1 or x2 != x2 or x3 != x3:
-        return np.array([np.nan for i in icols])
-
-    indices, norm_distances, out_of_bounds = find_indices_4d(x0, x1, x2, x3, ii0, ii1, ii2, ii3)
-
-    if out_of_bounds:
-        return np.array([np.nan for i in icols])
+@nb.jit(nopython=True, cache=True)
+def interp_value_and_grad_nd(point, icols, grid, axes, lengths, steps, strides, rows):
+    """Same as interp_value_nd, also returning partial derivatives with respect to each coordinate
 
-    # The following should be equivalent to
-    #  edges = np.array(list(itertools.product(*[[i, i+1] for i in indices])))
-
-    ndim = 4
-    n_edges = 2 ** ndim
-    edges = np.zeros((n_edges, ndim))
-    for i in range(n_edges):
-        for j in range(ndim):
-            edges[i, j] = indices[j] + ((i >> (ndim - 1 - j)) & 1)  # woohoo!
+    The interpolant is multilinear within each grid cell, so these are the
+    exact derivatives of the interpolated values inside a cell.  On a cell
+    boundary, the derivative along that axis is that of the cell above
+    (or below, on the upper edge of the grid).
 
+    Returns values (ncols,) and grad (ncols, ndim); all nan if the point is out
+    of bounds, or any of the corners of its cell are missing.
+    """
+    ndim = len(lengths)
     n_values = len(icols)
     values = np.zeros(n_values, dtype=nb.float64)
-
-    for j in range(n_edges):
-        edge_indices = np.zeros(ndim, dtype=nb.uint32)
-        for k in range(ndim):
-            edge_indices[k] = edges[j, k]
-
+    grad = np.zeros((n_values, ndim), dtype=nb.float64)
+
+    indices = np.empty(ndim, dtype=nb.intp)
+    norm_distances = np.empty(ndim, dtype=nb.float64)
+    if find_indices_nd(point, axes, lengths, steps, indices, norm_distances):
+        values[:] = np.nan
+        grad[:, :] = np.nan
+        return values, grad
+
+    inv_widths = np.zeros(ndim, dtype=nb.float64)
+    for k in range(ndim):
+        if lengths[k] == 1:
+            continue
+        if indices[k] + 1 == lengths[k]:
+            # Upper edge: use the cell below, at its upper corner
+            indices[k] -= 1
+            norm_distances[k] = 1.0
+        inv_widths[k] = 1.0 / (axes[k, indices[k] + 1] - axes[k, indices[k]])
+
+    base = 0
+    for k in range(ndim):
+        base += indices[k] * strides[k]
+    ragged = len(rows) > 0
+
+    dweights = np.empty(ndim, dtype=nb.float64)
+    for corner in range(1 << ndim):
         weight = 1.0
-        for ei, i, yi in zip(edge_indices, indices, norm_distances):
-            if ei == i:
-                weight *= 1 - yi
+        offset = base
+        valid = True
+        for k in range(ndim):
+            dweights[k] = 1.0
+        for k in range(ndim):
+            if (corner >> (ndim - 1 - k)) & 1:
+                if lengths[k] == 1:
+                    valid = False
+                    break
+                w = norm_distances[k]
+                dw = inv_widths[k]
+                offset += strides[k]
             else:
-                weight *= yi
-
-        for i_icol in range(n_values):
-            icol = icols[i_icol]
-
-            # Now, get the value; this is why general ND doesn't work
-            grid_indices = (edge_indices[0], edge_indices[1], edge_indices[2], edge_indices[3], icol)
-            values[i_icol] += grid[grid_indices] * weight
-
-    return values
-
-
-@nb.jit(nopython=True)
-def interp_values_2d(xx0, xx1, grid, icols, ii0, ii1):
-    """xx1, xx2, xx3 are all arrays at which values are desired
-
-
+                w = 1 - norm_distances[k]
+                dw = -inv_widths[k]
+            # d(weight)/dx_k is the product of the other factors, times dw
+            for j in range(ndim):
+                if j == k:
+                    dweights[j] *= dw
+                else:
+                    dweights[j] *= w
+            weight *= w
+
+        if valid:
+            if ragged:
+                offset = ragged_offset(offset, lengths[ndim - 1], strides[ndim - 1], rows)
+                if offset < 0:
+                    values[:] = np.nan
+                    grad[:, :] = np.nan
+                    return values, grad
+            for i in range(n_values):
+                v = grid[offset + icols[i]]
+                values[i] += v * weight
+                for k in range(ndim):
+                    grad[i, k] += v * dweights[k]
+
+    return values, grad
+
+
+@nb.jit(nopython=True, nogil=True, cache=True)
+def interp_values_nd(points, icols, grid, axes, lengths, steps, strides, rows):
+    """Same as interp_value_nd, for points of shape (ndim, N); returns (N, len(icols)) array
     """
-
-    N = len(xx0)
+    ndim = len(lengths)
+    N = points.shape[1]
     ncols = len(icols)
     results = np.empty((N, ncols), dtype=nb.float64)
+    point = np.empty(ndim, dtype=nb.float64)
     for i in range(N):
-        res = interp_value_2d(xx0[i], xx1[i], grid, icols, ii0, ii1)
+        for k in range(ndim):
+            point[k] = points[k, i]
+        res = interp_value_nd(point, icols, grid, axes, lengths, steps, strides, rows)
         for j in range(ncols):
             results[i, j] = res[j]
 
     return results
 
 
-@nb.jit(nopython=True)
-def interp_values_3d(xx0, xx1, xx2, grid, icols, ii0, ii1, ii2):
-    """xx1, xx2, xx3 are all arrays at which values are desired
-
-
+@nb.jit(nopython=True, parallel=True, nogil=True, cache=True)
+def interp_values_nd_parallel(points, icols, grid, axes, lengths, steps, strides, rows):
+    """Multi-threaded version of interp_values_nd
     """
-
-    N = len(xx0)
+    ndim = len(lengths)
+    N = points.shape[1]
     ncols = len(icols)
     results = np.empty((N, ncols), dtype=nb.float64)
-    for i in range(N):
-        res = interp_value_3d(xx0[i], xx1[i], xx2[i], grid, icols, ii0, ii1, ii2)
+    for i in nb.prange(N):
+        point = np.empty(ndim, dtype=nb.float64)
+        for k in range(ndim):
+            point[k] = points[k, i]
+        res = interp_value_nd(point, icols, grid, axes, lengths, steps, strides, rows)
         for j in range(ncols):
             results[i, j] = res[j]
 
     return results
 
 
-@nb.jit(nopython=True)
-def interp_values_4d(xx0, xx1, xx2, xx3, grid, icols, ii0, ii1, ii2, ii3):
-    """xx1, xx2, xx3 are all arrays at which values are desired
-
-
+@nb.jit(nopython=True, cache=True)
+def _inverse_node_value(point, j, icol, grid, axes, lengths, steps, strides, rows):
+    """Value of column icol at point, with the last coordinate set to its j-th grid value
     """
+    point[len(lengths) - 1] = axes[len(lengths) - 1, j]
+    return interp_value_nd(point, icol, grid, axes, lengths, steps, strides, rows)[0]
 
-    N = len(xx0)
-    ncols = len(icols)
-    results = np.empty((N, ncols), dtype=nb.float64)
-    for i in range(N):
-        res = interp_value_4d(xx0[i], xx1[i], xx2[i], xx3[i], grid, icols, ii0, ii1, ii2, ii3)
-        for j in range(ncols):
-            results[i, j] = res[j]
 
-    return results
+@nb.jit(nopython=True, cache=True)
+def interp_inverse_nd(val, point, lo, hi, icol, grid, axes, lengths, steps, strides, rows, tol):
+    """Value of the last coordinate, between lo and hi, at which column icol is equal to val
 
+    The first ndim - 1 coordinates are fixed by point (its last entry is ignored,
+    and overwritten).  Along the last axis, the interpolated column is linear
+    between grid values, so it is evaluated at those only: first to trim
+    [lo, hi] to the run of grid values where the column is defined, then to
+    bisect for a segment that brackets val (assuming val is crossed once, i.e., the
+    column is monotone there), within which the crossing is found exactly.
 
-@nb.jit(nopython=True)
-def sign(x):
-    if x < 0:
-        return -1
-    else:
-        return 1
-
-
-# @jit(nopython=True)
-def find_closest3(
-    val, a, b, v1, v2, grid, icol, ii1, ii2, ii3, bisect_tol=0.5, newton_tol=0.01, max_iter=100, debug=False
-):
-    """Find value of 3rd index array where interp_value is closest to val
+    If val is not bracketed by the column values at the ends of the defined run,
+    but is within tol of the closer one, that end (clamped to [lo, hi]) is returned.
 
-    val : value to match
-    a, b: min and max x-value to serch
-=   x1, x2 : first and second values to pass to inter_values
-    grid : 4d grid
-    icol : index of value dimension of grid
-    ii1, ii2, ii3 : grid dimension arrays
+    Returns nan if val is not bracketed (nor within tol of an end),
+    or if the crossing is outside [lo, hi] (or any coordinate is out of bounds).
     """
-
-    # First, do a bisect search to get it close
-    done = False
-    ya = interp_value_3d(v1, v2, a, grid, icol, ii1, ii2, ii3) - val
-    yb = interp_value_3d(v1, v2, b, grid, icol, ii1, ii2, ii3) - val
-    if debug:
-        print("Initial values: {}: {}".format((a, b), (ya, yb)))
-
-    if yb != yb or ya != ya:
-        # bounds are nan, return nan.
-        return np.nan
-    elif abs(ya) < newton_tol:
-        return float(a)
-    elif abs(yb) < newton_tol:
-        return float(b)
-    elif ya > 0 and yb > 0:
-        return np.nan
-    elif yb < 0 and yb < 0:
+    ndim = len(lengths)
+    n = lengths[ndim - 1]
+    ii = axes[ndim - 1, :n]
+    if not (lo <= hi and hi >= ii[0] and lo <= ii[n - 1]):
         return np.nan
 
-    else:
-        if debug:
-            print("doing bisect search...")
-
-        while not done:
-            c = (a + b) / 2
-            yc = interp_value_3d(v1, v2, c, grid, icol, ii1, ii2, ii3) - val
-            if yc == 0 or (b - a) / 2 < bisect_tol:
-                done = True
-            if sign(yc) == sign(ya):  # (yc >= 0 and ya >= 0) or (yc < 0 and ya < 0):
-                a = c
-                ya = yc
+    # Grid values around [lo, hi]
+    ja = 0
+    if lo > ii[0]:
+        ja, eq = find_index(ii, lo, steps[ndim - 1])
+        if not eq:
+            ja -= 1
+    jb = n - 1
+    if hi < ii[n - 1]:
+        jb, eq = find_index(ii, hi, steps[ndim - 1])
+
+    ya = _inverse_node_value(point, ja, icol, grid, axes, lengths, steps, strides, rows) - val
+    yb = _inverse_node_value(point, jb, icol, grid, axes, lengths, steps, strides, rows) - val
+
+    # Trim to where the column is defined (assumed contiguous)
+    if ya != ya and yb != yb:
+        return np.nan
+    elif yb != yb:
+        j_ok, j_bad = ja, jb
+        while j_bad - j_ok > 1:
+            j = (j_ok + j_bad) // 2
+            y = _inverse_node_value(point, j, icol, grid, axes, lengths, steps, strides, rows) - val
+            if y == y:
+                j_ok = j
+                yb = y
             else:
-                b = c
-                yb = yc
-            if debug:
-                print("{0} {1}".format((a, b, c), (ya, yb, yc)))
-
-    # Now, use the value at index c to seed Newton-secant algorithm
-    tol = 1000.0
-    i = 0
-    x0 = c
-    y0 = yc
-    x1 = x0 + 0.1
-    y1 = interp_value_3d(v1, v2, x1, grid, icol, ii1, ii2, ii3) - val
-
-    if debug:
-        print("Newton-secant method...")
-    while tol > newton_tol and i < max_iter:
-        newx = (x0 * y1 - x1 * y0) / (y1 - y0)
-        x0 = x1
-        y0 = y1
-        x1 = newx
-        y1 = interp_value_3d(v1, v2, x1, grid, icol, ii1, ii2, ii3) - val
-
-        # Boo!
-        while not y1 == y1:
-            if debug:
-                print("{0} {1}".format(x1, y1))
-            raise RuntimeError("ran into nan." + "run {} with debug=True to see why.".format((val, v2, v1)))
-
-        if y1 >= 0:
-            tol = y1
+                j_bad = j
+        jb = j_ok
+        if jb == ja:
+            yb = ya
+    elif ya != ya:
+        j_bad, j_ok = ja, jb
+        while j_ok - j_bad > 1:
+            j = (j_bad + j_ok) // 2
+            y = _inverse_node_value(point, j, icol, grid, axes, lengths, steps, strides, rows) - val
+            if y == y:
+                j_ok = j
+                ya = y
+            else:
+                j_bad = j
+        ja = j_ok
+        if ja == jb:
+            ya = yb
+
+    # Bisect for a bracketing segment
+    if ya == 0:
+        jb = ja
+    elif yb == 0:
+        ja = jb
+    elif (ya > 0) == (yb > 0):
+        if min(abs(ya), abs(yb)) > tol:
+            return np.nan
+        x = ii[ja] if abs(ya) <= abs(yb) else ii[jb]
+        return min(max(x, lo), hi)
+    while jb - ja > 1:
+        j = (ja + jb) // 2
+        y = _inverse_node_value(point, j, icol, grid, axes, lengths, steps, strides, rows) - val
+        if y != y:
+            return np.nan
+        if y == 0:
+            ja = jb = j
+            ya = yb = y
+        elif (y > 0) == (ya > 0):
+            ja = j
+            ya = y
         else:
-            tol = -y1
-        i += 1
-        if debug:
-            print("{0} {1}".format(x1, y1))
+            jb = j
+            yb = y
+
+    if ja == jb:
+        x = ii[ja]
+    else:
+        x = ii[ja] + ya / (ya - yb) * (ii[jb] - ii[ja])
+    if x < lo or x > hi:
+        return np.nan
+    return x
+
+
+@nb.jit(nopython=True, nogil=True, cache=True)
+def interp_inverses_nd(vals, points, los, his, icol, grid, axes, lengths, steps, strides, rows, tol):
+    """Vectorized interp_inverse_nd; points is (ndim, N), of which the last row is ignored
+    """
+    ndim = len(lengths)
+    n = len(vals)
+    results = np.empty(n, dtype=nb.float64)
+    point = np.empty(ndim, dtype=nb.float64)
+    for i in range(n):
+        for k in range(ndim):
+            point[k] = points[k, i]
+        results[i] = interp_inverse_nd(
+            vals[i], point, los[i], his[i], icol, grid, axes, lengths, steps, strides, rows, tol
+        )
+    return results
 
-    return x1
+
+@nb.jit(nopython=True, parallel=True, nogil=True, cache=True)
+def interp_inverses_nd_parallel(vals, points, los, his, icol, grid, axes, lengths, steps, strides, rows, tol):
+    """Multi-threaded version of interp_inverses_nd
+    """
+    ndim = len(lengths)
+    n = len(vals)
+    results = np.empty(n, dtype=nb.float64)
+    for i in nb.prange(n):
+        point = np.empty(ndim, dtype=nb.float64)
+        for k in range(ndim):
+            point[k] = points[k, i]
+        results[i] = interp_inverse_nd(
+            vals[i], point, los[i], his[i], icol, grid, axes, lengths, steps, strides, rows, tol
+        )
+    return results
 
 
-@nb.jit(nopython=True)
-def interp_eeps(xs, x0s, x1s, ii0, ii1, n1, arrays, weight_arrays, lengths):
+@nb.jit(nopython=True, nogil=True, cache=True)
+def interp_eeps(xs, x0s, x1s, axes, axis_lengths, arrays, weight_arrays, lengths, first_eeps, steps):
     n = len(xs)
     results = np.empty(n, dtype=nb.float64)
 
@@ -494,30 +687,57 @@ def interp_eeps(xs, x0s, x1s, ii0, ii1, n1, arrays, weight_arrays, lengths):
         x = xs[i]
         x0 = x0s[i]
         x1 = x1s[i]
-        results[i] = interp_eep(x, x0, x1, ii0, ii1, n1, arrays, weight_arrays, lengths)
+        results[i] = interp_eep(x, x0, x1, axes, axis_lengths, arrays, weight_arrays, lengths, first_eeps, steps)
+
+    return results
+
+
+@nb.jit(nopython=True, parallel=True, nogil=True, cache=True)
+def interp_eeps_parallel(xs, x0s, x1s, axes, axis_lengths, arrays, weight_arrays, lengths, first_eeps, steps):
+    """Multi-threaded version of interp_eeps
+    """
+    n = len(xs)
+    results = np.empty(n, dtype=nb.float64)
+
+    for i in nb.prange(n):
+        results[i] = interp_eep(
+            xs[i], x0s[i], x1s[i], axes, axis_lengths, arrays, weight_arrays, lengths, first_eeps, steps
+        )
 
     return results
 
 
-@nb.jit(nopython=True)
-def interp_eep(x, x0, x1, ii0, ii1, n1, arrays, weight_arrays, lengths):
+@nb.jit(nopython=True, cache=True)
+def interp_eep(x, x0, x1, axes, axis_lengths, arrays, weight_arrays, lengths, first_eeps, steps):
     """
+
+    axes, axis_lengths : the two index arrays of the rows of arrays (see `grid_axes`)
+    arrays : values of x along EEP (age along tracks, or initial mass along isochrones),
+        one row per (ii0, ii1) pair, starting at EEP first_eeps[row]
+    steps : spacing of ii0 and ii1, or 0 if irregular (see `uniform_steps`)
     """
 
     if x != x or x0 != x0 or x1 != x1:
         return np.nan
 
-    (i0, i1), (d0, d1), oob = find_indices_2d(x0, x1, ii0, ii1)
-
-    if oob:
+    point = np.empty(2, dtype=nb.float64)
+    point[0] = x0
+    point[1] = x1
+    indices = np.empty(2, dtype=nb.intp)
+    norm_distances = np.empty(2, dtype=nb.float64)
+    if find_indices_nd(point, axes, axis_lengths, steps, indices, norm_distances):
         return np.nan
 
+    i0, i1 = indices[0], indices[1]
+    d0, d1 = norm_distances[0], norm_distances[1]
+    n1 = axis_lengths[1]
+
     ind_00 = i0 * n1 + i1
     ind_01 = i0 * n1 + (i1 + 1)
     ind_10 = (i0 + 1) * n1 + i1
     ind_11 = (i0 + 1) * n1 + (i1 + 1)
 
-    # The EEP value is just the same as the index + 1
+    # The EEP value is the index plus the EEP of the first element
     i_eep_00, _ = searchsorted(arrays[ind_00, :], x, N=lengths[ind_00])
     i_eep_01, _ = searchsorted(arrays[ind_01, :], x, N=lengths[ind_01])
     i_eep_10, _ = searchsorted(arrays[ind_10, :], x, N=lengths[ind_10])
@@ -527,10 +747,10 @@ def interp_eep(x, x0, x1, ii0, ii1, n1, arrays, weight_arrays, lengths):
     if (i_eep_00 > max_i_eep) or (i_eep_01 > max_i_eep) or (i_eep_10 > max_i_eep) or (i_eep_11 > max_i_eep):
         return np.nan
 
-    eep_00 = i_eep_00 + 1
-    eep_01 = i_eep_01 + 1
-    eep_10 = i_eep_10 + 1
-    eep_11 = i_eep_11 + 1
+    eep_00 = i_eep_00 + first_eeps[ind_00]
+    eep_01 = i_eep_01 + first_eeps[ind_01]
+    eep_10 = i_eep_10 + first_eeps[ind_10]
+    eep_11 = i_eep_11 + first_eeps[ind_11]
 
     w_00 = weight_arrays[ind_00, i_eep_00]
     w_01 = weight_arrays[ind_01, i_eep_01]
@@ -568,32 +788,190 @@ def interp_eep(x, x0, x1, ii0, ii1, n1, arrays, weight_arrays, lengths):
     # return a_00 + a_10 * d0 + a_01 * d1 + a_11 * (d0 * d1)
 
 
-class DFInterpolator(object):
+class DFInterpolator(SharedArrayMixin):
     """Interpolate column values of DataFrame with full-grid hierarchical index
 
+    If ``filename`` is provided, the full grid is saved next to it as an
+    uncompressed ``.npy`` file, with the column names in ``filename`` (``.npz``)
+    and a small JSON metadata file (columns, index levels, shape, and column limits).
+    Once these exist, the interpolator may be constructed with ``df=None``,
+    without needing the DataFrame at all.
+
+    If ``mmap_mode`` is given (e.g., ``"r"``), the grid is memory-mapped
+    rather than read into memory, so that it is paged in lazily and shared
+    (via the OS page cache) by all processes using it.  Alternatively, the grid may be
+    placed in shared memory with `isochrones.shared.SharedGridRegistry`.
+
+    The grid is stored as ``dtype``, which may be ``"float32"`` to halve its
+    memory footprint; interpolated values are always accumulated and returned
+    in float64.  A float32 copy of the grid is saved (``<filename>_float32.npy``)
+    alongside the float64 one.
+
+    If ``ragged`` is True, then rather than the full NaN-padded grid, only the
+    runs of valid grid points along the last index axis (e.g., EEP) are stored,
+    together with a table locating each run (see `ragged_grid`).  ``grid`` is then
+    the 2D (points, columns) compact grid; ``shape`` is always that of the full grid.
     """
 
-    def __init__(self, df, filename=None, recalc=False, is_full=False):
+    def __init__(
+        self, df=None, filename=None, recalc=False, is_full=False, mmap_mode=None, dtype="float64", ragged=False
+    ):
 
         self.filename = filename
         self.is_full = is_full
-        self.columns = list(df.columns)
+        self.mmap_mode = mmap_mode
+        self.dtype = np.dtype(dtype)
+        self.ragged = ragged
+        self._limits = None
+        self._shared_arrays = {}
+        if df is None:
+            metadata = self.read_metadata()
+            self.columns = list(metadata["columns"])
+            self.index_names = list(metadata["index_names"])
+            index_levels = metadata["index_levels"]
+            self._limits = {k: tuple(v) for k, v in metadata["limits"].items()}
+        else:
+            self.columns = list(df.columns)
+            self.index_names = df.index.names
+            index_levels = df.index.levels
         self.n_columns = len(self.columns)
-        self.grid = self._make_grid(df, recalc=recalc)
-        self.index_columns = tuple(np.array(l, dtype=float) for l in df.index.levels)
-        self.index_names = df.index.names
+        self.index_columns = tuple(np.array(l, dtype=float) for l in index_levels)
+        self.shape = tuple(len(ii) for ii in self.index_columns) + (self.n_columns,)
+        self.grid, self.rows = self._make_grid(df, recalc=recalc)
+        self.index_steps = uniform_steps(self.index_columns)
+        self.axes, self.axis_lengths = grid_axes(self.index_columns)
+        self.strides = grid_strides(self.shape)
 
         self.ndim = len(self.index_columns)
 
         self.column_index = {c: self.columns.index(c) for c in self.columns}
 
+        if df is not None and self.filename is not None and not self.has_metadata(self.filename):
+            self.write_metadata()
+
+    @property
+    def layout(self):
+        """Arguments describing the grid to the N-dimensional interpolation functions
+
+        (flattened grid, axes, axis lengths, index steps, strides, rows); e.g.,
+        ``interp_value_nd(point, icols, *interp.layout)``.
+        """
+        return self.grid.reshape(-1), self.axes, self.axis_lengths, self.index_steps, self.strides, self.rows
+
+    @property
+    def dense_grid(self):
+        """The full N+1-dimensional grid (a copy, if the grid is ragged)
+        """
+        if self.ragged:
+            return dense_grid(self.grid, self.rows, self.shape)
+        return self.grid
+
+    @staticmethod
+    def get_metadata_filename(filename):
+        return "{}.json".format(os.path.splitext(filename)[0])
+
+    @classmethod
+    def has_metadata(cls, filename):
+        """True if both grid and metadata files exist, so no DataFrame is needed
+        """
+        return (
+            filename is not None
+            and os.path.exists(filename)
+            and os.path.exists(cls.get_metadata_filename(filename))
+        )
+
+    @property
+    def metadata_filename(self):
+        return self.get_metadata_filename(self.filename)
+
+    @property
+    def grid_filename(self):
+        return self.get_grid_filename(self.dtype, self.ragged)
+
+    @property
+    def rows_filename(self):
+        return "{}_rows.npy".format(os.path.splitext(self.filename)[0])
+
+    def get_grid_filename(self, dtype="float64", ragged=False):
+        base = os.path.splitext(self.filename)[0]
+        if ragged:
+            base += "_ragged"
+        if np.dtype(dtype) != np.float64:
+            base += "_{}".format(np.dtype(dtype).name)
+        return "{}.npy".format(base)
+
+    def _storage(self, grid):
+        """Returns (grid, rows) to store, in the storage dtype and layout, given the full float64 grid
+        """
+        if self.ragged:
+            grid, rows = ragged_grid(grid)
+        else:
+            rows = dense_rows()
+        return np.ascontiguousarray(grid, dtype=self.dtype), rows
+
+    def save_grid(self, grid):
+        """Saves full float64 grid, and a copy in the storage dtype and layout if that is different
+        """
+        np.save(self.get_grid_filename(), grid)
+        if self.grid_filename != self.get_grid_filename():
+            self._save_storage(grid)
+
+    def _save_storage(self, grid):
+        grid, rows = self._storage(grid)
+        np.save(self.grid_filename, grid)
+        if self.ragged:
+            np.save(self.rows_filename, rows)
+
+    def read_metadata(self):
+        if not self.has_metadata(self.filename):
+            raise ValueError("Must provide df if grid and metadata files do not exist ({}).".format(self.filename))
+        with open(self.metadata_filename) as fin:
+            return json.load(fin)
+
+    def write_metadata(self):
+        metadata = dict(
+            columns=self.columns,
+            index_names=list(self.index_names),
+            index_levels=[list(ii) for ii in self.index_columns],
+            shape=list(self.shape),
+            limits={k: list(v) for k, v in self.limits.items()},
+        )
+        with open(self.metadata_filename, "w") as fout:
+            json.dump(metadata, fout)
+
+    @property
+    def limits(self):
+        """Dictionary of (min, max) for each column and index level
+        """
+        if self._limits is None:
+            limits = {}
+            for name, ii in zip(self.index_names, self.index_columns):
+                limits[name] = (float(ii.min()), float(ii.max()))
+            for i, col in enumerate(self.columns):
+                vals = self.grid[..., i]
+                limits[col] = (float(np.nanmin(vals)), float(np.nanmax(vals)))
+            self._limits = limits
+        return self._limits
+
+    def get_limits(self, col):
+        return self.limits[col]
+
     def _make_grid(self, df, recalc=False):
         if self.filename is not None and os.path.exists(self.filename) and not recalc:
             d = np.load(self.filename)
-            grid = d["grid"]
             columns = d["columns"]
             if not all(columns == self.columns):
                 raise ValueError("DataFrame columns do not match columns loaded from full grid!")
+            if not os.path.exists(self.get_grid_filename()):
+                # Older layout, with the grid inside the npz
+                np.save(self.get_grid_filename(), d["grid"])
+                np.savez(self.filename, columns=columns)
+            if not os.path.exists(self.grid_filename) or (self.ragged and not os.path.exists(self.rows_filename)):
+                self._save_storage(np.load(self.get_grid_filename()))
+            grid = np.load(self.grid_filename, mmap_mode=self.mmap_mode)
+            rows = np.load(self.rows_filename) if self.ragged else dense_rows()
+        elif df is None:
+            raise ValueError("Must provide df to compute grid.")
         else:
             if not self.is_full:  # Need to make a full grid and pad with nans
                 idx = pd.MultiIndex.from_tuples([ixs for ixs in itertools.product(*df.index.levels)])
@@ -609,90 +987,141 @@ class DFInterpolator(object):
             grid = np.array(grid_df.values, dtype=float).reshape(shape)
 
             if self.filename is not None:
-                np.savez(self.filename, grid=grid, columns=self.columns)
-
-        return grid
+                self.save_grid(grid)
+                np.savez(self.filename, columns=self.columns)
+                if os.path.exists(self.metadata_filename):
+                    os.remove(self.metadata_filename)
+            grid, rows = self._storage(grid)
+
+        return grid, rows
+
+    def subset(self, columns, filename=None):
+        """Returns an interpolator of a compact copy of the grid, with only the given columns
+
+        Interpolating a few columns of the subset grid touches much less memory
+        than of the full grid, in which all columns are stored contiguously.
+        If ``filename`` is given, the subset grid is saved there, in the same
+        format as the full grid, so it can later be loaded with
+        ``DFInterpolator(filename=filename)``.
+        """
+        icols = [self.column_index[c] for c in columns]
+        new = copy.copy(self)
+        new.filename = filename
+        new.columns = list(columns)
+        new.n_columns = len(new.columns)
+        new.column_index = {c: i for i, c in enumerate(new.columns)}
+        new.shape = self.shape[:-1] + (new.n_columns,)
+        new.strides = grid_strides(new.shape)
+        new._limits = None
+        new._shared_arrays = {}
+
+        if filename is None:
+            new.grid = np.ascontiguousarray(self.grid[..., icols])
+        else:
+            if self.filename is not None:
+                # Subset the full float64 grid, so that the saved float64 subset is exact
+                grid = np.load(self.get_grid_filename(), mmap_mode="r")[..., icols]
+            else:
+                grid = self.dense_grid[..., icols]
+            grid = np.asarray(grid, dtype=float)
+            new.save_grid(grid)
+            np.savez(filename, columns=new.columns)
+            new.grid, new.rows = new._storage(grid)
+            new.write_metadata()
+            if new.mmap_mode is not None:
+                new.grid = np.load(new.grid_filename, mmap_mode=new.mmap_mode)
+        return new
 
     def add_column(self, values, name):
-        newgrid = np.empty((self.grid.shape[:-1]) + (self.n_columns + 1,))
-        newgrid[..., :-1] = self.grid
+        newgrid = np.empty(self.shape[:-1] + (self.n_columns + 1,), dtype=self.dtype)
+        newgrid[..., :-1] = self.dense_grid
         newgrid[..., -1] = values
         self.column_index[name] = self.n_columns
         self.n_columns += 1
         self.columns += [name]
-        self.grid = newgrid
+        if self.ragged:
+            self.grid, self.rows = ragged_grid(newgrid)
+        else:
+            self.grid = newgrid
+        self.shape = newgrid.shape
+        self.strides = grid_strides(self.shape)
+        self._limits = None
+
+    def invert(self, val, p, col, lo=None, hi=None, tol=0.0):
+        """Value of the last index coordinate at which column col is equal to val
+
+        The other coordinates are fixed at p (ndim - 1 values or arrays, broadcast
+        against val, lo, and hi).  E.g., the EEP of given initial mass on
+        an isochrone, or of given age along an evolution track.  The search
+        is restricted to [lo, hi] (default: the whole axis), within which the
+        column is assumed to be monotonic where defined.
+
+        Returns nan where there is no solution, unless val is within tol of the
+        column at the end of the search range; see `interp_inverse_nd`.
+        """
+        icol = np.array([self.column_index[col]])
+        ii = self.index_columns[-1]
+        lo = ii[0] if lo is None else lo
+        hi = ii[-1] if hi is None else hi
+        args = list(p[: self.ndim - 1]) + [val, lo, hi]
+
+        if all(isinstance(x, float) or isinstance(x, int) for x in args):
+            point = np.array(list(p[: self.ndim - 1]) + [0.0], dtype=float)
+            return interp_inverse_nd(float(val), point, float(lo), float(hi), icol, *self.layout, float(tol))
+
+        b = np.broadcast(*args)
+        args = [np.resize(x, b.shape).astype(float).ravel() for x in args]
+        points = np.array(args[: self.ndim - 1] + [np.zeros(b.size)])
+        vals, los, his = args[self.ndim - 1 :]
+        if use_parallel(b.size):
+            x = call_parallel(interp_inverses_nd_parallel, vals, points, los, his, icol, *self.layout, float(tol))
+        else:
+            x = interp_inverses_nd(vals, points, los, his, icol, *self.layout, float(tol))
+        return x.reshape(b.shape)
 
     def find_closest(self, val, lo, hi, v1, v2, col="initial_mass", debug=False):
-        icol = self.column_index[col]
+        """Value of the third index coordinate, between lo and hi, where col is val at (v1, v2)
 
-        if self.ndim == 3:
-            return find_closest3(val, lo, hi, v1, v2, self.grid, icol, *self.index_columns, debug=debug)
+        debug is ignored; it is kept for compatibility with the former bisection search.
+        """
+        return self.invert(val, [v1, v2], col, lo=lo, hi=hi)
 
-    def __call__(self, p, cols="all"):
-        if cols is "all":
+    def value_and_grad(self, p, cols="all"):
+        """Interpolated values of columns cols at point p, and their gradient
+
+        Returns values (ncols,) and grad (ncols, ndim); see `interp_value_and_grad_nd`.
+        """
+        if isinstance(cols, str) and cols == "all":
             icols = np.arange(self.n_columns)
         else:
             icols = np.array([self.column_index[col] for col in cols])
-        args = (p, self.grid, icols, self.index_columns)
-
-        if self.ndim == 2:
-            args = (p[0], p[1], self.grid, icols, self.index_columns[0], self.index_columns[1])
-            if (isinstance(p[0], float) or isinstance(p[0], int)) and (
-                isinstance(p[1], float) or isinstance(p[1], int)
-            ):
-                values = interp_value_2d(*args)
-            else:
-                b = np.broadcast(*p)
-                pp = [np.atleast_1d(np.resize(x, b.shape)).astype(float) for x in p]
-                args = (*pp, self.grid, icols, *self.index_columns)
-                # print([(a, type(a)) for a in args])
-                values = interp_values_2d(*args)
-        if self.ndim == 3:
-            args = (
-                p[0],
-                p[1],
-                p[2],
-                self.grid,
-                icols,
-                self.index_columns[0],
-                self.index_columns[1],
-                self.index_columns[2],
-            )
-            if (
-                (isinstance(p[0], float) or isinstance(p[0], int))
-                and (isinstance(p[1], float) or isinstance(p[1], int))
-                and (isinstance(p[2], float) or isinstance(p[2], int))
-            ):
-                values = interp_value_3d(*args)
+        point = np.array(p[: self.ndim], dtype=float)
+        return interp_value_and_grad_nd(point, icols, *self.layout)
+
+    def __call__(self, p, cols="all", cache=None):
+        """Interpolated values of columns cols at point(s) p
+
+        cache : `CellCache`, optional
+            Used (and updated) for single-point calls, to speed up the lookup
+            of points close to the previous one.
+        """
+        if isinstance(cols, str) and cols == "all":
+            icols = np.arange(self.n_columns)
+        else:
+            icols = np.array([self.column_index[col] for col in cols])
+
+        if all(isinstance(x, float) or isinstance(x, int) for x in p[: self.ndim]):
+            point = np.array(p[: self.ndim], dtype=float)
+            if cache is not None:
+                values = interp_value_nd(point, icols, *self.layout, cache.array[0])
             else:
-                b = np.broadcast(*p)
-                pp = [np.atleast_1d(np.resize(x, b.shape)).astype(float) for x in p]
-                args = (*pp, self.grid, icols, *self.index_columns)
-                # print([(a, type(a)) for a in args])
-                values = interp_values_3d(*args)
-        elif self.ndim == 4:
-            args = (
-                p[0],
-                p[1],
-                p[2],
-                p[3],
-                self.grid,
-                icols,
-                self.index_columns[0],
-                self.index_columns[1],
-                self.index_columns[2],
-                self.index_columns[3],
-            )
-            if (
-                (isinstance(p[0], float) or isinstance(p[0], int))
-                and (isinstance(p[1], float) or isinstance(p[1], int))
-                and (isinstance(p[2], float) or isinstance(p[2], int))
-                and (isinstance(p[3], float) or isinstance(p[3], int))
-            ):
-                values = interp_value_4d(*args)
+                values = interp_value_nd(point, icols, *self.layout)
+        else:
+            b = np.broadcast(*p)
+            points = np.array([np.resize(x, b.shape).astype(float).ravel() for x in p[: self.ndim]])
+            if use_parallel(points.shape[1]):
+                values = call_parallel(interp_values_nd_parallel, points, icols, *self.layout)
             else:
-                b = np.broadcast(*p)
-                pp = [np.atleast_1d(np.resize(x, b.shape)).astype(float) for x in p]
-                values = interp_values_4d(*pp, self.grid, icols, *self.index_columns)
+                values = interp_values_nd(points, icols, *self.layout)
 
         return values
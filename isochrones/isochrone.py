@@ -31,7 +31,7 @@ if not on_rtd:
     RSUN = const.R_sun.cgs.value
 
     # from .extinction import EXTINCTION, LAMBDA_EFF, extcurve, extcurve_0
-    # from .interp import DFInterpolator, searchsorted, find_closest3
+    # from .interp import DFInterpolator, searchsorted
     # from .utils import polyval
     from .models import ModelGridInterpolator
 
@@ -1,19 +1,57 @@
-from isochrones.mags import interp_mag
+from collections import namedtuple
+
+from isochrones.mags import interp_mag, interp_mag_and_grad
+from .interp import interp_value_nd
+from .priors import prior_lnpdf, EEP
 from .utils import fast_addmags
+import numpy as np
 import numba as nb
-from math import pi, log, sqrt
+from math import pi, log, log10, sqrt
 
 
 LOG_ONE_OVER_ROOT_2PI = log(1.0 / sqrt(2 * pi))
 
 
-@nb.jit(nopython=True)
+# Everything a `BasicStarModel` needs to evaluate its likelihood and prior, gathered
+# once (see `BasicStarModel.lnlike_context`) rather than on every call:
+#   n_params: number of parameters
+#   args: arguments of `star_lnlike` following pars (observations, and grid layouts)
+#   model_interp: `DFInterpolator` of the model grid columns used by the likelihood
+#   parallax, nu_max, delta_nu: (value, uncertainty), or None if not observed
+#   distance_index: index of distance in pars
+#   priors: (index, lnpdf) of each parameter other than EEP
+#   eep_lnpdf, eep_indices, eep_kwargs: lnpdf of the EEP prior, indices of the EEP
+#       parameters, and (name, index) of the parameters it is conditioned on
+#   lower, width: bounds of the parameters, for `mnest_prior`
+#   lnpost_args: arguments of `star_lnpost` following pars, if the model uses it
+LikelihoodContext = namedtuple(
+    "LikelihoodContext",
+    [
+        "n_params",
+        "args",
+        "model_interp",
+        "parallax",
+        "nu_max",
+        "delta_nu",
+        "distance_index",
+        "priors",
+        "eep_lnpdf",
+        "eep_indices",
+        "eep_kwargs",
+        "lower",
+        "width",
+        "lnpost_args",
+    ],
+)
+
+
+@nb.jit(nopython=True, cache=True)
 def gauss_lnprob(val, unc, model_val):
     resid = val - model_val
     return LOG_ONE_OVER_ROOT_2PI + log(unc) - 0.5 * resid * resid / (unc * unc)
 
 
-@nb.jit(nopython=True)
+@nb.jit(nopython=True, cache=True)
 def star_lnlike(
     pars,
     index_order,
@@ -22,102 +60,93 @@ def star_lnlike(
     mag_vals,
     mag_uncs,
     i_mags,
-    model_grid,
     i_Teff,
     i_logg,
     i_feh,
     i_Mbol,
-    model_ii0,
-    model_ii1,
-    model_ii2,
+    model_grid,
+    model_axes,
+    model_lengths,
+    model_steps,
+    model_strides,
+    model_rows,
     bc_grid,
-    bc_ii0,
-    bc_ii1,
-    bc_ii2,
-    bc_ii3,
+    bc_axes,
+    bc_lengths,
+    bc_steps,
+    bc_strides,
+    bc_rows,
+    Rv,
+    model_cache=None,
+    bc_cache=None,
 ):
+    """Log-likelihood of a system of one or more unresolved stars
 
-    n_pars = len(pars)
-    has_binary = False
-    has_triple = False
-    if n_pars == 5:
-        single_pars = [pars[0], pars[1], pars[2], pars[3], pars[4]]
-    elif n_pars == 6:  # binary system
-        single_pars = [pars[0], pars[2], pars[3], pars[4], pars[5]]
-        binary_pars = [pars[1], pars[2], pars[3], pars[4], pars[5]]
-        has_binary = True
-    elif n_pars == 7:  # triple system
-        single_pars = [pars[0], pars[3], pars[4], pars[5], pars[6]]
-        binary_pars = [pars[1], pars[3], pars[4], pars[5], pars[6]]
-        triple_pars = [pars[2], pars[3], pars[4], pars[5], pars[6]]
-        has_binary = True
-        has_triple = True
-
-    Teff, logg, feh, mags = interp_mag(
-        single_pars,
-        index_order,
-        model_grid,
-        i_Teff,
-        i_logg,
-        i_feh,
-        i_Mbol,
-        model_ii0,
-        model_ii1,
-        model_ii2,
-        bc_grid,
-        i_mags,
-        bc_ii0,
-        bc_ii1,
-        bc_ii2,
-        bc_ii3,
-    )
+    pars are (eep_0, ..., eep_{N-1}, age, feh, distance, AV), or the
+    equivalent for any other parameterization with a single (e.g., mass) per star.
 
-    if has_binary:
-        _, _, _, mags_binary = interp_mag(
-            binary_pars,
-            index_order,
-            model_grid,
-            i_Teff,
-            i_logg,
-            i_feh,
-            i_Mbol,
-            model_ii0,
-            model_ii1,
-            model_ii2,
-            bc_grid,
-            i_mags,
-            bc_ii0,
-            bc_ii1,
-            bc_ii2,
-            bc_ii3,
-        )
+    model_cache, bc_cache : optional `CellCache` arrays for the model and BC grid
+        lookups, with a row for each star.
+    """
+    n_stars = len(pars) - 4
+    n_bands = len(i_mags)
+
+    # Each star has its own EEP (or mass), followed by the shared (age, feh, distance, AV)
+    star_pars = np.empty(5, dtype=nb.float64)
+    for j in range(4):
+        star_pars[j + 1] = pars[n_stars + j]
 
-    if has_triple:
-        _, _, _, mags_triple = interp_mag(
-            triple_pars,
+    Teff = logg = feh = np.nan
+    mags = np.empty(n_bands, dtype=nb.float64)
+    fluxes = np.zeros(n_bands, dtype=nb.float64)
+    for s in range(n_stars):
+        star_pars[0] = pars[s]
+        model_cache_s = None
+        if model_cache is not None:
+            model_cache_s = model_cache[s]
+        bc_cache_s = None
+        if bc_cache is not None:
+            bc_cache_s = bc_cache[s]
+
+        Teff_s, logg_s, feh_s, mags_s = interp_mag(
+            star_pars,
             index_order,
-            model_grid,
             i_Teff,
             i_logg,
             i_feh,
             i_Mbol,
-            model_ii0,
-            model_ii1,
-            model_ii2,
-            bc_grid,
+            model_grid,
+            model_axes,
+            model_lengths,
+            model_steps,
+            model_strides,
+            model_rows,
             i_mags,
-            bc_ii0,
-            bc_ii1,
-            bc_ii2,
-            bc_ii3,
+            bc_grid,
+            bc_axes,
+            bc_lengths,
+            bc_steps,
+            bc_strides,
+            bc_rows,
+            Rv,
+            model_cache_s,
+            bc_cache_s,
         )
 
-    if n_pars == 6:
-        for i in range(len(mags)):
-            mags[i] = fast_addmags([mags[i], mags_binary[i]])
-    elif n_pars == 7:
-        for i in range(len(mags)):
-            mags[i] = fast_addmags([mags[i], mags_binary[i], mags_triple[i]])
+        # Spectroscopic properties are those of the primary
+        if s == 0:
+            Teff = Teff_s
+            logg = logg_s
+            feh = feh_s
+        for i in range(n_bands):
+            if s == 0:
+                mags[i] = mags_s[i]
+            fluxes[i] += 10 ** (-0.4 * mags_s[i])
+
+    # Unresolved magnitudes: sum of the fluxes of all stars
+    if n_stars > 1:
+        for i in range(n_bands):
+            mags[i] = -2.5 * log10(fluxes[i])
 
     lnlike = 0
 
@@ -145,3 +174,659 @@ def star_lnlike(
         lnlike += gauss_lnprob(val, unc, mags[i])
 
     return lnlike
+
+
+@nb.jit(nopython=True, cache=True)
+def gauss_lnprobs(val, unc, model_vals):
+    """gauss_lnprob of each of model_vals
+    """
+    n = len(model_vals)
+    results = np.empty(n, dtype=nb.float64)
+    for i in range(n):
+        results[i] = gauss_lnprob(val, unc, model_vals[i])
+    return results
+
+
+@nb.jit(nopython=True, cache=True)
+def _model_point(pars, indices, index_order, ndim):
+    # Model grid point of the star whose parameters are pars[indices]
+    point = np.empty(ndim, dtype=nb.float64)
+    for k in range(ndim):
+        point[k] = pars[indices[index_order[k]]]
+    return point
+
+
+@nb.jit(nopython=True, cache=True)
+def star_lnpost(
+    pars,
+    prior_params,
+    prior_offsets,
+    star_indices,
+    i_eep_cols,
+    i_distance,
+    parallax,
+    i_astero_cols,
+    nu_max,
+    delta_nu,
+    index_order,
+    spec_vals,
+    spec_uncs,
+    mag_vals,
+    mag_uncs,
+    i_mags,
+    i_Teff,
+    i_logg,
+    i_feh,
+    i_Mbol,
+    model_grid,
+    model_axes,
+    model_lengths,
+    model_steps,
+    model_strides,
+    model_rows,
+    bc_grid,
+    bc_axes,
+    bc_lengths,
+    bc_steps,
+    bc_strides,
+    bc_rows,
+    Rv,
+    model_cache=None,
+    bc_cache=None,
+):
+    """Log-posterior of a system of N stars: priors, then star_lnlike, parallax and asteroseismology
+
+    prior_params[prior_offsets[i]:prior_offsets[i + 1]] : `Prior.lnpdf_params` of the prior on pars[i].
+    star_indices : (n_pars, 5) indices in pars of the parameters (in isochrone order) of the
+        star that each parameter belongs to (the primary, for shared parameters).  EEP priors
+        are evaluated at these, interpolating model grid columns i_eep_cols (orig_par, deriv_prop).
+    parallax, nu_max, delta_nu : (value, uncertainty), or empty if not observed.
+    i_astero_cols : model grid columns of nu_max and delta_nu.
+
+    Returns -inf as soon as the prior is not finite, without evaluating the likelihood.
+    """
+    n_pars = len(pars)
+    n_stars = n_pars - 4
+    ndim = len(model_lengths)
+
+    # Stars in decreasing order of EEP, as in `BasicStarModel.lnprior`
+    for s in range(1, n_stars):
+        if pars[s] > pars[s - 1]:
+            return -np.inf
+
+    lnprior = 0.0
+    for i in range(n_pars):
+        params = prior_params[prior_offsets[i] : prior_offsets[i + 1]]
+        if int(params[0]) == EEP:
+            # Same as EEP_prior: orig_prior(orig_val) * d(orig_val)/d(eep)
+            x = pars[i]
+            if x < params[1] or x > params[2]:
+                return -np.inf
+            point = _model_point(pars, star_indices[i], index_order, ndim)
+            vals = interp_value_nd(
+                point, i_eep_cols, model_grid, model_axes, model_lengths, model_steps, model_strides, model_rows
+            )
+            orig_val = vals[0]
+            if orig_val < params[3] or orig_val > params[4]:
+                return -np.inf
+            lnp = prior_lnpdf(params[5:], orig_val) + np.log(vals[1])
+        else:
+            lnp = prior_lnpdf(params, pars[i])
+        if not np.isfinite(lnp):
+            return -np.inf
+        lnprior += lnp
+
+    lnlike = star_lnlike(
+        pars,
+        index_order,
+        spec_vals,
+        spec_uncs,
+        mag_vals,
+        mag_uncs,
+        i_mags,
+        i_Teff,
+        i_logg,
+        i_feh,
+        i_Mbol,
+        model_grid,
+        model_axes,
+        model_lengths,
+        model_steps,
+        model_strides,
+        model_rows,
+        bc_grid,
+        bc_axes,
+        bc_lengths,
+        bc_steps,
+        bc_strides,
+        bc_rows,
+        Rv,
+        model_cache,
+        bc_cache,
+    )
+
+    if len(parallax) > 0:
+        lnlike += gauss_lnprob(parallax[0], parallax[1], 1000.0 / pars[i_distance])
+
+    # Asteroseismology, of the primary
+    if len(nu_max) > 0:
+        point = _model_point(pars, star_indices[0], index_order, ndim)
+        vals = interp_value_nd(
+            point, i_astero_cols, model_grid, model_axes, model_lengths, model_steps, model_strides, model_rows
+        )
+        lnlike += gauss_lnprob(nu_max[0], nu_max[1], vals[0])
+        if len(delta_nu) > 0:
+            lnlike += gauss_lnprob(delta_nu[0], delta_nu[1], vals[1])
+
+    return lnprior + lnlike
+
+
+@nb.jit(nopython=True, nogil=True, cache=True)
+def star_lnlikes(
+    P,
+    index_order,
+    spec_vals,
+    spec_uncs,
+    mag_vals,
+    mag_uncs,
+    i_mags,
+    i_Teff,
+    i_logg,
+    i_feh,
+    i_Mbol,
+    model_grid,
+    model_axes,
+    model_lengths,
+    model_steps,
+    model_strides,
+    model_rows,
+    bc_grid,
+    bc_axes,
+    bc_lengths,
+    bc_steps,
+    bc_strides,
+    bc_rows,
+    Rv,
+):
+    """star_lnlike of each row of P (n, n_pars), e.g. the positions of an ensemble of walkers
+    """
+    n = P.shape[0]
+    results = np.empty(n, dtype=nb.float64)
+    for i in range(n):
+        results[i] = star_lnlike(
+            P[i],
+            index_order,
+            spec_vals,
+            spec_uncs,
+            mag_vals,
+            mag_uncs,
+            i_mags,
+            i_Teff,
+            i_logg,
+            i_feh,
+            i_Mbol,
+            model_grid,
+            model_axes,
+            model_lengths,
+            model_steps,
+            model_strides,
+            model_rows,
+            bc_grid,
+            bc_axes,
+            bc_lengths,
+            bc_steps,
+            bc_strides,
+            bc_rows,
+            Rv,
+        )
+    return results
+
+
+@nb.jit(nopython=True, parallel=True, nogil=True, cache=True)
+def star_lnlikes_parallel(
+    P,
+    index_order,
+    spec_vals,
+    spec_uncs,
+    mag_vals,
+    mag_uncs,
+    i_mags,
+    i_Teff,
+    i_logg,
+    i_feh,
+    i_Mbol,
+    model_grid,
+    model_axes,
+    model_lengths,
+    model_steps,
+    model_strides,
+    model_rows,
+    bc_grid,
+    bc_axes,
+    bc_lengths,
+    bc_steps,
+    bc_strides,
+    bc_rows,
+    Rv,
+):
+    """Multi-threaded version of star_lnlikes
+    """
+    n = P.shape[0]
+    results = np.empty(n, dtype=nb.float64)
+    for i in nb.prange(n):
+        results[i] = star_lnlike(
+            P[i],
+            index_order,
+            spec_vals,
+            spec_uncs,
+            mag_vals,
+            mag_uncs,
+            i_mags,
+            i_Teff,
+            i_logg,
+            i_feh,
+            i_Mbol,
+            model_grid,
+            model_axes,
+            model_lengths,
+            model_steps,
+            model_strides,
+            model_rows,
+            bc_grid,
+            bc_axes,
+            bc_lengths,
+            bc_steps,
+            bc_strides,
+            bc_rows,
+            Rv,
+        )
+    return results
+
+
+@nb.jit(nopython=True, nogil=True, cache=True)
+def star_lnposts(
+    P,
+    prior_params,
+    prior_offsets,
+    star_indices,
+    i_eep_cols,
+    i_distance,
+    parallax,
+    i_astero_cols,
+    nu_max,
+    delta_nu,
+    index_order,
+    spec_vals,
+    spec_uncs,
+    mag_vals,
+    mag_uncs,
+    i_mags,
+    i_Teff,
+    i_logg,
+    i_feh,
+    i_Mbol,
+    model_grid,
+    model_axes,
+    model_lengths,
+    model_steps,
+    model_strides,
+    model_rows,
+    bc_grid,
+    bc_axes,
+    bc_lengths,
+    bc_steps,
+    bc_strides,
+    bc_rows,
+    Rv,
+):
+    """star_lnpost of each row of P (n, n_pars), e.g. the positions of an ensemble of walkers
+    """
+    n = P.shape[0]
+    results = np.empty(n, dtype=nb.float64)
+    for i in range(n):
+        results[i] = star_lnpost(
+            P[i],
+            prior_params,
+            prior_offsets,
+            star_indices,
+            i_eep_cols,
+            i_distance,
+            parallax,
+            i_astero_cols,
+            nu_max,
+            delta_nu,
+            index_order,
+            spec_vals,
+            spec_uncs,
+            mag_vals,
+            mag_uncs,
+            i_mags,
+            i_Teff,
+            i_logg,
+            i_feh,
+            i_Mbol,
+            model_grid,
+            model_axes,
+            model_lengths,
+            model_steps,
+            model_strides,
+            model_rows,
+            bc_grid,
+            bc_axes,
+            bc_lengths,
+            bc_steps,
+            bc_strides,
+            bc_rows,
+            Rv,
+        )
+    return results
+
+
+@nb.jit(nopython=True, parallel=True, nogil=True, cache=True)
+def star_lnposts_parallel(
+    P,
+    prior_params,
+    prior_offsets,
+    star_indices,
+    i_eep_cols,
+    i_distance,
+    parallax,
+    i_astero_cols,
+    nu_max,
+    delta_nu,
+    index_order,
+    spec_vals,
+    spec_uncs,
+    mag_vals,
+    mag_uncs,
+    i_mags,
+    i_Teff,
+    i_logg,
+    i_feh,
+    i_Mbol,
+    model_grid,
+    model_axes,
+    model_lengths,
+    model_steps,
+    model_strides,
+    model_rows,
+    bc_grid,
+    bc_axes,
+    bc_lengths,
+    bc_steps,
+    bc_strides,
+    bc_rows,
+    Rv,
+):
+    """Multi-threaded version of star_lnposts
+    """
+    n = P.shape[0]
+    results = np.empty(n, dtype=nb.float64)
+    for i in nb.prange(n):
+        results[i] = star_lnpost(
+            P[i],
+            prior_params,
+            prior_offsets,
+            star_indices,
+            i_eep_cols,
+            i_distance,
+            parallax,
+            i_astero_cols,
+            nu_max,
+            delta_nu,
+            index_order,
+            spec_vals,
+            spec_uncs,
+            mag_vals,
+            mag_uncs,
+            i_mags,
+            i_Teff,
+            i_logg,
+            i_feh,
+            i_Mbol,
+            model_grid,
+            model_axes,
+            model_lengths,
+            model_steps,
+            model_strides,
+            model_rows,
+            bc_grid,
+            bc_axes,
+            bc_lengths,
+            bc_steps,
+            bc_strides,
+            bc_rows,
+            Rv,
+        )
+    return results
+
+
+@nb.jit(nopython=True, cache=True)
+def star_lnlike_and_grad(
+    pars,
+    index_order,
+    spec_vals,
+    spec_uncs,
+    mag_vals,
+    mag_uncs,
+    i_mags,
+    i_Teff,
+    i_logg,
+    i_feh,
+    i_Mbol,
+    model_grid,
+    model_axes,
+    model_lengths,
+    model_steps,
+    model_strides,
+    model_rows,
+    bc_grid,
+    bc_axes,
+    bc_lengths,
+    bc_steps,
+    bc_strides,
+    bc_rows,
+    Rv,
+):
+    """Same as star_lnlike, also returning its gradient with respect to pars
+
+    pars are (eep_0, ..., eep_{N-1}, age, feh, distance, AV) (or with
+    mass in place of age), the first star being the primary.
+    """
+    n_pars = len(pars)
+    n_stars = n_pars - 4
+    n_bands = len(i_mags)
+
+    star_pars = np.empty(5, dtype=nb.float64)
+    spec_props = np.empty(3, dtype=nb.float64)
+    d_spec_props = np.empty((3, 5), dtype=nb.float64)
+    star_mags = np.empty((n_stars, n_bands), dtype=nb.float64)
+    d_star_mags = np.empty((n_stars, n_bands, 5), dtype=nb.float64)
+    for c in range(n_stars):
+        star_pars[0] = pars[c]
+        for j in range(1, 5):
+            star_pars[j] = pars[n_stars + j - 1]
+        Teff, logg, feh, mags, d_props, d_mags = interp_mag_and_grad(
+            star_pars,
+            index_order,
+            i_Teff,
+            i_logg,
+            i_feh,
+            i_Mbol,
+            model_grid,
+            model_axes,
+            model_lengths,
+            model_steps,
+            model_strides,
+            model_rows,
+            i_mags,
+            bc_grid,
+            bc_axes,
+            bc_lengths,
+            bc_steps,
+            bc_strides,
+            bc_rows,
+            Rv,
+        )
+        if c == 0:
+            spec_props[0] = Teff
+            spec_props[1] = logg
+            spec_props[2] = feh
+            d_spec_props[:, :] = d_props
+        star_mags[c, :] = mags
+        d_star_mags[c, :, :] = d_mags
+
+    lnlike = 0
+    grad = np.zeros(n_pars, dtype=nb.float64)
+
+    # Spec_vals are Teff, logg, feh, of the primary
+    for q in range(3):
+        val = spec_vals[q]
+        unc = spec_uncs[q]
+        if val == val:  # Skip if nan
+            lnlike += gauss_lnprob(val, unc, spec_props[q])
+            dlnlike = (val - spec_props[q]) / (unc * unc)
+            grad[0] += dlnlike * d_spec_props[q, 0]
+            for j in range(1, 5):
+                grad[n_stars + j - 1] += dlnlike * d_spec_props[q, j]
+
+    for i in range(n_bands):
+        if n_stars == 1:
+            mag = star_mags[0, i]
+        else:
+            mag = fast_addmags(star_mags[:, i])
+        val = mag_vals[i]
+        unc = mag_uncs[i]
+        lnlike += gauss_lnprob(val, unc, mag)
+        dlnlike = (val - mag) / (unc * unc)
+        for c in range(n_stars):
+            # d(total mag)/d(mag of star c) is the flux fraction of star c
+            dmag = 10 ** (-0.4 * (star_mags[c, i] - mag))
+            grad[c] += dlnlike * dmag * d_star_mags[c, i, 0]
+            for j in range(1, 5):
+                grad[n_stars + j - 1] += dlnlike * dmag * d_star_mags[c, i, j]
+
+    return lnlike, grad
+
+
+@nb.jit(nopython=True, cache=True)
+def tree_lnlike(
+    pars,
+    star_indices,
+    group_bands,
+    group_offsets,
+    group_stars,
+    obs_groups,
+    obs_refs,
+    obs_vals,
+    obs_uncs,
+    spec_stars,
+    spec_props,
+    spec_vals,
+    spec_uncs,
+    limit_stars,
+    limit_props,
+    limit_lo,
+    limit_hi,
+    plax_indices,
+    plax_vals,
+    plax_uncs,
+    AV_indices,
+    AV_vals,
+    AV_uncs,
+    index_order,
+    i_Teff,
+    i_logg,
+    i_feh,
+    i_Mbol,
+    model_grid,
+    model_axes,
+    model_lengths,
+    model_steps,
+    model_strides,
+    model_rows,
+    i_mags,
+    bc_grid,
+    bc_axes,
+    bc_lengths,
+    bc_steps,
+    bc_strides,
+    bc_rows,
+    Rv,
+):
+    """Log-likelihood of an `ObservationTree`, flattened by `ObservationTree.flatten`
+
+    Same as `ObservationTree.lnlike`, with model values from `interp_mag`;
+    i_mags are the BC grid columns of the bands passed to `flatten`.
+    """
+    n_stars = star_indices.shape[0]
+    n_bands = len(i_mags)
+
+    # Teff, logg, feh, and magnitudes of each model star
+    star_props = np.empty((n_stars, 3), dtype=nb.float64)
+    star_fluxes = np.empty((n_stars, n_bands), dtype=nb.float64)
+    star_pars = np.empty(5, dtype=nb.float64)
+    for k in range(n_stars):
+        for j in range(5):
+            star_pars[j] = pars[star_indices[k, j]]
+        Teff, logg, feh, mags = interp_mag(
+            star_pars,
+            index_order,
+            i_Teff,
+            i_logg,
+            i_feh,
+            i_Mbol,
+            model_grid,
+            model_axes,
+            model_lengths,
+            model_steps,
+            model_strides,
+            model_rows,
+            i_mags,
+            bc_grid,
+            bc_axes,
+            bc_lengths,
+            bc_steps,
+            bc_strides,
+            bc_rows,
+            Rv,
+        )
+        star_props[k, 0] = Teff
+        star_props[k, 1] = logg
+        star_props[k, 2] = feh
+        for b in range(n_bands):
+            star_fluxes[k, b] = 10 ** (-0.4 * mags[b])
+
+    # Model magnitude of each observation node: the sum of the fluxes of its stars
+    n_groups = len(group_bands)
+    group_mags = np.empty(n_groups, dtype=nb.float64)
+    for g in range(n_groups):
+        tot = 0.0
+        for i in range(group_offsets[g], group_offsets[g + 1]):
+            tot += star_fluxes[group_stars[i], group_bands[g]]
+        group_mags[g] = -2.5 * np.log10(tot)
+
+    lnlike = 0.0
+    for i in range(len(obs_groups)):
+        mod = group_mags[obs_groups[i]]
+        if obs_refs[i] >= 0:
+            mod -= group_mags[obs_refs[i]]
+        lnlike += gauss_lnprob(obs_vals[i], obs_uncs[i], mod)
+
+    for i in range(len(spec_stars)):
+        lnlike += gauss_lnprob(spec_vals[i], spec_uncs[i], star_props[spec_stars[i], spec_props[i]])
+
+    for i in range(len(limit_stars)):
+        mod = star_props[limit_stars[i], limit_props[i]]
+        if mod < limit_lo[i] or mod > limit_hi[i] or not np.isfinite(mod):
+            return -np.inf
+
+    for i in range(len(plax_indices)):
+        lnlike += gauss_lnprob(plax_vals[i], plax_uncs[i], 1.0 / pars[plax_indices[i]] * 1000.0)
+
+    for i in range(len(AV_indices)):
+        lnlike += gauss_lnprob(AV_vals[i], AV_uncs[i], pars[AV_indices[i]])
+
+    if not np.isfinite(lnlike):
+        return -np.inf
+    return lnlike
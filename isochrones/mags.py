@@ -1,53 +1,71 @@
 import numpy as np
 import numba as nb
-from math import log10
+from math import log10, log
 
-from .interp import interp_value_3d, interp_value_4d
+from .interp import interp_value_nd, interp_value_and_grad_nd
 
 
-@nb.jit(nopython=True)
+@nb.jit(nopython=True, cache=True)
 def interp_mag(
     pars,
     index_order,
-    model_grid,
     i_Teff,
     i_logg,
     i_feh,
     i_Mbol,
-    model_ii0,
-    model_ii1,
-    model_ii2,
-    bc_grid,
+    model_grid,
+    model_axes,
+    model_lengths,
+    model_steps,
+    model_strides,
+    model_rows,
     bc_cols,
-    bc_ii0,
-    bc_ii1,
-    bc_ii2,
-    bc_ii3,
+    bc_grid,
+    bc_axes,
+    bc_lengths,
+    bc_steps,
+    bc_strides,
+    bc_rows,
+    Rv,
+    model_cache=None,
+    bc_cache=None,
 ):
     """
 
-    pars: 2d array
+    pars: 1d array
+    model_*, bc_*: layouts of model and bolometric correction grids (see `DFInterpolator.layout`)
+    Rv: Used only if the BC grid has an Rv dimension, after (Teff, logg, feh, AV).
+    model_cache, bc_cache: optional rows of `CellCache` arrays for the two grid lookups.
     """
     # logTeff, logg, logL returned.
-    ipar0 = index_order[0]
-    ipar1 = index_order[1]
-    ipar2 = index_order[2]
-    star_props = interp_value_3d(
-        pars[ipar0],
-        pars[ipar1],
-        pars[ipar2],
+    model_point = np.empty(len(model_lengths), dtype=nb.float64)
+    for i in range(len(model_lengths)):
+        model_point[i] = pars[index_order[i]]
+    star_props = interp_value_nd(
+        model_point,
+        np.array([i_Teff, i_logg, i_feh, i_Mbol]),
         model_grid,
-        [i_Teff, i_logg, i_feh, i_Mbol],
-        model_ii0,
-        model_ii1,
-        model_ii2,
+        model_axes,
+        model_lengths,
+        model_steps,
+        model_strides,
+        model_rows,
+        model_cache,
     )
     Teff = star_props[0]
     logg = star_props[1]
     feh = star_props[2]
     ipar4 = index_order[4]
     AV = pars[ipar4]
-    bc = interp_value_4d(Teff, logg, feh, AV, bc_grid, bc_cols, bc_ii0, bc_ii1, bc_ii2, bc_ii3)
+
+    bc_point = np.empty(len(bc_lengths), dtype=nb.float64)
+    bc_point[0] = Teff
+    bc_point[1] = logg
+    bc_point[2] = feh
+    bc_point[3] = AV
+    if len(bc_lengths) > 4:
+        bc_point[4] = Rv
+    bc = interp_value_nd(bc_point, bc_cols, bc_grid, bc_axes, bc_lengths, bc_steps, bc_strides, bc_rows, bc_cache)
 
     mBol = star_props[3]
     ipar3 = index_order[3]
@@ -61,24 +79,117 @@ def interp_mag(
     return Teff, logg, feh, mags
 
 
-@nb.jit(nopython=True)
-def interp_mags(
+@nb.jit(nopython=True, cache=True)
+def interp_mag_and_grad(
     pars,
     index_order,
-    model_grid,
     i_Teff,
     i_logg,
     i_feh,
     i_Mbol,
-    model_ii0,
-    model_ii1,
-    model_ii2,
+    model_grid,
+    model_axes,
+    model_lengths,
+    model_steps,
+    model_strides,
+    model_rows,
+    bc_cols,
     bc_grid,
+    bc_axes,
+    bc_lengths,
+    bc_steps,
+    bc_strides,
+    bc_rows,
+    Rv,
+):
+    """Same as interp_mag, also returning derivatives with respect to pars
+
+    Returns Teff, logg, feh, mags, d_props, d_mags, where d_props (3, len(pars))
+    holds the derivatives of Teff, logg, and feh, and d_mags (n_bands, len(pars))
+    those of the magnitudes.
+    """
+    n_pars = len(pars)
+    n_model = len(model_lengths)
+    model_point = np.empty(n_model, dtype=nb.float64)
+    for i in range(n_model):
+        model_point[i] = pars[index_order[i]]
+    star_props, d_star_props = interp_value_and_grad_nd(
+        model_point,
+        np.array([i_Teff, i_logg, i_feh, i_Mbol]),
+        model_grid,
+        model_axes,
+        model_lengths,
+        model_steps,
+        model_strides,
+        model_rows,
+    )
+    Teff = star_props[0]
+    logg = star_props[1]
+    feh = star_props[2]
+    ipar4 = index_order[4]
+    AV = pars[ipar4]
+
+    bc_point = np.empty(len(bc_lengths), dtype=nb.float64)
+    bc_point[0] = Teff
+    bc_point[1] = logg
+    bc_point[2] = feh
+    bc_point[3] = AV
+    if len(bc_lengths) > 4:
+        bc_point[4] = Rv
+    bc, d_bc = interp_value_and_grad_nd(
+        bc_point, bc_cols, bc_grid, bc_axes, bc_lengths, bc_steps, bc_strides, bc_rows
+    )
+
+    mBol = star_props[3]
+    ipar3 = index_order[3]
+    distance = pars[ipar3]
+    dist_mod = 5 * log10(distance / 10.0)
+
+    n_bands = len(bc_cols)
+    mags = np.empty(n_bands, dtype=nb.float64)
+    d_props = np.zeros((3, n_pars), dtype=nb.float64)
+    d_mags = np.zeros((n_bands, n_pars), dtype=nb.float64)
+    for j in range(n_model):
+        ipar = index_order[j]
+        for q in range(3):
+            d_props[q, ipar] = d_star_props[q, j]
+
+    for i in range(n_bands):
+        mags[i] = mBol + dist_mod - bc[i]
+        for j in range(n_model):
+            ipar = index_order[j]
+            d = d_star_props[3, j]
+            for q in range(3):
+                d -= d_bc[i, q] * d_star_props[q, j]
+            d_mags[i, ipar] = d
+        d_mags[i, ipar3] = 5 / (distance * log(10.0))
+        d_mags[i, ipar4] = -d_bc[i, 3]
+
+    return Teff, logg, feh, mags, d_props, d_mags
+
+
+@nb.jit(nopython=True, nogil=True, cache=True)
+def interp_mags(
+    pars,
+    index_order,
+    i_Teff,
+    i_logg,
+    i_feh,
+    i_Mbol,
+    model_grid,
+    model_axes,
+    model_lengths,
+    model_steps,
+    model_strides,
+    model_rows,
     bc_cols,
-    bc_ii0,
-    bc_ii1,
-    bc_ii2,
-    bc_ii3,
+    bc_grid,
+    bc_axes,
+    bc_lengths,
+    bc_steps,
+    bc_strides,
+    bc_rows,
+    Rv,
 ):
     """
     pars is n_values x 5
@@ -100,20 +211,94 @@ def interp_mags(
         Teff, logg, feh, mag = interp_mag(
             p,
             index_order,
-            model_grid,
             i_Teff,
             i_logg,
             i_feh,
             i_Mbol,
-            model_ii0,
-            model_ii1,
-            model_ii2,
+            model_grid,
+            model_axes,
+            model_lengths,
+            model_steps,
+            model_strides,
+            model_rows,
+            bc_cols,
             bc_grid,
+            bc_axes,
+            bc_lengths,
+            bc_steps,
+            bc_strides,
+            bc_rows,
+            Rv,
+        )
+        Teffs[i] = Teff
+        loggs[i] = logg
+        fehs[i] = feh
+        for j in range(n_bands):
+            mags[i, j] = mag[j]
+
+    return Teffs, loggs, fehs, mags
+
+
+@nb.jit(nopython=True, parallel=True, nogil=True, cache=True)
+def interp_mags_parallel(
+    pars,
+    index_order,
+    i_Teff,
+    i_logg,
+    i_feh,
+    i_Mbol,
+    model_grid,
+    model_axes,
+    model_lengths,
+    model_steps,
+    model_strides,
+    model_rows,
+    bc_cols,
+    bc_grid,
+    bc_axes,
+    bc_lengths,
+    bc_steps,
+    bc_strides,
+    bc_rows,
+    Rv,
+):
+    """Multi-threaded version of interp_mags
+    """
+    n_pars = pars.shape[0]
+    n_values = pars.shape[1]
+    n_bands = len(bc_cols)
+
+    Teffs = np.empty(n_values, dtype=nb.float64)
+    loggs = np.empty(n_values, dtype=nb.float64)
+    fehs = np.empty(n_values, dtype=nb.float64)
+    mags = np.empty((n_values, n_bands), dtype=nb.float64)
+
+    for i in nb.prange(n_values):
+        p = np.empty(n_pars)
+        for j in range(n_pars):
+            p[j] = pars[j, i]
+
+        Teff, logg, feh, mag = interp_mag(
+            p,
+            index_order,
+            i_Teff,
+            i_logg,
+            i_feh,
+            i_Mbol,
+            model_grid,
+            model_axes,
+            model_lengths,
+            model_steps,
+            model_strides,
+            model_rows,
             bc_cols,
-            bc_ii0,
-            bc_ii1,
-            bc_ii2,
-            bc_ii3,
+            bc_grid,
+            bc_axes,
+            bc_lengths,
+            bc_steps,
+            bc_strides,
+            bc_rows,
+            Rv,
         )
         Teffs[i] = Teff
         loggs[i] = logg
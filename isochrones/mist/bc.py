@@ -160,7 +160,9 @@ class MISTBolometricCorrectionGrid(BolometricCorrectionGrid):
 
     def get_df(self, *args, **kwargs):
         df = super().get_df(*args, **kwargs)
-        return df.xs(3.1, level="Rv")
+        if self.Rv is None:
+            return df
+        return df.xs(self.Rv, level="Rv")
 
     @classmethod
     def get_band(cls, b, **kwargs):
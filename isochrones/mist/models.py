@@ -101,6 +101,10 @@ class MISTIsochroneGrid(MISTModelGrid):
     filename_pattern = "\.iso"
     eep_replaces = "mass"
 
+    @property
+    def ages(self):
+        return np.array(self.interp.index_columns[0])
+
     @property
     def kwarg_tag(self):
         tag = super().kwarg_tag
@@ -186,7 +190,7 @@ class MISTEvolutionTrackGrid(MISTModelGrid):
     @property
     def masses(self):
         if self._masses is None:
-            self._masses = np.array(self.df.index.levels[1])
+            self._masses = np.array(self.interp.index_columns[1])
         return self._masses
 
     # @property
@@ -2,6 +2,7 @@ import os
 import re
 import itertools
 import warnings
+from collections import OrderedDict
 
 import numpy as np
 import pandas as pd
@@ -10,11 +11,13 @@ from tqdm import tqdm
 from scipy.optimize import minimize
 from numba import NumbaPendingDeprecationWarning
 
-from .config import ISOCHRONES
-from .interp import DFInterpolator, interp_eep, interp_eeps
-from .mags import interp_mag, interp_mags
+from .config import ISOCHRONES, GRID_MMAP_MODE, GRID_DTYPE
+from .interp import DFInterpolator, interp_eep, interp_eeps, interp_eeps_parallel, uniform_steps, grid_axes
+from .interp import use_parallel, call_parallel
+from .mags import interp_mag, interp_mags, interp_mags_parallel
 from .utils import addmags
 from .grid import Grid
+from .compilation import time_call
 
 G = const.G.cgs.value
 MSUN = const.M_sun.cgs.value
@@ -168,79 +171,143 @@ class StellarModelGrid(Grid):
     def interp_grid_orig_npz_filename(self):
         return os.path.join(self.datadir, "full_grid_orig{}.npz".format(self.kwarg_tag))
 
+    @property
+    def array_grid_params(self):
+        """Parameters indexing the rows of the array grids (see `get_array_grids`)
+        """
+        if self.eep_replaces == "age":
+            return ("feh", "mass")
+        elif self.eep_replaces == "mass":
+            return ("age", "feh")
+
+    @property
+    def array_index_columns(self):
+        """Values of the two `array_grid_params`
+        """
+        if self.eep_replaces == "age":
+            return self.fehs, self.masses
+        elif self.eep_replaces == "mass":
+            return tuple(np.array(ii) for ii in self.interp.index_columns[:2])
+
     def get_array_grids(self, recalc=False):
+        """Arrays of the parameter replaced by EEP, as a function of EEP
+
+        One row per (feh, mass) track, of age, or per (age, feh) isochrone, of
+        initial mass, padded with nan.  Returns these arrays, the corresponding
+        derivatives with respect to EEP (dt_deep or dm_deep), the lengths of
+        the rows, and the EEP of the first element of each row.
+
+        These are saved to `array_grid_filename` as x, dx_deep, lengths, and
+        first_eep.  Files written by earlier versions (with age and dt_deep,
+        and no first_eep) are rebuilt.
+        """
         calculate = recalc or not os.path.exists(self.array_grid_filename)
+        if not calculate:
+            with np.load(self.array_grid_filename) as d:
+                calculate = "x" not in d
 
         if calculate:
+            ii0, ii1 = self.array_index_columns
             if self.eep_replaces == "age":
-                ii0 = self.fehs
-                ii1 = self.masses
+                col, deep_col = "age", "dt_deep"
             elif self.eep_replaces == "mass":
-                raise NotImplementedError("Not implemented for isochrone grids yet!")
+                col, deep_col = "initial_mass", "dm_deep"
 
             n = len(ii0) * len(ii1)
-            age_arrays = np.zeros((n, self.n_eep)) * np.nan
-            dt_deep_arrays = np.zeros((n, self.n_eep)) * np.nan
+            arrays = np.zeros((n, self.n_eep)) * np.nan
+            deep_arrays = np.zeros((n, self.n_eep)) * np.nan
             lengths = np.zeros(n) * np.nan
+            first_eeps = np.ones(n)
             for i, (x0, x1) in tqdm(
-                enumerate(itertools.product(ii0, ii1)), total=n, desc="building irregular age grid"
+                enumerate(itertools.product(ii0, ii1)), total=n, desc="building irregular {} grid".format(col)
             ):
                 subdf = self.df.xs((x0, x1), level=(0, 1))
-                xs = subdf[self.eep_replaces].values
+                xs = subdf[col].values
                 lengths[i] = len(xs)
-                try:
-                    age_arrays[i, : len(xs)] = xs
-                    dt_deep_arrays[i, : len(xs)] = subdf.dt_deep.values
-                except ValueError:
-                    import pdb
-
-                    pdb.set_trace()
+                if len(xs):
+                    first_eeps[i] = subdf.index[0]
+                arrays[i, : len(xs)] = xs
+                deep_arrays[i, : len(xs)] = subdf[deep_col].values
 
             np.savez(
-                self.array_grid_filename, age=age_arrays, dt_deep=dt_deep_arrays, lengths=lengths.astype(int)
+                self.array_grid_filename,
+                x=arrays,
+                dx_deep=deep_arrays,
+                lengths=lengths.astype(int),
+                first_eep=first_eeps,
             )
 
         d = np.load(self.array_grid_filename)
 
-        return d["age"], d["dt_deep"], d["lengths"]
+        return d["x"], d["dx_deep"], d["lengths"], d["first_eep"]
 
     @property
     def array_grid_filename(self):
         return os.path.join(self.datadir, "array_grid{}.npz".format(self.kwarg_tag))
 
     @property
-    def age_grid(self):
+    def eep_lattice_filename(self):
+        return os.path.join(self.datadir, "eep_lattice{}.npz".format(self.kwarg_tag))
+
+    def _load_array_grids(self):
+        arrays, deep_arrays, lengths, first_eeps = self.get_array_grids()
+        self._array_grid = arrays
+        self._deep_grid = deep_arrays
+        self._array_lengths = lengths
+        self._array_first_eeps = first_eeps
+
+    @property
+    def array_grid(self):
+        """Ages along tracks, or initial masses along isochrones; see `get_array_grids`
+        """
         try:
-            return self._age_grid
+            return self._array_grid
         except AttributeError:
-            age_grid, dt_deep_grid, lengths = self.get_array_grids()
-            self._age_grid = age_grid
-            self._dt_deep_grid = dt_deep_grid
-            self._array_lengths = lengths
-            return self._age_grid
+            self._load_array_grids()
+            return self._array_grid
 
     @property
-    def dt_deep_grid(self):
+    def deep_grid(self):
         try:
-            return self._dt_deep_grid
+            return self._deep_grid
         except AttributeError:
-            age_grid, dt_deep_grid, lengths = self.get_array_grid()
-            self._age_grid = age_grid
-            self._dt_deep_grid = arrays
-            self._array_lengths = lengths
-            return self._dt_deep_grid
+            self._load_array_grids()
+            return self._deep_grid
 
     @property
     def array_lengths(self):
         try:
             return self._array_lengths
         except AttributeError:
-            age_grid, dt_deep_grid, lengths = self.get_array_grid()
-            self._age_grid = age_grid
-            self._dt_deep_grid = arrays
-            self._array_lengths = lengths
+            self._load_array_grids()
             return self._array_lengths
 
+    @property
+    def array_first_eeps(self):
+        try:
+            return self._array_first_eeps
+        except AttributeError:
+            self._load_array_grids()
+            return self._array_first_eeps
+
+    @property
+    def age_grid(self):
+        return self.array_grid
+
+    @property
+    def dt_deep_grid(self):
+        return self.deep_grid
+
+    @property
+    def array_grid_steps(self):
+        """Spacing of the axes of the array grids, or 0 if irregular
+        """
+        try:
+            return self._array_grid_steps
+        except AttributeError:
+            self._array_grid_steps = uniform_steps(self.array_index_columns)
+            return self._array_grid_steps
+
     @property
     def n_masses(self):
         try:
@@ -258,13 +325,16 @@ class ModelGridInterpolator(object):
     # transformation from desired param order to that expected by interp functions
     _param_index_order = (1, 2, 0, 3, 4)
 
-    def __init__(self, bands=None, **kwargs):
+    def __init__(self, bands=None, Rv=None, **kwargs):
         self.bands = bands if bands is not None else list(self.bc_type.default_bands)
 
+        # If Rv is given, the BC grid keeps its Rv dimension, and is interpolated at this value.
+        self.Rv = Rv
+
         self._model_grid = None
         self._bc_grid = None
 
-        self.param_index_order = list(self._param_index_order)
+        self.param_index_order = np.array(self._param_index_order, dtype=int)
 
         self.kwargs = kwargs
 
@@ -272,6 +342,9 @@ class ModelGridInterpolator(object):
         self._ages = None
         self._masses = None
 
+        self._subset_interps = {}
+        self._eep_lattice = None
+
     @property
     def minfeh(self):
         return self.model_grid.get_limits("feh")[0]
@@ -343,20 +416,91 @@ class ModelGridInterpolator(object):
     @property
     def bc_grid(self):
         if self._bc_grid is None:
-            self._bc_grid = self.bc_type(self.bands)
+            mmap_mode = self.kwargs.get("mmap_mode", GRID_MMAP_MODE)
+            dtype = self.kwargs.get("dtype", GRID_DTYPE)
+            Rv = self.bc_type.default_Rv if self.Rv is None else None
+            self._bc_grid = self.bc_type(self.bands, mmap_mode=mmap_mode, Rv=Rv, dtype=dtype)
         return self._bc_grid
 
+    @property
+    def bc_Rv(self):
+        """Rv at which to interpolate the BC grid, if it has an Rv dimension
+        """
+        return self.bc_type.default_Rv if self.Rv is None else self.Rv
+
+    def get_subset_interp(self, columns):
+        """Returns `DFInterpolator` of a model grid containing only the given columns
+
+        This is used for likelihood calculations, which need only a few columns;
+        `generate`, `__call__`, etc. keep using the full grid (`model_grid.interp`).
+        The subset grid is cached on disk next to the full grid, and is
+        rebuilt if the full grid has changed since.
+        """
+        columns = tuple(columns)
+        if columns not in self._subset_interps:
+            grid = self.model_grid
+            full_filename = getattr(grid, "interp_grid_npz_filename", None)
+            filename = None
+            if full_filename is not None:
+                filename = "{}_{}.npz".format(os.path.splitext(full_filename)[0], "-".join(columns))
+            up_to_date = (
+                DFInterpolator.has_metadata(filename)
+                and os.path.exists(full_filename)
+                and os.path.getmtime(filename) >= os.path.getmtime(full_filename)
+            )
+            if up_to_date:
+                interp = DFInterpolator(
+                    filename=filename,
+                    is_full=grid.is_full,
+                    mmap_mode=grid.mmap_mode,
+                    dtype=grid.dtype,
+                    ragged=grid.interp.ragged,
+                )
+            else:
+                interp = grid.interp.subset(columns, filename=filename)
+            self._subset_interps[columns] = interp
+        return self._subset_interps[columns]
+
     def initialize(self, pars=None):
+        """Loads grids, and compiles (or loads from cache) the kernels used with them
+
+        Returns an OrderedDict of the time in seconds taken by the first call of
+        each kernel, with the grids already loaded.  See also `isochrones.warmup`.
+        """
         if pars is None:
             if self.eep_replaces == "age":
                 pars = [1.04, 320.0, -0.35, 10000.0, 0.34]
             elif self.eep_replaces == "mass":
                 pars = [320, 9.7, -0.35, 10000.0, 0.34]
 
+        # Load grids first, so that timings reflect the kernels only.
+        self.model_grid.interp
+        self.bc_grid.interp
+
+        timings = OrderedDict()
+        pars = np.array(pars, dtype=float)
+        pars_arr = np.array([pars, pars]).T
+        timings["interp_value"] = time_call(self.interp_value, pars, ["Teff"])
+        timings["interp_values"] = time_call(self.interp_value, pars_arr, ["Teff"])
+        timings["interp_mag"] = time_call(self.interp_mag, pars, self.bands)
+        timings["interp_mags"] = time_call(self.interp_mag, pars_arr, self.bands)
+        if self.eep_replaces == "age":
+            mass, eep, feh = pars[:3]
+            age = float(self.interp_value(pars, ["age"]).squeeze())
+            timings["interp_eep"] = time_call(self.get_eep, float(mass), age, float(feh))
+            timings["interp_eeps"] = time_call(self.get_eep, np.array([mass, mass]), age, float(feh))
+        elif self.eep_replaces == "mass":
+            eep, age, feh = pars[:3]
+            mass = float(self.interp_value(pars, ["initial_mass"]).squeeze())
+            timings["interp_eep"] = time_call(self.get_eep, mass, float(age), float(feh))
+            timings["interp_eeps"] = time_call(self.get_eep, np.array([mass, mass]), float(age), float(feh))
+
         Teff, logg, feh, mags = self.interp_mag(pars, self.bands)
         assert all([np.isfinite(v) for v in [Teff, logg, feh]])
         assert all([np.isfinite(m) for m in mags])
 
+        return timings
+
     def _prop(self, prop, *pars):
         return self.interp_value(pars, [prop]).squeeze()
 
@@ -387,81 +531,79 @@ class ModelGridInterpolator(object):
     def delta_nu(self, *pars):
         return self._prop("delta_nu", *pars)
 
-    def interp_value(self, pars, props):
+    def interp_value(self, pars, props, interp=None):
         """
 
         pars : age, feh, eep, [distance, AV]
+
+        interp : `DFInterpolator`, optional
+            Interpolator to use, if not `model_grid.interp` (e.g., from `get_subset_interp`).
         """
+        if interp is None:
+            interp = self.model_grid.interp
         try:
             pars = np.atleast_1d(pars[self.param_index_order])
         except TypeError:
             i0, i1, i2, i3, i4 = self.param_index_order
             pars = [pars[i0], pars[i1], pars[i2]]
-        return self.model_grid.interp(pars, props)
+        return interp(pars, props)
 
-    def interp_mag(self, pars, bands):
+    def interp_mag(self, pars, bands, model_cache=None, bc_cache=None):
         """
 
         pars : age, feh, eep, distance, AV
+
+        model_cache, bc_cache : `CellCache`, optional
+            Used for single-point calls (see `DFInterpolator.__call__`).
         """
         if not bands:
             i_bands = np.array([], dtype=int)
         else:
-            i_bands = [self.bc_grid.interp.columns.index(b) for b in bands]
-
+            i_bands = np.array([self.bc_grid.interp.columns.index(b) for b in bands], dtype=int)
+
+        args = (
+            self.param_index_order,
+            self.model_grid.interp.column_index["Teff"],
+            self.model_grid.interp.column_index["logg"],
+            self.model_grid.interp.column_index["feh"],
+            self.model_grid.interp.column_index["Mbol"],
+            *self.model_grid.interp.layout,
+            i_bands,
+            *self.bc_grid.interp.layout,
+            self.bc_Rv,
+        )
         try:
             pars = np.atleast_1d(pars).astype(float).squeeze()
             if pars.ndim > 1:
                 raise ValueError
-            return interp_mag(
-                pars,
-                self.param_index_order,
-                self.model_grid.interp.grid,
-                self.model_grid.interp.column_index["Teff"],
-                self.model_grid.interp.column_index["logg"],
-                self.model_grid.interp.column_index["feh"],
-                self.model_grid.interp.column_index["Mbol"],
-                *self.model_grid.interp.index_columns,
-                self.bc_grid.interp.grid,
-                i_bands,
-                *self.bc_grid.interp.index_columns,
-            )
+            if model_cache is not None or bc_cache is not None:
+                model_cache = model_cache.array[0] if model_cache is not None else None
+                bc_cache = bc_cache.array[0] if bc_cache is not None else None
+                return interp_mag(pars, *args, model_cache, bc_cache)
+            return interp_mag(pars, *args)
         except (TypeError, ValueError):
             # Broadcast appropriately.
             b = np.broadcast(*pars)
             pars = np.array([np.resize(x, b.shape).astype(float) for x in pars])
-            return interp_mags(
-                pars,
-                self.param_index_order,
-                self.model_grid.interp.grid,
-                self.model_grid.interp.column_index["Teff"],
-                self.model_grid.interp.column_index["logg"],
-                self.model_grid.interp.column_index["feh"],
-                self.model_grid.interp.column_index["Mbol"],
-                *self.model_grid.interp.index_columns,
-                self.bc_grid.interp.grid,
-                i_bands,
-                *self.bc_grid.interp.index_columns,
-            )
+            if use_parallel(b.size):
+                return call_parallel(interp_mags_parallel, pars, *args)
+            return interp_mags(pars, *args)
 
     def model_value(self, mass, age, feh, props, approx=False):
         if isinstance(props, str):
             props = [props]
         eep = self.get_eep(mass, age, feh, approx=approx)
-        values = self.interp_value([mass, eep, feh])
+        values = self.interp_value(self._model_pars(mass, age, feh, eep), props)
         if np.size(values) == 1:
             return float(values)
         else:
             return values
 
     def model_mag(self, mass, age, feh, distance=10.0, AV=0.0, bands=None, approx=False):
-        if self.model_grid.eep_replaces == "mass":
-            return self.track.model_mag(mass, age, feh, distance=distance, AV=AV, bands=bands, approx=approx)
-
         if bands is None:
             bands = self.bands
         eep = self.get_eep(mass, age, feh, approx=approx)
-        pars = [mass, eep, feh, distance, AV]
+        pars = self._model_pars(mass, age, feh, eep) + [distance, AV]
         _, _, _, mags = self.interp_mag(pars, bands)
         if np.size(mags) == 1:
             return float(mags)
@@ -474,7 +616,7 @@ class ModelGridInterpolator(object):
         ]
         pars = [p1, p2, p3, dist, AV]
         # print(pars)
-        prop_cols = self.model_grid.df.columns
+        prop_cols = self.model_grid.interp.columns
         props = self.interp_value(pars, prop_cols)
         _, _, _, mags = self.interp_mag(pars, self.bands)
         cols = list(prop_cols) + ["{}_mag".format(b) for b in self.bands]
@@ -498,7 +640,18 @@ class ModelGridInterpolator(object):
     def max_eep(self, mass, feh):
         return self.model_grid.max_eep(mass, feh)
 
-    def get_eep(self, mass, age, feh, accurate=False, **kwargs):
+    def get_eep(self, mass, age, feh, accurate=False, lattice=False, refine=False, **kwargs):
+        """EEP of given initial mass at given age and [Fe/H]
+
+        By default, EEP is interpolated between the EEPs at which the (mass, age, feh)
+        point falls on the neighbouring tracks/isochrones (see `interp_eep`).
+        If accurate, it is solved for exactly (see `get_eep_accurate` and
+        `get_eeps_accurate`).  If lattice, it is looked up in `eep_lattice`,
+        optionally refined (see `get_eep_lattice`).
+        """
+        if lattice and not accurate:
+            return self.get_eep_lattice(mass, age, feh, refine=refine)
+
         grid = self.model_grid
         if (
             (isinstance(mass, float) or isinstance(mass, int))
@@ -508,38 +661,35 @@ class ModelGridInterpolator(object):
             if accurate:
                 return self.get_eep_accurate(mass, age, feh, **kwargs)
             else:
-                if grid.eep_replaces == "age":
-                    return interp_eep(
-                        age,
-                        feh,
-                        mass,
-                        grid.fehs,
-                        grid.masses,
-                        grid.n_masses,
-                        grid.age_grid,
-                        grid.dt_deep_grid,
-                        grid.array_lengths,
-                    )
-                elif grid.eep_replaces == "mass":
-                    raise NotImplementedError
+                values = {"mass": mass, "age": age, "feh": feh}
+                x0, x1 = [values[p] for p in grid.array_grid_params]
+                return interp_eep(values[grid.eep_replaces], x0, x1, *self._array_grid_args)
         else:
             b = np.broadcast(mass, age, feh)
-            pars = [np.atleast_1d(np.resize(x, b.shape)).astype(float) for x in [age, feh, mass]]
             if accurate:
-                return np.array([self.get_eep_accurate(m, a, f, **kwargs) for a, f, m in zip(*pars)])
+                return self.get_eeps_accurate(mass, age, feh, **kwargs).reshape(b.shape)
             else:
-                if grid.eep_replaces == "age":
-                    return interp_eeps(
-                        *pars,
-                        grid.fehs,
-                        grid.masses,
-                        grid.n_masses,
-                        grid.age_grid,
-                        grid.dt_deep_grid,
-                        grid.array_lengths,
-                    )
-                elif grid.eep_replaces == "mass":
-                    raise NotImplementedError
+                values = {
+                    p: np.atleast_1d(np.resize(x, b.shape)).astype(float)
+                    for p, x in zip(["mass", "age", "feh"], [mass, age, feh])
+                }
+                x0s, x1s = [values[p] for p in grid.array_grid_params]
+                args = (values[grid.eep_replaces], x0s, x1s) + self._array_grid_args
+                if use_parallel(b.size):
+                    return call_parallel(interp_eeps_parallel, *args)
+                return interp_eeps(*args)
+
+    @property
+    def _array_grid_args(self):
+        grid = self.model_grid
+        return (
+            *grid_axes(grid.array_index_columns),
+            grid.array_grid,
+            grid.deep_grid,
+            grid.array_lengths,
+            grid.array_first_eeps,
+            grid.array_grid_steps,
+        )
 
     def get_eep_accurate(
         self,
@@ -570,13 +720,167 @@ class ModelGridInterpolator(object):
             return result
 
         if result.success and result.fun < resid_tol ** 2:
-            return float(result.x)
+            return float(result.x[0])
         else:
             if return_nan:
                 return np.nan
             else:
                 raise RuntimeError("EEP minimization not successful: {}".format((mass, age, feh)))
 
+    def get_eeps_accurate(self, mass, age, feh, eep0=300, resid_tol=0.02, return_nan=False, **kwargs):
+        """Vectorized version of `get_eep_accurate`
+
+        Rather than minimizing the residual point by point, this solves for the EEP
+        at which the grid column that EEP replaces (age along a track, initial mass
+        along an isochrone) equals the requested value, with the compiled
+        `DFInterpolator.invert`.  The column is monotonic within each of the
+        grid's `eep_sections` (if defined), which are searched in order of
+        distance from eep0 until a solution is found.  As with `get_eep_accurate`,
+        points for which there is none, but which are within resid_tol of the
+        column at the end of a section (e.g., just past the end of a track), get
+        the EEP of that end.  Other keyword arguments (the minimizer's options
+        in `get_eep_accurate`) are ignored.
+        """
+        b = np.broadcast(mass, age, feh)
+        mass, age, feh = [np.resize(x, b.shape).astype(float).ravel() for x in (mass, age, feh)]
+        values = {"mass": mass, "age": age, "feh": feh, "eep": np.zeros(b.size)}
+
+        grid = self.model_grid
+        interp = grid.interp
+        params = [values[p] for p in self.param_names[:3]]
+        point = [params[i] for i in self.param_index_order[:2]]
+        val = values[self.eep_replaces]
+        col = "age" if self.eep_replaces == "age" else "initial_mass"
+
+        ii = interp.index_columns[-1]
+        sections = getattr(grid, "eep_sections", [(ii[0], ii[-1])])
+
+        def distance_from_eep0(section):
+            lo, hi = section
+            return 0 if lo <= eep0 <= hi else min(abs(lo - eep0), abs(hi - eep0))
+
+        sections = sorted(sections, key=distance_from_eep0)
+
+        # Exact solutions first, then ends of sections within resid_tol
+        eeps = np.full(b.size, np.nan)
+        for tol in (0.0, resid_tol):
+            for lo, hi in sections:
+                todo = np.isnan(eeps)
+                if not todo.any():
+                    break
+                eeps[todo] = interp.invert(val[todo], [x[todo] for x in point], col, lo=lo, hi=hi, tol=tol)
+
+        if not return_nan and np.isnan(eeps).any():
+            i = np.where(np.isnan(eeps))[0][0]
+            raise RuntimeError(
+                "EEP not found for {} of {} points, e.g.: {}".format(
+                    np.isnan(eeps).sum(), b.size, (mass[i], age[i], feh[i])
+                )
+            )
+        return eeps
+
+    @property
+    def eep_lattice(self):
+        """`DFInterpolator` of EEP on a regular (log10 mass, age, feh) lattice
+
+        Built with `build_eep_lattice` on first use, and saved next to the array grids.
+        """
+        if self._eep_lattice is None:
+            filename = self.model_grid.eep_lattice_filename
+            if DFInterpolator.has_metadata(filename):
+                self._eep_lattice = DFInterpolator(filename=filename, mmap_mode=self.model_grid.mmap_mode)
+            else:
+                self._eep_lattice = self.build_eep_lattice()
+        return self._eep_lattice
+
+    def build_eep_lattice(self, n_mass=300, n_age=300, n_feh=19):
+        """Computes (and saves) `eep_lattice`, solving for the EEP at each node with `get_eeps_accurate`
+
+        The lattice spans the mass, age, and [Fe/H] limits of the model grid, with
+        n_mass, n_age, and n_feh nodes.  EEP is nan at nodes where there is no
+        star of that mass (e.g., it has already died).
+        """
+        log_masses = np.linspace(np.log10(self.minmass), np.log10(self.maxmass), n_mass)
+        ages = np.linspace(self.minage, self.maxage, n_age)
+        fehs = np.linspace(self.minfeh, self.maxfeh, n_feh)
+        log_mass, age, feh = [x.ravel() for x in np.meshgrid(log_masses, ages, fehs, indexing="ij")]
+        eep = self.get_eeps_accurate(10 ** log_mass, age, feh, return_nan=True)
+
+        df = pd.DataFrame({"log_mass": log_mass, "age": age, "feh": feh, "eep": eep})
+        df = df.set_index(["log_mass", "age", "feh"])
+        filename = self.model_grid.eep_lattice_filename
+        if DFInterpolator.has_metadata(filename):
+            os.remove(DFInterpolator.get_metadata_filename(filename))
+        self._eep_lattice = DFInterpolator(df, filename=filename, recalc=True)
+        return self._eep_lattice
+
+    def get_eep_lattice(self, mass, age, feh, refine=False):
+        """Approximate EEP, from trilinear interpolation in `eep_lattice`
+
+        If refine, one Newton step is taken from the interpolated EEP, using the
+        model grid's age (or initial mass) and its derivative with respect to EEP
+        (dt_deep, or dm_deep).  Points too close to the end of a track for the
+        lattice to be defined around them fall back to the default `get_eep`.
+        See `eep_lattice_errors` for the accuracy of both.
+        """
+        scalar = all(isinstance(x, float) or isinstance(x, int) for x in (mass, age, feh))
+        if not scalar:
+            b = np.broadcast(mass, age, feh)
+            mass, age, feh = [np.resize(x, b.shape).astype(float).ravel() for x in (mass, age, feh)]
+
+        eep = self.eep_lattice([np.log10(mass), age, feh], ["eep"])[..., 0]
+        if scalar:
+            eep = float(eep)
+            if np.isnan(eep):
+                return self.get_eep(float(mass), float(age), float(feh))
+        else:
+            bad = np.isnan(eep)
+            if bad.any():
+                eep[bad] = self.get_eep(mass[bad], age[bad], feh[bad])
+
+        if refine:
+            col, deep_col = ("age", "dt_deep") if self.eep_replaces == "age" else ("initial_mass", "dm_deep")
+            value, deriv = self.interp_value(self._model_pars(mass, age, feh, eep), [col, deep_col]).T
+            target = age if self.eep_replaces == "age" else mass
+            refined = eep + (target - value) / deriv
+            if scalar:
+                eep = refined if np.isfinite(refined) else eep
+            else:
+                eep = np.where(np.isfinite(refined), refined, eep)
+
+        return eep if scalar else eep.reshape(b.shape)
+
+    def eep_lattice_errors(self, n=100000, refine=False, seed=None):
+        """Accuracy of `get_eep_lattice`, relative to the exact `get_eeps_accurate`
+
+        Evaluated at n random points, uniform in log10 mass, age, and feh within
+        the limits of the lattice.  Returns an OrderedDict with percentiles of the
+        absolute EEP error (where both are defined), and the fractions of points
+        at which only the exact or only the approximate EEP is defined.
+        """
+        lattice = self.eep_lattice
+        rng = np.random.RandomState(seed)
+        log_mass, age, feh = [rng.uniform(ii[0], ii[-1], size=n) for ii in lattice.index_columns]
+        mass = 10 ** log_mass
+
+        exact = self.get_eeps_accurate(mass, age, feh, return_nan=True)
+        approx = self.get_eep_lattice(mass, age, feh, refine=refine)
+        both = np.isfinite(exact) & np.isfinite(approx)
+        err = np.abs(approx[both] - exact[both])
+
+        stats = OrderedDict()
+        for q in [50, 90, 99, 99.9, 100]:
+            stats["p{}".format(q)] = float(np.percentile(err, q))
+        stats["exact_only"] = float((np.isfinite(exact) & np.isnan(approx)).mean())
+        stats["approx_only"] = float((np.isnan(exact) & np.isfinite(approx)).mean())
+        return stats
+
+    def _model_pars(self, mass, age, feh, eep):
+        """(mass, age, feh, eep) in the order of this model's first three parameters
+        """
+        values = {"mass": mass, "age": age, "feh": feh, "eep": eep}
+        return [values[p] for p in self.param_names[:3]]
+
     def generate(
         self,
         mass,
@@ -602,9 +906,10 @@ class ModelGridInterpolator(object):
             bands = self.bands
         if eeps is None:
             eeps = self.get_eep(mass, age, feh, **kwargs)
-        values = self.interp_value([mass, eeps, feh], props)
+        pars = self._model_pars(mass, age, feh, eeps)
+        values = self.interp_value(pars, props)
         if bands:
-            _, _, _, mags = self.interp_mag([mass, eeps, feh, distance, AV], bands=bands)
+            _, _, _, mags = self.interp_mag(pars + [distance, AV], bands=bands)
             axis = 1 if values.ndim == 2 else 0
             values = np.concatenate([values, mags], axis=axis)
 
@@ -623,7 +928,7 @@ class ModelGridInterpolator(object):
         values["requested_age"] = age
 
         if all_As:
-            _, _, _, true_mags = self.interp_mag([mass, eeps, feh, distance, 0], bands=bands)
+            _, _, _, true_mags = self.interp_mag(pars + [distance, 0], bands=bands)
             mBol = values["Mbol"]
             for b, true_mag in zip(bands, true_mags.T):
                 values[f"A_{b}"] = values[f"{b}_mag"] - true_mag
@@ -678,7 +983,7 @@ class EvolutionTrackInterpolator(ModelGridInterpolator):
         if self._iso is None:
             if self._iso_type is None:
                 raise ValueError("{} has no _iso_type!.".format(type(self)))
-            self._iso = self._iso_type(bands=self.bands)
+            self._iso = self._iso_type(bands=self.bands, Rv=self.Rv, **self.kwargs)
         return self._iso
 
     def mass_age_resid(self, eep, mass, age, feh):
@@ -705,7 +1010,7 @@ class IsochroneInterpolator(ModelGridInterpolator):
         if self._track is None:
             if self._track_type is None:
                 raise ValueError("{} has no _track_type!".format(type(self)))
-            self._track = self._track_type(bands=self.bands)
+            self._track = self._track_type(bands=self.bands, Rv=self.Rv, **self.kwargs)
         return self._track
 
     def mass_age_resid(self, eep, mass, age, feh):
@@ -714,5 +1019,3 @@ class IsochroneInterpolator(ModelGridInterpolator):
         # return (mass - mass_interp)**2 + (age - age_interp)**2
         return (mass - mass_interp) ** 2
 
-    def generate(self, *args, **kwargs):
-        return self.track.generate(*args, **kwargs)
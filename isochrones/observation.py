@@ -12,10 +12,12 @@ if not on_rtd:
     from asciitree import LeftAligned, Traversal
     from asciitree.drawing import BoxStyle, BOX_DOUBLE, BOX_BLANK
 
-    from collections import OrderedDict
+    from collections import OrderedDict, namedtuple
 
     from itertools import chain, count
 
+    from scipy.spatial import cKDTree
+
     try:
         from itertools import imap, izip
     except ImportError:  # Python 3
@@ -36,6 +38,45 @@ from .utils import addmags, distance, fast_addmags
 
 LOG_ONE_OVER_ROOT_2PI = np.log(1.0 / np.sqrt(2 * np.pi))
 
+# `ObservationTree` flattened into arrays, for `likelihood.tree_lnlike` (see `ObservationTree.flatten`):
+#   star_indices: (n_stars, 5) indices in the parameter vector of each model star's
+#       (eep, age, feh, distance, AV)
+#   group_bands, group_offsets, group_stars: band index, and model stars (group_stars[group_offsets[i]:
+#       group_offsets[i + 1]]) of each observation node whose model magnitude is needed
+#   obs_groups, obs_refs, obs_vals, obs_uncs: group of each photometric measurement, group of its
+#       reference (-1 if not relative), and observed value (relative to the reference's) and uncertainty
+#   spec_stars, spec_props, spec_vals, spec_uncs: spectroscopy (props are 0, 1, 2 for Teff, logg, feh)
+#   limit_stars, limit_props, limit_lo, limit_hi: limits on spectroscopic properties
+#   plax_indices, plax_vals, plax_uncs: parallaxes, with the indices of their systems' distance parameters
+#   AV_indices, AV_vals, AV_uncs: measurements of AV, with the indices of their systems' AV parameters
+FlatTree = namedtuple(
+    "FlatTree",
+    [
+        "star_indices",
+        "group_bands",
+        "group_offsets",
+        "group_stars",
+        "obs_groups",
+        "obs_refs",
+        "obs_vals",
+        "obs_uncs",
+        "spec_stars",
+        "spec_props",
+        "spec_vals",
+        "spec_uncs",
+        "limit_stars",
+        "limit_props",
+        "limit_lo",
+        "limit_hi",
+        "plax_indices",
+        "plax_vals",
+        "plax_uncs",
+        "AV_indices",
+        "AV_vals",
+        "AV_uncs",
+    ],
+)
+
 
 class NodeTraversal(Traversal):
     """
@@ -710,6 +751,59 @@ class Observation(object):
         return str(self)
 
 
+class ObsNodeIndex(object):
+    """Spatial index of the `ObsNode`s of a tree, for finding parents of new nodes
+
+    Nodes are grouped by observation, and each group is indexed by a KD-tree
+    over the nodes' (separation, PA) positions, so that `closest` only looks at
+    the nodes within one resolution element of the new node, rather than
+    at every node in the tree.
+
+    nodes: `ObsNode`s in the order of tree iteration (e.g., from `get_obs_nodes`),
+        which decides between nodes at the same distance.
+    """
+
+    def __init__(self, nodes):
+        groups = OrderedDict()
+        for rank, n in enumerate(nodes):
+            groups.setdefault(n.observation, []).append((rank, n))
+
+        self.groups = []
+        for members in groups.values():
+            xy = np.array([self.position(n) for _, n in members]).reshape(-1, 2)
+            self.groups.append((members, cKDTree(xy)))
+
+    @staticmethod
+    def position(node):
+        """Cartesian position of a node, as used by `utils.distance`
+        """
+        pa = node.pa * np.pi / 180
+        return node.separation * np.sin(pa), node.separation * np.cos(pa)
+
+    def closest(self, n0):
+        """Same as `ObservationTree._find_closest`, but returns None instead of the tree
+        """
+        x0 = self.position(n0)
+        best = None
+        for members, kdtree in self.groups:
+            first = members[0][1]
+            if first._in_same_observation(n0):
+                continue
+            resolution = first.resolution
+            if resolution == -1:
+                radius = np.inf
+            else:
+                # Slightly larger, as KD-tree distances may round differently from `distance`
+                radius = resolution * (1 + 1e-9)
+            for i in kdtree.query_ball_point(x0, radius):
+                rank, n = members[i]
+                d = n.distance(n0)
+                if d < resolution or resolution == -1:
+                    if best is None or (d, rank) < best[:2]:
+                        best = (d, rank, n)
+        return None if best is None else best[2]
+
+
 class ObservationTree(Node):
     """Builds a tree of Nodes from a list of Observation objects
 
@@ -760,6 +854,9 @@ class ObservationTree(Node):
         self._cache_key = None
         self._cache_val = None
 
+        # (bands, `FlatTree`), see `flatten`
+        self._flat = None
+
     @property
     def name(self):
         return self.label
@@ -767,6 +864,12 @@ class ObservationTree(Node):
     def _clear_cache(self):
         self._cache_key = None
         self._cache_val = None
+        self._flat = None
+
+    def _clear_leaves(self):
+        # Called whenever a node is added or removed anywhere in the tree
+        super(ObservationTree, self)._clear_leaves()
+        self._flat = None
 
     @classmethod
     def from_df(cls, df, **kwargs):
@@ -1233,6 +1336,96 @@ class ObservationTree(Node):
         self._cache_val = lnl
         return lnl
 
+    def flatten(self, bands):
+        """Flattens the tree into a `FlatTree` of arrays, for `likelihood.tree_lnlike`
+
+        bands : list of the bands of the model magnitudes, in the order
+            passed to the likelihood kernel (see `StarModel.bands`).
+
+        The result is cached until the tree changes (observations, models,
+        spectroscopy, limits, parallax, or AV).
+        """
+        bands = tuple(bands)
+        if self._flat is not None and self._flat[0] == bands:
+            return self._flat[1]
+
+        # Model stars, in the order of the parameter vector (see `p2pardict`)
+        N = self.Nstars
+        star_index = {}
+        star_indices = []
+        i = 0
+        for s in self.systems:
+            for j in xrange(N[s]):
+                star_index["{}_{}".format(s, j)] = len(star_indices)
+                star_indices.append([i + j] + list(range(i + N[s], i + N[s] + 4)))
+            i += N[s] + 4
+        system_pars = {s: star_indices[star_index["{}_0".format(s)]] for s in self.systems}
+
+        groups = {}
+        group_bands = []
+        group_stars = []
+
+        def group(node):
+            if node not in groups:
+                groups[node] = len(group_bands)
+                group_bands.append(bands.index(node.band))
+                group_stars.append([star_index[l.label] for l in node.leaves])
+            return groups[node]
+
+        # Photometry; same as `ObsNode.lnlike`
+        obs_groups, obs_refs, obs_vals, obs_uncs = [], [], [], []
+        for n in self:
+            if not isinstance(n, ObsNode) or isinstance(n, DummyObsNode):
+                continue
+            mag, dmag = n.value
+            if np.isnan(dmag):
+                continue
+            if n.relative:
+                if n.reference is None:
+                    continue
+                obs_refs.append(group(n.reference))
+                mag -= n.reference.value[0]
+            else:
+                obs_refs.append(-1)
+            obs_groups.append(group(n))
+            obs_vals.append(mag)
+            obs_uncs.append(dmag)
+
+        props = ["Teff", "logg", "feh"]
+
+        def prop_index(prop):
+            if prop not in props:
+                raise ValueError("Likelihood of {} not implemented (only {}).".format(prop, props))
+            return props.index(prop)
+
+        def columns(measurements):
+            # (star, prop, value, value) arrays, from {label: {prop: (value, value)}}
+            rows = [
+                (star_index[l], prop_index(k), v[0], v[1]) for l in measurements for k, v in measurements[l].items()
+            ]
+            return [np.array([r[i] for r in rows], dtype=int if i < 2 else float) for i in range(4)]
+
+        flat = FlatTree(
+            np.array(star_indices, dtype=int).reshape(-1, 5),
+            np.array(group_bands, dtype=int),
+            np.cumsum([0] + [len(g) for g in group_stars]),
+            np.array([i for g in group_stars for i in g], dtype=int),
+            np.array(obs_groups, dtype=int),
+            np.array(obs_refs, dtype=int),
+            np.array(obs_vals, dtype=float),
+            np.array(obs_uncs, dtype=float),
+            *columns(self.spectroscopy),
+            *columns(self.limits),
+            np.array([system_pars[s][3] for s in self.parallax], dtype=int),
+            np.array([v[0] for v in self.parallax.values()], dtype=float),
+            np.array([v[1] for v in self.parallax.values()], dtype=float),
+            np.array([system_pars[s][4] for s in self.AV], dtype=int),
+            np.array([v[0] for v in self.AV.values()], dtype=float),
+            np.array([v[1] for v in self.AV.values()], dtype=float),
+        )
+        self._flat = (bands, flat)
+        return flat
+
     def _find_closest(self, n0):
         """returns the node in the tree that is closest to n0, but not
           in the same observation
@@ -1257,7 +1450,7 @@ class ObservationTree(Node):
             except AttributeError:
                 pass
 
-        inds = np.argsort(ds)
+        inds = np.argsort(ds, kind="stable")
         ds = [ds[i] for i in inds]
         nodes = [nodes[i] for i in inds]
 
@@ -1277,6 +1470,9 @@ class ObservationTree(Node):
         self.children = []
 
         for i, o in enumerate(self._observations):
+            # Candidate parents are the nodes of the previous observations
+            if i > 0:
+                index = ObsNodeIndex(self.get_obs_nodes())
             s0 = o.brightest
             ref_node = ObsNode(o, s0)
             for s in o.sources:
@@ -1292,7 +1488,9 @@ class ObservationTree(Node):
                     parent = self
                 else:
                     # Find parent (closest node in tree)
-                    parent = self._find_closest(node)
+                    parent = index.closest(node)
+                    if parent is None:
+                        parent = self
 
                 parent.add_child(node)
 
@@ -19,6 +19,9 @@ ONE_OVER_ROOT_2PI = 1.0 / _norm_pdf_C
 _norm_pdf_logC = np.log(_norm_pdf_C)
 LOG_ONE_OVER_ROOT_2PI = np.log(ONE_OVER_ROOT_2PI)
 
+# Kinds of prior evaluated by the compiled `prior_lnpdf` (first element of `Prior.lnpdf_params`)
+FLAT, FLAT_LOG, POWER_LAW, GAUSSIAN, LOG_NORMAL, FEH, BROKEN, EEP = range(8)
+
 
 def _norm_pdf(x):
     return np.exp(-(x ** 2) / 2.0) / _norm_pdf_C
@@ -65,6 +68,14 @@ class Prior(object):
             pdf = self(x, **kwargs)
             return np.log(pdf) if pdf else -np.inf
 
+    def lnpdf_params(self):
+        """Array describing this prior to `prior_lnpdf`, which then evaluates `lnpdf` in compiled code
+
+        The array is (kind, lo, hi, parameters...), where values outside of
+        (lo, hi) have zero probability.
+        """
+        raise NotImplementedError("{} has no compiled lnpdf".format(type(self).__name__))
+
     def sample(self, n):
         if hasattr(self, "distribution"):
             return self.distribution.rvs(n)
@@ -210,6 +221,16 @@ class BrokenPrior(Prior):
         i = np.digitize(x, self.breakpoints)
         return self.components[i].lnpdf(x) - self.lognorms[i]
 
+    def lnpdf_params(self):
+        # (BROKEN, lo, hi, n, breakpoints, lognorms, offsets of the component arrays, component arrays)
+        n = self.n_components
+        components = [c.lnpdf_params() for c in self.components]
+        if any(int(c[0]) == BROKEN for c in components):
+            raise NotImplementedError("Nested BrokenPrior has no compiled lnpdf")
+        offsets = 4 + (n - 1) + n + (n + 1) + np.cumsum([0] + [len(c) for c in components])
+        header = [BROKEN, -np.inf, np.inf, n] + list(self.breakpoints) + list(self.lognorms) + list(offsets)
+        return np.concatenate([np.array(header, dtype=float)] + components)
+
     def sample(self, n):
         u = np.random.random(n)
 
@@ -256,6 +277,10 @@ class GaussianPrior(BoundedPrior):
     def _lnpdf(self, x):
         return _norm_logpdf((x - self.mean) / self.sigma) - np.log(self.sigma) - self.lognorm
 
+    def lnpdf_params(self):
+        lo, hi = self.bounds if self.bounds is not None else (-np.inf, np.inf)
+        return np.array([GAUSSIAN, lo, hi, self.mean, self.sigma, self.lognorm], dtype=float)
+
 
 class LogNormalPrior(Prior):
     def __init__(self, mu, sigma, bounds=None):
@@ -279,6 +304,10 @@ class LogNormalPrior(Prior):
         y = x / self.scale
         return LOG_ONE_OVER_ROOT_2PI - (self.log_s + np.log(y)) - 0.5 * (np.log(y) / s) ** 2 - self.mu
 
+    def lnpdf_params(self):
+        # `lnpdf` uses `_lnpdf` directly, without checking bounds
+        return np.array([LOG_NORMAL, -np.inf, np.inf, self.mu, self.sigma, self.scale, self.log_s], dtype=float)
+
 
 class FlatPrior(BoundedPrior):
     def __init__(self, bounds):
@@ -288,6 +317,10 @@ class FlatPrior(BoundedPrior):
         lo, hi = self.bounds
         return 1.0 / (hi - lo)
 
+    def lnpdf_params(self):
+        lo, hi = self.bounds
+        return np.array([FLAT, lo, hi, np.log(self._pdf(lo) / self._norm)], dtype=float)
+
     def sample(self, n):
         lo, hi = self.bounds
         return np.random.random(n) * (hi - lo) + lo
@@ -301,6 +334,11 @@ class FlatLogPrior(BoundedPrior):
         lo, hi = self.bounds
         return np.log(10) * 10 ** x / (10 ** hi - 10 ** lo)
 
+    def lnpdf_params(self):
+        # log of the pdf is linear in x
+        lo, hi = self.bounds
+        return np.array([FLAT_LOG, lo, hi, np.log(np.log(10) / (10 ** hi - 10 ** lo) / self._norm)], dtype=float)
+
     def sample(self, n):
         lo, hi = self.bounds
         return np.log10(np.random.random(n) * (10 ** hi - 10 ** lo) + 10 ** lo)
@@ -322,6 +360,11 @@ class PowerLawPrior(BoundedPrior):
         C = (1 + self.alpha) / (hi ** (1 + self.alpha) - lo ** (1 + self.alpha))
         return np.log(C) + self.alpha * np.log(x)
 
+    def lnpdf_params(self):
+        lo, hi = self.bounds
+        C = (1 + self.alpha) / (hi ** (1 + self.alpha) - lo ** (1 + self.alpha))
+        return np.array([POWER_LAW, lo, hi, self.alpha, np.log(C)], dtype=float)
+
     def sample(self, n):
         """
 
@@ -380,6 +423,10 @@ class FehPrior(Prior):
 
         return self.halo_fraction * halo_fehdist + (1 - self.halo_fraction) * disk_fehdist
 
+    def lnpdf_params(self):
+        lo, hi = self.bounds
+        return np.array([FEH, lo, hi, self.halo_fraction, self.local, self._norm], dtype=float)
+
     def sample(self, n):
         if self.local:
             w1, mu1, sig1 = 0.8, 0.016, 0.15
@@ -428,6 +475,17 @@ class EEP_prior(BoundedPrior):
         orig_val, dx_deep = self.ic.interp_value(pars, [self.orig_par, self.deriv_prop]).squeeze()
         return self.orig_prior(orig_val) * dx_deep
 
+    def lnpdf_params(self):
+        """(EEP, lo, hi, orig_lo, orig_hi, orig_prior.lnpdf_params()...)
+
+        The interpolation of (orig_par, deriv_prop) is left to the caller
+        (see `isochrones.likelihood.star_lnpost`).
+        """
+        lo, hi = self.bounds
+        orig_lo, orig_hi = self.orig_prior.bounds
+        header = np.array([EEP, lo, hi, orig_lo, orig_hi], dtype=float)
+        return np.concatenate([header, self.orig_prior.lnpdf_params()])
+
     def sample(self, n, **kwargs):
         eeps = pd.Series(np.arange(self.bounds[0], self.bounds[1])).sample(n, replace=True)
 
@@ -466,20 +524,80 @@ class EEP_prior(BoundedPrior):
 
 
 # Utility numba PDFs for speed!
-@nb.jit(nopython=True)
+@nb.jit(nopython=True, cache=True)
 def powerlaw_pdf(x, alpha, lo, hi):
     alpha_plus_one = alpha + 1
     C = alpha_plus_one / (hi ** alpha_plus_one - lo ** alpha_plus_one)
     return C * x ** alpha
 
 
-@nb.jit(nopython=True)
+@nb.jit(nopython=True, cache=True)
 def powerlaw_lnpdf(x, alpha, lo, hi):
     alpha_plus_one = alpha + 1
     C = alpha_plus_one / (hi ** alpha_plus_one - lo ** alpha_plus_one)
     return log(C) + alpha * log(x)
 
 
+@nb.jit(nopython=True, cache=True)
+def _simple_lnpdf(params, x):
+    kind = int(params[0])
+    if x < params[1] or x > params[2]:
+        return -np.inf
+    if kind == FLAT:
+        return params[3]
+    elif kind == FLAT_LOG:
+        return params[3] + x * log(10.0)
+    elif kind == POWER_LAW:
+        return params[4] + params[3] * np.log(x)
+    elif kind == GAUSSIAN:
+        z = (x - params[3]) / params[4]
+        return -(z ** 2) / 2.0 - _norm_pdf_logC - np.log(params[4]) - params[5]
+    elif kind == LOG_NORMAL:
+        s = params[4]
+        y = x / params[5]
+        return LOG_ONE_OVER_ROOT_2PI - (params[6] + np.log(y)) - 0.5 * (np.log(y) / s) ** 2 - params[3]
+    elif kind == FEH:
+        # Same as FehPrior._pdf
+        halo_fraction = params[3]
+        if params[4]:
+            disk_norm = 2.5066282746310007
+            disk_fehdist = (
+                1.0
+                / disk_norm
+                * (
+                    0.8 / 0.15 * np.exp(-0.5 * (x - 0.016) ** 2.0 / 0.15 ** 2.0)
+                    + 0.2 / 0.22 * np.exp(-0.5 * (x + 0.15) ** 2.0 / 0.22 ** 2.0)
+                )
+            )
+        else:
+            mu, sig = -0.3, 0.3
+            disk_fehdist = 1.0 / np.sqrt(2 * np.pi) / sig * np.exp(-0.5 * (x - mu) ** 2 / sig ** 2)
+
+        halo_mu, halo_sig = -1.5, 0.4
+        halo_fehdist = (
+            1.0 / np.sqrt(2 * np.pi * halo_sig ** 2) * np.exp(-0.5 * (x - halo_mu) ** 2 / halo_sig ** 2)
+        )
+        pdf = (halo_fraction * halo_fehdist + (1 - halo_fraction) * disk_fehdist) / params[5]
+        return np.log(pdf) if pdf != 0 else -np.inf
+    return np.nan
+
+
+@nb.jit(nopython=True, cache=True)
+def prior_lnpdf(params, x):
+    """lnpdf at x of the prior described by params (see `Prior.lnpdf_params`), except EEP priors
+    """
+    if int(params[0]) == BROKEN:
+        n = int(params[3])
+        i = 0
+        while i < n - 1 and x >= params[4 + i]:
+            i += 1
+        lognorm = params[4 + (n - 1) + i]
+        start = int(params[4 + (n - 1) + n + i])
+        end = int(params[4 + (n - 1) + n + i + 1])
+        return _simple_lnpdf(params[start:end], x) - lognorm
+    return _simple_lnpdf(params, x)
+
+
 class AgePrior(FlatLogPrior):
     """Uniform true age prior, where 'age' is actually log10(age)
     """
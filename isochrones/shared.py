@@ -0,0 +1,200 @@
+"""Sharing of model grid arrays between processes
+
+When many processes (e.g., the workers of a `multiprocessing.Pool` fitting a
+`StarCatalog`) each use the same `ModelGridInterpolator`, every one of them
+would otherwise load its own copy of the model and bolometric correction grids.
+A `SharedGridRegistry` copies these arrays into `multiprocessing.shared_memory`
+blocks once, in the parent process.  Objects holding shared arrays are then
+pickled with a reference to the block in place of the array, and attach to
+it by name when unpickled in a child process::
+
+    with SharedGridRegistry() as registry:
+        registry.share(ic)
+        with Pool(64) as pool:
+            results = pool.map(fit_star, [(ic, star) for star in stars])
+
+Blocks are unlinked when the registry is closed (or, if the parent dies
+first, by the multiprocessing resource tracker).  Shared memory requires
+Python >= 3.8; only sharing and attaching need it, not importing this module.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+from .logger import getLogger
+
+# Blocks created or attached to by this process.  Attached blocks are kept open
+# for the lifetime of the process; created ones until their registry is closed.
+_attached = {}
+
+
+def _shared_memory():
+    """Returns the `multiprocessing.shared_memory` module
+    """
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        raise ImportError("Sharing grids between processes requires Python >= 3.8 (multiprocessing.shared_memory).")
+    return shared_memory
+
+
+def _attach_block(name):
+    shared_memory = _shared_memory()
+    from multiprocessing import resource_tracker, parent_process
+
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        pass
+
+    shm = shared_memory.SharedMemory(name=name)
+
+    # Attaching registers the block with this process's resource tracker, which
+    # unlinks it when the process exits.  Processes started by multiprocessing share
+    # the tracker of their parent, which owns the block, so that is harmless; but
+    # an unrelated process would destroy the block for everybody else on exit.
+    if parent_process() is None:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class SharedArray(object):
+    """Picklable reference to an array stored in a shared memory block
+    """
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = dtype
+
+    def __repr__(self):
+        return "<SharedArray {}: {} {}>".format(self.name, self.dtype, self.shape)
+
+    def attach(self):
+        """Returns array backed by the shared memory block
+        """
+        shm = _attached.get(self.name)
+        if shm is None:
+            shm = _attach_block(self.name)
+            _attached[self.name] = shm
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+
+
+class SharedArrayMixin(object):
+    """Pickles attributes that live in shared memory as `SharedArray` references
+
+    Classes using this should initialize `self._shared_arrays = {}`; it maps
+    attribute names to the `SharedArray` the attribute was placed in
+    (see `SharedGridRegistry.share_array`).
+    """
+
+    @property
+    def is_shared(self):
+        return bool(getattr(self, "_shared_arrays", None))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attr, ref in state.get("_shared_arrays", {}).items():
+            state[attr] = ref
+        return state
+
+    def __setstate__(self, state):
+        for attr, value in state.items():
+            if isinstance(value, SharedArray):
+                state[attr] = value.attach()
+        self.__dict__.update(state)
+
+
+class SharedGridRegistry(object):
+    """Places grid arrays in shared memory, and manages the lifetime of the blocks
+
+    Use `share` to move all the grids of a `ModelGridInterpolator` into shared
+    memory, or `share_array` for individual arrays.  The blocks are unlinked
+    by `close` (also called when used as a context manager), after which the
+    objects in the parent process get back private copies of their arrays.
+    """
+
+    def __init__(self):
+        self._blocks = OrderedDict()
+        self._owners = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self._blocks)
+
+    @property
+    def nbytes(self):
+        return sum(shm.size for shm in self._blocks.values())
+
+    def share_array(self, obj, attr):
+        """Replaces obj.attr by a copy in a new shared memory block
+
+        `obj` must use `SharedArrayMixin`.  Returns the `SharedArray` reference.
+        """
+        if attr in obj._shared_arrays:
+            return obj._shared_arrays[attr]
+
+        arr = np.ascontiguousarray(getattr(obj, attr))
+        shm = _shared_memory().SharedMemory(create=True, size=max(arr.nbytes, 1))
+        view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+        view[...] = arr
+
+        ref = SharedArray(shm.name, arr.shape, arr.dtype.str)
+        obj._shared_arrays[attr] = ref
+        setattr(obj, attr, view)
+
+        self._blocks[shm.name] = shm
+        _attached[shm.name] = shm
+        self._owners.append((obj, attr))
+        return ref
+
+    def share(self, ic):
+        """Places all grids used by a `ModelGridInterpolator` in shared memory
+
+        This includes the model and bolometric correction grids, any column-subset
+        grids loaded with `get_subset_interp`, the EEP lattice (if loaded), the
+        irregular age grids of evolution track models (and mass grids of
+        isochrones, if loaded), and the same for the companion isochrone/track
+        interpolators, if they have been loaded.
+        """
+        for grid in [ic.model_grid, ic.bc_grid]:
+            self.share_array(grid.interp, "grid")
+        for interp in ic._subset_interps.values():
+            self.share_array(interp, "grid")
+        if getattr(ic, "_eep_lattice", None) is not None:
+            self.share_array(ic._eep_lattice, "grid")
+
+        # Array grids of isochrones are only needed by get_eep, so are shared only if loaded.
+        if ic.eep_replaces == "age" or hasattr(ic.model_grid, "_array_grid"):
+            ic.model_grid.array_grid  # make sure these are loaded
+            for attr in ["_array_grid", "_deep_grid", "_array_lengths", "_array_first_eeps"]:
+                self.share_array(ic.model_grid, attr)
+
+        for other in [getattr(ic, "_iso", None), getattr(ic, "_track", None)]:
+            if other is not None:
+                self.share(other)
+
+        getLogger().debug("{} grid arrays in shared memory ({:.1f} MB)".format(len(self), self.nbytes / 1e6))
+
+    def close(self):
+        """Restores private copies of shared arrays in this process, and unlinks all blocks
+        """
+        for obj, attr in self._owners:
+            obj._shared_arrays.pop(attr, None)
+            setattr(obj, attr, np.array(getattr(obj, attr)))
+        self._owners = []
+
+        for name, shm in self._blocks.items():
+            _attached.pop(name, None)
+            try:
+                shm.close()
+            except BufferError:
+                # Some other view of the block is still alive; it is freed once that goes away.
+                pass
+            shm.unlink()
+        self._blocks = OrderedDict()
@@ -29,11 +29,16 @@ def starfit(
     ini_file="star.ini",
     no_plots=False,
     bands=None,
+    ichrone=None,
     **kwargs
 ):
     """ Runs starfit routine for a given folder.
 
     feh_prior : 'flat' or 'local'
+
+    ichrone : `ModelGridInterpolator` to use (e.g., one shared by many calls),
+        which must have all the bands of the star; by default, one is created
+        with the bands of the star (and `bands`).
     """
     nstars = {"single": 1, "binary": 2, "triple": 3}
 
@@ -42,8 +47,6 @@ def starfit(
     else:
         Mod = starmodel_type
 
-    ichrone = None
-
     print("Fitting {}".format(folder))
     for mult in multiplicities:
         print("{} starfit...".format(mult))
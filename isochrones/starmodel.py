@@ -2,10 +2,11 @@ from __future__ import print_function, division
 
 import os, os.path, sys, re, glob
 import itertools
+import ctypes
 from copy import deepcopy
 import json
 
-from .config import on_rtd
+from .config import on_rtd, CELL_CACHE, COMPILED_LNPOST
 
 from .logger import getLogger
 
@@ -40,7 +41,11 @@ from .priors import AgePrior, DistancePrior, AVPrior, QPrior, FlatPrior
 from .priors import SalpeterPrior, ChabrierPrior, FehPrior, EEP_prior, QPrior
 from .isochrone import get_ichrone
 from .models import ModelGridInterpolator
-from .likelihood import star_lnlike, gauss_lnprob
+from .interp import CellCache
+from .interp import use_parallel, call_parallel
+from .likelihood import star_lnlike, star_lnlikes, star_lnlikes_parallel, star_lnlike_and_grad
+from .likelihood import star_lnpost, star_lnposts, star_lnposts_parallel, tree_lnlike, gauss_lnprob, gauss_lnprobs
+from .likelihood import LikelihoodContext
 
 try:
     from .fit import fit_emcee3
@@ -60,6 +65,20 @@ def _parse_config_value(v):
     return val
 
 
+def _is_eep(par):
+    """Whether par is the EEP of a star (eep, or eep_0, eep_1, ... for multiple stars)
+    """
+    return par == "eep" or par.startswith("eep_")
+
+
+def _mnest_cube(cube, ndim):
+    """Array view of the cube passed to MultiNest callbacks (a ctypes pointer)
+    """
+    if isinstance(cube, ctypes._Pointer):
+        return np.ctypeslib.as_array(cube, shape=(ndim,))
+    return cube
+
+
 class StarModel(object):
     """
 
@@ -185,6 +204,7 @@ class StarModel(object):
 
         self._bands = None
         self._props = None
+        self._tree_grid_args = None
 
         self._directory = None
         self._samples = None
@@ -541,18 +561,45 @@ class StarModel(object):
             return -np.inf
         return lnpr + self.lnlike(p, **kwargs)
 
+    def lnpost_batch(self, P):
+        """lnpost of each row of P (n, n_params), e.g. the positions of an ensemble of walkers
+        """
+        return np.array([self.lnpost(p) for p in P])
+
     def lnlike(self, p, **kwargs):
-        pardict = self.obs.p2pardict(p)
+        """Same as `ObservationTree.lnlike`, in a single compiled call (`likelihood.tree_lnlike`)
 
-        model_values = {}
-        for star, pars in pardict.items():
-            Teff, logg, feh, mags = self.ic.interp_mag(pars, self.bands)
-            vals = {"Teff": Teff, "logg": logg, "feh": feh}
-            vals.update({b: m for b, m in zip(self.bands, mags)})
-            model_values[star] = vals
+        The tree is flattened into arrays (`ObservationTree.flatten`) on
+        first use, and again only after it changes.
+        """
+        flat = self.obs.flatten(self.bands)
+        return tree_lnlike(np.asarray(p, dtype=float), *flat, *self.tree_grid_args)
 
-        lnl = self.obs.lnlike(pardict, model_values, **kwargs)
-        return lnl
+    @property
+    def tree_grid_args(self):
+        """Arguments of `tree_lnlike` following the flattened tree: grid layouts, and band columns
+        """
+        if self._tree_grid_args is None:
+            model_interp = self.ic.get_subset_interp(("Teff", "logg", "feh", "Mbol"))
+            i_mags = np.array([self.ic.bc_grid.interp.column_index[b] for b in self.bands], dtype=int)
+            self._tree_grid_args = (
+                self.ic.param_index_order,
+                model_interp.column_index["Teff"],
+                model_interp.column_index["logg"],
+                model_interp.column_index["feh"],
+                model_interp.column_index["Mbol"],
+                *model_interp.layout,
+                i_mags,
+                *self.ic.bc_grid.interp.layout,
+                self.ic.bc_Rv,
+            )
+        return self._tree_grid_args
+
+    def __getstate__(self):
+        # The grid arguments refer to the grid arrays directly; they are rebuilt after unpickling.
+        state = self.__dict__.copy()
+        state["_tree_grid_args"] = None
+        return state
 
     def lnprior(self, p):
         N = self.obs.Nstars
@@ -864,10 +911,7 @@ class StarModel(object):
         nbad = 1
 
         while True:
-            ibad = []
-            for i, p in enumerate(p0):
-                if not np.isfinite(self.lnpost(p)):
-                    ibad.append(i)
+            ibad = np.where(~np.isfinite(self.lnpost_batch(p0)))[0]
 
             nbad = len(ibad)
             if nbad == 0:
@@ -949,7 +993,7 @@ class StarModel(object):
             logger.debug("Generating initial p0 for {} walkers...".format(nwalkers))
             p0 = self.emcee_p0(nwalkers)
             if initial_burn:
-                sampler = emcee.EnsembleSampler(nwalkers, npars, self.lnpost, **kwargs)
+                sampler = self._ensemble_sampler(nwalkers, npars, **kwargs)
                 # ninitial = 300 #should this be parameter?
                 pos, prob, state = sampler.run_mcmc(p0, ninitial)
 
@@ -963,7 +1007,7 @@ class StarModel(object):
             p0 = np.array(p0)
             p0 = rand.normal(size=(nwalkers, npars)) * 0.01 + p0.T[None, :]
 
-        sampler = emcee.EnsembleSampler(nwalkers, npars, self.lnpost)
+        sampler = self._ensemble_sampler(nwalkers, npars)
         pos, prob, state = sampler.run_mcmc(p0, nburn)
         sampler.reset()
         sampler.run_mcmc(pos, niter, rstate0=state)
@@ -971,6 +1015,16 @@ class StarModel(object):
         self._sampler = sampler
         return sampler
 
+    def _ensemble_sampler(self, nwalkers, npars, **kwargs):
+        """`emcee.EnsembleSampler` of lnpost, evaluating all walkers at once with `lnpost_batch`
+
+        Falls back to one walker per call with emcee < 3, which cannot vectorize.
+        """
+        try:
+            return emcee.EnsembleSampler(nwalkers, npars, self.lnpost_batch, vectorize=True, **kwargs)
+        except TypeError:
+            return emcee.EnsembleSampler(nwalkers, npars, self.lnpost, **kwargs)
+
     @property
     def sampler(self):
         """
@@ -1361,8 +1415,21 @@ class StarModelGroup(object):
 class BasicStarModel(StarModel):
     """Bare bones starmodel, without "obs" complication.
 
-    Use this for straight-up single, binary, or triple fits, no
-    mix of blended/unblended.
+    Use this for straight-up single, binary, triple (or any N) fits, no
+    mix of blended/unblended.  With N > 1, the stars are unresolved (their
+    fluxes add up), share age, feh, distance, and AV, and have parameters
+    eep_0, ..., eep_{N-1}, in decreasing order.
+
+    If ``cell_cache`` is True (default from ``ISOCHRONES_CELL_CACHE``), then
+    the likelihood looks up each star in the model and BC grids starting from
+    the grid cell it was in at the previous evaluation.  This pays off when
+    successive evaluations are close (e.g., along a single chain); see
+    `cell_cache_stats` for the hit rates.
+
+    If ``compiled_lnpost`` is True (default from ``ISOCHRONES_COMPILED_LNPOST``),
+    then `lnpost` is evaluated entirely in compiled code (`likelihood.star_lnpost`),
+    priors included, rather than as `lnprior` + `lnlike`.  All priors must then
+    support `Prior.lnpdf_params`, as the default ones do.
     """
 
     use_emcee = False
@@ -1381,9 +1448,15 @@ class BasicStarModel(StarModel):
         dec=None,
         obs=None,
         use_emcee=False,
+        cell_cache=CELL_CACHE,
+        compiled_lnpost=COMPILED_LNPOST,
         **kwargs
     ):
         self._ic = ic
+        self.cell_cache = cell_cache
+        self._cell_caches = None
+        self._lnlike_context = None
+        self._compiled_lnpost = compiled_lnpost
 
         self.eep_bounds = eep_bounds if eep_bounds is not None else self.ic.eep_bounds
         self.name = str(name)
@@ -1406,16 +1479,12 @@ class BasicStarModel(StarModel):
                 self.feh_index = 2
                 self.distance_index = 3
                 self.AV_index = 4
-        elif N == 2:
-            self.age_index = 2
-            self.feh_index = 3
-            self.distance_index = 4
-            self.AV_index = 5
-        elif N == 3:
-            self.age_index = 3
-            self.feh_index = 4
-            self.distance_index = 5
-            self.AV_index = 6
+        else:
+            # eep_0, ..., eep_{N-1}, then the shared age, feh, distance, AV
+            self.age_index = N
+            self.feh_index = N + 1
+            self.distance_index = N + 2
+            self.AV_index = N + 3
 
         self.N = N
 
@@ -1434,6 +1503,7 @@ class BasicStarModel(StarModel):
         self._bands = None
         self._spec_props = None
         self._props = None
+        self._lnlike_columns = None
 
         self._param_names = None
 
@@ -1506,15 +1576,20 @@ class BasicStarModel(StarModel):
             return "binary"
         elif self.N == 3:
             return "triple"
+        elif self.N == 4:
+            return "quadruple"
+        elif self.N == 5:
+            return "quintuple"
+        else:
+            return "{}-tuple".format(self.N)
 
     @property
     def param_names(self):
         if self._param_names is None:
             self._param_names = self.ic.param_names
-            if self.N == 2:
-                self._param_names = tuple(["eep_0", "eep_1"] + list(self.ic.param_names[1:]))
-            elif self.N == 3:
-                self._param_names = tuple(["eep_0", "eep_1", "eep_2"] + list(self.ic.param_names[1:]))
+            if self.N > 1:
+                eeps = ["eep_{}".format(i) for i in range(self.N)]
+                self._param_names = tuple(eeps + list(self.ic.param_names[1:]))
         return self._param_names
 
     @property
@@ -1535,8 +1610,53 @@ class BasicStarModel(StarModel):
             self._spec_props = [self.kwargs.get(k, (np.nan, np.nan)) for k in ["Teff", "logg", "feh"]]
         return self._spec_props
 
+    @property
+    def cell_caches(self):
+        """(model grid, BC grid) `CellCache` used by `lnlike`, with a row per star
+        """
+        if self._cell_caches is None:
+            self._cell_caches = (
+                CellCache(self.ic.model_grid.interp.ndim, self.N),
+                CellCache(self.ic.bc_grid.interp.ndim, self.N),
+            )
+        return self._cell_caches
+
+    def cell_cache_stats(self):
+        """Hit, neighbour hit, and miss counts of the model and BC grid lookups
+        """
+        model_cache, bc_cache = self.cell_caches
+        return {"model": model_cache.stats(), "bc": bc_cache.stats()}
+
+    @property
+    def lnlike_columns(self):
+        """Model grid columns needed by `lnlike`
+        """
+        if self._lnlike_columns is None:
+            columns = ["Teff", "logg", "feh", "Mbol"]
+            if "nu_max" in self.kwargs:
+                columns += ["nu_max", "delta_nu"]
+            self._lnlike_columns = tuple(columns)
+        return self._lnlike_columns
+
+    @property
+    def lnpost_columns(self):
+        """Model grid columns needed by `lnpost` when compiled: those of `lnlike`, and of the EEP prior
+        """
+        deriv_prop = "dt_deep" if self.ic.eep_replaces == "age" else "dm_deep"
+        extra = [c for c in (self.ic.eep_replaces, deriv_prop) if c not in self.lnlike_columns]
+        return self.lnlike_columns + tuple(extra)
+
+    @property
+    def compiled_lnpost(self):
+        return self._compiled_lnpost
+
+    @compiled_lnpost.setter
+    def compiled_lnpost(self, value):
+        self._compiled_lnpost = value
+        self.reset_lnlike_context()
+
     def bounds(self, prop):
-        if prop in ["eep_0", "eep_1", "eep_2"]:
+        if _is_eep(prop):
             prop = "eep"
         if self._bounds[prop] is not None:
             return self._bounds[prop]
@@ -1560,89 +1680,300 @@ class BasicStarModel(StarModel):
     def n_params(self):
         return len(self.param_names)
 
-    def lnlike(self, pars):
-        if self.N == 1:
-            pars = np.array([pars[0], pars[1], pars[2], pars[3], pars[4]], dtype=float)
-            primary_pars = pars
-        elif self.N == 2:
-            primary_pars = np.array([pars[0], pars[2], pars[3], pars[4], pars[5]])
-            pars = np.array([pars[0], pars[1], pars[2], pars[3], pars[4], pars[5]], dtype=float)
-        elif self.N == 3:
-            primary_pars = np.array([pars[0], pars[3], pars[4], pars[5], pars[6]])
-            pars = np.array([pars[0], pars[1], pars[2], pars[3], pars[4], pars[5], pars[6]], dtype=float)
+    def _lnlike_args(self, model_interp=None):
+        """Arguments of `star_lnlike` following pars: observations, and grid layouts
 
-        spec_vals, spec_uncs = zip(*[prop for prop in self.spec_props])
+        model_interp defaults to the subset of the model grid with `lnlike_columns`.
+        """
+        spec_vals, spec_uncs = [np.array(x, dtype=float) for x in zip(*self.spec_props)]
         if self.bands:
-            mag_vals, mag_uncs = zip(*[self.kwargs[b] for b in self.bands])
-            i_mags = [self.ic.bc_grid.interp.column_index[b] for b in self.bands]
+            mag_vals, mag_uncs = [np.array(x, dtype=float) for x in zip(*[self.kwargs[b] for b in self.bands])]
+            i_mags = np.array([self.ic.bc_grid.interp.column_index[b] for b in self.bands], dtype=int)
         else:
             mag_vals, mag_uncs = np.array([], dtype=float), np.array([], dtype=float)
             i_mags = np.array([], dtype=int)
-        lnlike = star_lnlike(
-            pars,
+        if model_interp is None:
+            model_interp = self.ic.get_subset_interp(self.lnlike_columns)
+        return (
             self.ic.param_index_order,
             spec_vals,
             spec_uncs,
             mag_vals,
             mag_uncs,
             i_mags,
-            self.ic.model_grid.interp.grid,
-            self.ic.model_grid.interp.column_index["Teff"],
-            self.ic.model_grid.interp.column_index["logg"],
-            self.ic.model_grid.interp.column_index["feh"],
-            self.ic.model_grid.interp.column_index["Mbol"],
-            *self.ic.model_grid.interp.index_columns,
-            self.ic.bc_grid.interp.grid,
-            *self.ic.bc_grid.interp.index_columns
+            model_interp.column_index["Teff"],
+            model_interp.column_index["logg"],
+            model_interp.column_index["feh"],
+            model_interp.column_index["Mbol"],
+            *model_interp.layout,
+            *self.ic.bc_grid.interp.layout,
+            self.ic.bc_Rv,
         )
 
-        if "parallax" in self.kwargs:
-            plax, plax_unc = self.kwargs["parallax"]
-            lnlike += gauss_lnprob(plax, plax_unc, 1000.0 / pars[self.distance_index])
-
-        # Asteroseismology
+    def _lnpost_args(self):
+        """Arguments of `star_lnpost` following pars
+        """
+        N = self.N
+        param_names = list(self.param_names)
+        prior_params = [self._priors["eep" if _is_eep(par) else par].lnpdf_params() for par in param_names]
+        prior_offsets = np.cumsum([0] + [len(a) for a in prior_params])
+
+        # Each star's parameters, in isochrone order, are its own EEP (or mass), then the shared ones
+        stars = [int(par.split("_")[1]) if par.startswith("eep_") else 0 for par in param_names]
+        star_indices = np.array([[s] + list(range(N, N + 4)) for s in stars], dtype=int)
+
+        model_interp = self.ic.get_subset_interp(self.lnpost_columns)
+        deriv_prop = "dt_deep" if self.ic.eep_replaces == "age" else "dm_deep"
+        i_eep_cols = np.array([model_interp.column_index[c] for c in (self.ic.eep_replaces, deriv_prop)])
         if "nu_max" in self.kwargs:
-            model_nu_max, model_delta_nu = self.ic.interp_value(primary_pars, ["nu_max", "delta_nu"])
+            i_astero_cols = np.array([model_interp.column_index[c] for c in ("nu_max", "delta_nu")])
+        else:
+            i_astero_cols = np.zeros(2, dtype=int)
+
+        def observed(prop):
+            return np.array(self.kwargs.get(prop, ()), dtype=float)
+
+        return (
+            np.concatenate(prior_params),
+            prior_offsets,
+            star_indices,
+            i_eep_cols,
+            self.distance_index,
+            observed("parallax"),
+            i_astero_cols,
+            observed("nu_max"),
+            observed("delta_nu"),
+            *self._lnlike_args(model_interp),
+        )
+
+    @property
+    def lnlike_context(self):
+        """`LikelihoodContext` used by `lnlike`, `lnprior`, and the MultiNest callbacks
+
+        Built on first use.  Call `reset_lnlike_context` after changing the
+        observations (``kwargs``), or after moving the grids to shared memory.
+        """
+        if self._lnlike_context is None:
+            self._lnlike_context = self._build_lnlike_context()
+        return self._lnlike_context
+
+    def reset_lnlike_context(self):
+        self._lnlike_context = None
+
+    def _build_lnlike_context(self):
+        param_names = list(self.param_names)
+        # The EEP prior is conditioned on the parameter EEP replaces, and on feh
+        conditioned_on = ["mass" if self.ic.eep_replaces == "age" else "age", "feh"]
+        eep_kwargs = tuple((par, param_names.index(par)) for par in conditioned_on)
+        bounds = np.array([self.bounds(par) for par in param_names], dtype=float)
+        return LikelihoodContext(
+            n_params=self.n_params,
+            args=self._lnlike_args(),
+            model_interp=self.ic.get_subset_interp(self.lnlike_columns),
+            parallax=self.kwargs.get("parallax"),
+            nu_max=self.kwargs.get("nu_max"),
+            delta_nu=self.kwargs.get("delta_nu"),
+            distance_index=self.distance_index,
+            priors=tuple((i, self._priors[par].lnpdf) for i, par in enumerate(param_names) if not _is_eep(par)),
+            eep_lnpdf=self._priors["eep"].lnpdf,
+            eep_indices=tuple(i for i, par in enumerate(param_names) if _is_eep(par)),
+            eep_kwargs=eep_kwargs,
+            lower=bounds[:, 0],
+            width=bounds[:, 1] - bounds[:, 0],
+            lnpost_args=self._lnpost_args() if self.compiled_lnpost else None,
+        )
+
+    def set_prior(self, **kwargs):
+        super().set_prior(**kwargs)
+        self.reset_lnlike_context()
+
+    def set_bounds(self, **kwargs):
+        super().set_bounds(**kwargs)
+        self.reset_lnlike_context()
 
-            nu_max, nu_max_unc = self.kwargs["nu_max"]
+    def __getstate__(self):
+        # The context refers to the grid arrays directly; it is rebuilt after unpickling.
+        state = super().__getstate__()
+        state["_lnlike_context"] = None
+        return state
+
+    def lnpost(self, p, **kwargs):
+        if not self.compiled_lnpost:
+            return super().lnpost(p, **kwargs)
+
+        ctx = self.lnlike_context
+        pars = np.asarray(p, dtype=float)[: ctx.n_params]
+        if self.cell_cache:
+            model_cache, bc_cache = self.cell_caches
+            return star_lnpost(pars, *ctx.lnpost_args, model_cache.array, bc_cache.array)
+        return star_lnpost(pars, *ctx.lnpost_args)
+
+    def lnlike(self, pars):
+        ctx = self.lnlike_context
+        pars = np.asarray(pars, dtype=float)[: ctx.n_params]
+
+        if self.cell_cache:
+            model_cache, bc_cache = self.cell_caches
+            lnlike = star_lnlike(pars, *ctx.args, model_cache.array, bc_cache.array)
+        else:
+            lnlike = star_lnlike(pars, *ctx.args)
+
+        if ctx.parallax is not None:
+            plax, plax_unc = ctx.parallax
+            lnlike += gauss_lnprob(plax, plax_unc, 1000.0 / pars[ctx.distance_index])
+
+        # Asteroseismology, of the primary
+        if ctx.nu_max is not None:
+            primary_pars = np.concatenate([pars[:1], pars[self.N :]])
+            model_nu_max, model_delta_nu = self.ic.interp_value(
+                primary_pars, ["nu_max", "delta_nu"], interp=ctx.model_interp
+            )
+
+            nu_max, nu_max_unc = ctx.nu_max
+            lnlike += gauss_lnprob(nu_max, nu_max_unc, model_nu_max)
+
+            if ctx.delta_nu is not None:
+                delta_nu, delta_nu_unc = ctx.delta_nu
+                lnlike += gauss_lnprob(delta_nu, delta_nu_unc, model_delta_nu)
+
+        return lnlike
+
+    def lnlike_and_grad(self, pars):
+        """Same as `lnlike`, also returning its gradient with respect to pars
+
+        The gradient is exact within each cell of the model and BC grids (see
+        `isochrones.interp.interp_value_and_grad_nd`), for use with gradient-based
+        optimizers or samplers.
+        """
+        ctx = self.lnlike_context
+        pars = np.array(pars[: ctx.n_params], dtype=float)
+
+        model_interp = ctx.model_interp
+        lnlike, grad = star_lnlike_and_grad(pars, *ctx.args)
+
+        if ctx.parallax is not None:
+            plax, plax_unc = ctx.parallax
+            distance = pars[self.distance_index]
+            model_plax = 1000.0 / distance
+            lnlike += gauss_lnprob(plax, plax_unc, model_plax)
+            grad[self.distance_index] += (plax - model_plax) / plax_unc ** 2 * (-model_plax / distance)
+
+        # Asteroseismology, of the primary
+        if ctx.nu_max is not None:
+            primary = np.array([pars[0]] + list(pars[self.N :]))
+            index_order = self.ic.param_index_order
+            point = primary[index_order[: model_interp.ndim]]
+            (model_nu_max, model_delta_nu), d_model = model_interp.value_and_grad(point, ["nu_max", "delta_nu"])
+
+            # Derivatives with respect to the primary's parameters, then to pars
+            d_primary = np.zeros((2, 5))
+            d_primary[:, index_order[: model_interp.ndim]] = d_model
+            d_pars = np.zeros((2, len(pars)))
+            d_pars[:, 0] = d_primary[:, 0]
+            d_pars[:, self.N :] = d_primary[:, 1:]
+
+            nu_max, nu_max_unc = ctx.nu_max
             lnlike += gauss_lnprob(nu_max, nu_max_unc, model_nu_max)
+            grad += (nu_max - model_nu_max) / nu_max_unc ** 2 * d_pars[0]
+
+            if ctx.delta_nu is not None:
+                delta_nu, delta_nu_unc = ctx.delta_nu
+                lnlike += gauss_lnprob(delta_nu, delta_nu_unc, model_delta_nu)
+                grad += (delta_nu - model_delta_nu) / delta_nu_unc ** 2 * d_pars[1]
+
+        return lnlike, grad
+
+    def lnlike_batch(self, P):
+        """lnlike of each row of P (n, n_params), in a single compiled call
+
+        Unlike `lnlike`, does not use the cell caches, as successive rows
+        (e.g., different walkers) are generally not close to each other.
+        """
+        ctx = self.lnlike_context
+        P = np.ascontiguousarray(np.atleast_2d(P)[:, : ctx.n_params], dtype=float)
+        args = (P,) + ctx.args
+        if use_parallel(len(P)):
+            lnlike = call_parallel(star_lnlikes_parallel, *args)
+        else:
+            lnlike = star_lnlikes(*args)
+
+        if ctx.parallax is not None:
+            plax, plax_unc = ctx.parallax
+            lnlike += gauss_lnprobs(plax, plax_unc, 1000.0 / P[:, ctx.distance_index])
+
+        # Asteroseismology, of the primary
+        if ctx.nu_max is not None:
+            primary = np.concatenate([P[:, :1], P[:, self.N :]], axis=1)
+            model_nu_max, model_delta_nu = self.ic.interp_value(
+                primary.T, ["nu_max", "delta_nu"], interp=ctx.model_interp
+            ).T
 
-            if "delta_nu" in self.kwargs:
-                delta_nu, delta_nu_unc = self.kwargs["delta_nu"]
-                lnlike += gauss_lnprob(delta_nu, delta_nu, model_delta_nu)
+            nu_max, nu_max_unc = ctx.nu_max
+            lnlike += gauss_lnprobs(nu_max, nu_max_unc, model_nu_max)
+
+            if ctx.delta_nu is not None:
+                delta_nu, delta_nu_unc = ctx.delta_nu
+                lnlike += gauss_lnprobs(delta_nu, delta_nu_unc, model_delta_nu)
 
         return lnlike
 
+    def lnprior_batch(self, P):
+        """lnprior of each row of P (n, n_params)
+        """
+        return np.array([self.lnprior(p) for p in P])
+
+    def lnpost_batch(self, P):
+        """lnpost of each row of P (n, n_params), e.g. the positions of an ensemble of walkers
+
+        With ``compiled_lnpost``, all rows are evaluated in a single compiled call
+        (`likelihood.star_lnposts`).  Otherwise, the likelihood is evaluated (with
+        `lnlike_batch`) only where the prior is finite.
+        """
+        P = np.atleast_2d(P)
+        if self.compiled_lnpost:
+            ctx = self.lnlike_context
+            args = (np.ascontiguousarray(P[:, : ctx.n_params], dtype=float),) + ctx.lnpost_args
+            if use_parallel(len(P)):
+                return call_parallel(star_lnposts_parallel, *args)
+            return star_lnposts(*args)
+
+        lnpost = self.lnprior_batch(P)
+        ok = np.isfinite(lnpost)
+        lnpost[~ok] = -np.inf
+        if ok.any():
+            lnpost[ok] += self.lnlike_batch(P[ok])
+        return lnpost
+
     def lnprior(self, pars):
         lnp = 0
-        if self.N == 2:
-            if pars[1] > pars[0]:
+        # Stars in decreasing order of EEP
+        for i in range(1, self.N):
+            if pars[i] > pars[i - 1]:
                 return -np.inf
-        elif self.N == 3:
-            if not (pars[0] > pars[1]) and (pars[1] > pars[2]):
-                return -np.inf
-        for val, par in zip(pars, self.param_names):
-            if par in ["eep", "eep_0", "eep_1", "eep_2"]:
-                if self.ic.eep_replaces == "age":
-                    lnp += self._priors["eep"].lnpdf(
-                        val, mass=pars[self.mass_index], feh=pars[self.feh_index]
-                    )
-                elif self.ic.eep_replaces == "mass":
-                    lnp += self._priors["eep"].lnpdf(val, age=pars[self.age_index], feh=pars[self.feh_index])
-            else:
-                lnp += self._priors[par].lnpdf(val)
+        ctx = self.lnlike_context
+        for i, lnpdf in ctx.priors:
+            lnp += lnpdf(pars[i])
+
+        eep_kwargs = {par: pars[j] for par, j in ctx.eep_kwargs}
+        for i in ctx.eep_indices:
+            lnp += ctx.eep_lnpdf(pars[i], **eep_kwargs)
 
         return lnp
 
     def mnest_prior(self, cube, ndim, nparams):
-        for i, par in enumerate(self.param_names):
-            lo, hi = self.bounds(par)
-            cube[i] = (hi - lo) * cube[i] + lo
+        ctx = self.lnlike_context
+        n = ctx.n_params
+        cube = _mnest_cube(cube, ndim)
+        if isinstance(cube, np.ndarray):
+            cube[:n] = ctx.lower + ctx.width * cube[:n]
+        else:
+            for i in range(n):
+                cube[i] = ctx.width[i] * cube[i] + ctx.lower[i]
 
     def mnest_loglike(self, cube, ndim, nparams):
         """loglikelihood function for multinest
         """
-        return self.lnpost(cube)
+        return self.lnpost(_mnest_cube(cube, ndim))
 
     @property
     def derived_samples(self):
@@ -1662,52 +1993,23 @@ class BasicStarModel(StarModel):
 
         if self.N == 1:
             self._derived_samples = self.ic(*[df[c].values for c in self.param_names])
-        elif self.N == 2 or self.N == 3:
+        else:
             self._derived_samples = df.copy()
 
-            primary_params = ["eep_0", "age", "feh", "distance", "AV"]
-            primary_df = self.ic(*[df[c].values for c in primary_params])
-            column_map = {
-                c: "{}_0".format(c)
-                for c in primary_df.columns
-                if c not in ["eep", "eep_0", "age", "distance", "AV"]
-            }
-            primary_df = primary_df.rename(columns=column_map).drop(["age", "eep"], axis=1)
-
-            secondary_params = ["eep_1", "age", "feh", "distance", "AV"]
-            secondary_df = self.ic(*[df[c].values for c in secondary_params])
-            column_map = {
-                c: "{}_1".format(c)
-                for c in secondary_df.columns
-                if c not in ["eep", "eep_1", "age", "distance", "AV"]
-            }
-            secondary_df = secondary_df.rename(columns=column_map).drop(["age", "eep"], axis=1)
-
-            self._derived_samples = pd.concat([self._derived_samples, primary_df, secondary_df], axis=1)
-
-            if self.N == 2:
-                for b in self.bands:
-                    mag_0 = self._derived_samples[b + "_mag_0"]
-                    mag_1 = self._derived_samples[b + "_mag_1"]
-                    self._derived_samples[b + "_mag"] = addmags(mag_0, mag_1)
-
-        if self.N == 3:
-            tertiary_params = ["eep_2", "age", "feh", "distance", "AV"]
-            tertiary_df = self.ic(*[df[c].values for c in tertiary_params])
-            column_map = {
-                c: "{}_2".format(c)
-                for c in tertiary_df.columns
-                if c not in ["eep", "eep_2", "age", "distance", "AV"]
-            }
-            tertiary_df = tertiary_df.rename(columns=column_map).drop(["eep", "age"], axis=1)
-
-            self._derived_samples = pd.concat([self._derived_samples, tertiary_df], axis=1)
+            star_dfs = []
+            for i in range(self.N):
+                eep = "eep_{}".format(i)
+                star_df = self.ic(*[df[c].values for c in [eep, "age", "feh", "distance", "AV"]])
+                column_map = {
+                    c: "{}_{}".format(c, i) for c in star_df.columns if c not in ["eep", eep, "age", "distance", "AV"]
+                }
+                star_dfs.append(star_df.rename(columns=column_map).drop(["age", "eep"], axis=1))
+
+            self._derived_samples = pd.concat([self._derived_samples] + star_dfs, axis=1)
 
             for b in self.bands:
-                mag_0 = self._derived_samples[b + "_mag_0"]
-                mag_1 = self._derived_samples[b + "_mag_1"]
-                mag_2 = self._derived_samples[b + "_mag_2"]
-                self._derived_samples[b + "_mag"] = addmags(mag_0, mag_1, mag_2)
+                mags = [self._derived_samples["{}_mag_{}".format(b, i)] for i in range(self.N)]
+                self._derived_samples[b + "_mag"] = addmags(*mags)
 
         self._derived_samples["parallax"] = 1000.0 / df["distance"]
         self._derived_samples["distance"] = df["distance"]
@@ -1720,21 +2022,26 @@ class BasicStarModel(StarModel):
         pars = []
         columns = []
         for p in self.param_names:
-            if p != "eep":
+            if not _is_eep(p):
                 samples = self._priors[p].sample(n)
                 pars.append(samples)
                 columns.append(p)
         df = pd.DataFrame(np.array(pars).T, columns=columns)
 
         # Resample EEPs with proper weights
-        if self.ic.eep_replaces == "age":
-            df["eep"] = self._priors["eep"].sample(n, mass=df["mass"], feh=df["feh"])
-        else:
-            df["eep"] = self._priors["eep"].sample(n, age=df["age"], feh=df["feh"])
+        eeps = [p for p in self.param_names if _is_eep(p)]
+        for eep in eeps:
+            if self.ic.eep_replaces == "age":
+                df[eep] = self._priors["eep"].sample(n, mass=df["mass"], feh=df["feh"])
+            else:
+                df[eep] = self._priors["eep"].sample(n, age=df["age"], feh=df["feh"])
+        if len(eeps) > 1:
+            # Stars in decreasing order of EEP, as required by `lnprior`
+            df[eeps] = -np.sort(-df[eeps].values, axis=1)
 
         if require_valid:
             pars = df[list(self.param_names)].values
-            lnprob = np.array([self.lnpost(pars[i, :]) for i in range(len(pars))])
+            lnprob = self.lnpost_batch(pars)
             bad = np.logical_not(np.isfinite(lnprob))
             nbad = bad.sum()
             if nbad:
@@ -1756,40 +2063,11 @@ class BasicStarModel(StarModel):
     def physical_quantities(self):
         if self.N == 1:
             cols = ["mass", "radius", "age", "Teff", "logg", "feh", "distance", "AV"]
-        elif self.N == 2:
-            cols = [
-                "mass_0",
-                "radius_0",
-                "mass_1",
-                "radius_1",
-                "Teff_0",
-                "Teff_1",
-                "logg_0",
-                "logg_1",
-                "age",
-                "feh",
-                "distance",
-                "AV",
-            ]
-        elif self.N == 3:
-            cols = [
-                "mass_0",
-                "radius_0",
-                "mass_1",
-                "radius_1",
-                "mass_2",
-                "radius_2",
-                "Teff_0",
-                "Teff_1",
-                "Teff_2",
-                "logg_0",
-                "logg_1",
-                "logg_2",
-                "age",
-                "feh",
-                "distance",
-                "AV",
-            ]
+        else:
+            stars = range(self.N)
+            cols = [c for i in stars for c in ["mass_{}".format(i), "radius_{}".format(i)]]
+            cols += ["Teff_{}".format(i) for i in stars] + ["logg_{}".format(i) for i in stars]
+            cols += ["age", "feh", "distance", "AV"]
 
         return cols
 
@@ -1797,7 +2075,7 @@ class BasicStarModel(StarModel):
     def observed_quantities(self):
         if self.N == 1:
             cols = ["{}_mag".format(b) for b in self.bands] + self.props
-        elif self.N == 2 or self.N == 3:
+        else:
             cols = ["{}_mag".format(b) for b in self.bands]
             cols += [p if p in self.derived_samples.columns else "{}_0".format(p) for p in self.props]
 
@@ -2015,6 +2293,8 @@ class IsoTrackModel(BasicStarModel):
         self._iso = iso
         self._track = track
 
+        # lnlike combines both grids, which `star_lnpost` does not
+        kwargs["compiled_lnpost"] = False
         super().__init__(iso, **kwargs)
 
         self.set_prior(eep=EEP_prior(self.track, self._priors["age"], bounds=self.eep_bounds))
@@ -2042,14 +2322,16 @@ class IsoTrackModel(BasicStarModel):
         # mass, eep, feh, distance, AV
         track_pars = np.array([pars[1], pars[0], pars[3], pars[4], pars[5]], dtype=float)
 
-        spec_vals, spec_uncs = zip(*[prop for prop in self.spec_props])
+        spec_vals, spec_uncs = [np.array(x, dtype=float) for x in zip(*self.spec_props)]
         if self.bands:
-            mag_vals, mag_uncs = zip(*[self.kwargs[b] for b in self.bands])
-            i_mags = [self.ic.bc_grid.interp.column_index[b] for b in self.bands]
+            mag_vals, mag_uncs = [np.array(x, dtype=float) for x in zip(*[self.kwargs[b] for b in self.bands])]
+            i_mags = np.array([self.ic.bc_grid.interp.column_index[b] for b in self.bands], dtype=int)
         else:
             mag_vals, mag_uncs = np.array([], dtype=float), np.array([], dtype=float)
             i_mags = np.array([], dtype=int)
 
+        iso_interp = self.iso.get_subset_interp(self.lnlike_columns)
+        track_interp = self.track.get_subset_interp(self.lnlike_columns)
         iso_lnlike = star_lnlike(
             iso_pars,
             self.iso.param_index_order,
@@ -2058,14 +2340,13 @@ class IsoTrackModel(BasicStarModel):
             mag_vals,
             mag_uncs,
             i_mags,
-            self.iso.model_grid.interp.grid,
-            self.iso.model_grid.interp.column_index["Teff"],
-            self.iso.model_grid.interp.column_index["logg"],
-            self.iso.model_grid.interp.column_index["feh"],
-            self.iso.model_grid.interp.column_index["Mbol"],
-            *self.iso.model_grid.interp.index_columns,
-            self.iso.bc_grid.interp.grid,
-            *self.iso.bc_grid.interp.index_columns
+            iso_interp.column_index["Teff"],
+            iso_interp.column_index["logg"],
+            iso_interp.column_index["feh"],
+            iso_interp.column_index["Mbol"],
+            *iso_interp.layout,
+            *self.iso.bc_grid.interp.layout,
+            self.iso.bc_Rv,
         )
 
         track_lnlike = star_lnlike(
@@ -2076,14 +2357,13 @@ class IsoTrackModel(BasicStarModel):
             mag_vals,
             mag_uncs,
             i_mags,
-            self.track.model_grid.interp.grid,
-            self.track.model_grid.interp.column_index["Teff"],
-            self.track.model_grid.interp.column_index["logg"],
-            self.track.model_grid.interp.column_index["feh"],
-            self.track.model_grid.interp.column_index["Mbol"],
-            *self.track.model_grid.interp.index_columns,
-            self.track.bc_grid.interp.grid,
-            *self.track.bc_grid.interp.index_columns
+            track_interp.column_index["Teff"],
+            track_interp.column_index["logg"],
+            track_interp.column_index["feh"],
+            track_interp.column_index["Mbol"],
+            *track_interp.layout,
+            *self.track.bc_grid.interp.layout,
+            self.track.bc_Rv,
         )
 
         lnlike = iso_lnlike + track_lnlike
@@ -2093,6 +2373,9 @@ class IsoTrackModel(BasicStarModel):
 
         return lnlike
 
+    def lnlike_batch(self, P):
+        return np.array([self.lnlike(p) for p in P])
+
     def lnprior(self, pars):
         lnp = 0
         for val, par in zip(pars, self.param_names):
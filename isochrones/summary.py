@@ -28,14 +28,24 @@ def get_quantiles(
             raise
         return pd.DataFrame()
 
+    return sample_quantiles(mod.derived_samples, name, columns=columns, qs=qs)
+
+
+def sample_quantiles(
+    samples, name, columns=["eep", "mass", "radius", "age", "feh", "distance", "AV"], qs=[0.05, 0.16, 0.5, 0.84, 0.95]
+):
+    """Returns one-row DataFrame (index `name`) of quantiles of the sample columns matching `columns`
+
+    Quantile q of column c is in column "c_{100 q}", e.g. "mass_50" for the median mass.
+    """
     # Get actual column names
     true_cols = []
-    for c1 in mod.derived_samples.columns:
+    for c1 in samples.columns:
         for c2 in columns:
             if re.search(c2, c1):
                 true_cols.append(c1)
 
-    q_df = mod.derived_samples[true_cols].quantile(qs)
+    q_df = samples[true_cols].quantile(qs)
 
     df = pd.DataFrame(index=[name])
     for c in true_cols:
@@ -24,6 +24,29 @@ def test_closest_eep(n=10000):
     _check_closest_eep(mist, n=n)
 
 
+def test_iso_get_eep(bands="JHK"):
+    ic = MIST_Isochrone(bands)
+    masses = np.linspace(0.5, 1.5, 21)
+    eeps = ic.get_eep(masses, 9.5, -0.2)
+    accurate_eeps = ic.get_eep(masses, 9.5, -0.2, accurate=True)
+    assert np.allclose(eeps, accurate_eeps, atol=2)
+    assert ic.get_eep(1.0, 9.5, -0.2) == eeps[10]
+
+    pop = ic.generate(masses, 9.5, -0.2)
+    assert np.allclose(pop.initial_mass, masses, atol=0.01)
+    assert ic._track is None
+
+
+def test_eep_lattice():
+    mist = get_ichrone("mist", tracks=True)
+    stats = mist.eep_lattice_errors(1000, refine=True, seed=0)
+    assert stats["p50"] < 0.5
+    assert stats["exact_only"] < 0.01
+
+    eep = mist.get_eep(1.0, 9.6, 0.1, lattice=True, refine=True)
+    assert abs(eep - mist.get_eep(1.0, 9.6, 0.1, accurate=True)) < 1
+
+
 def test_spec(bands="JHK"):
     mist = get_ichrone("mist", bands=bands)
     _check_spec(mist)
@@ -75,6 +98,15 @@ def _check_closest_eep(ic, n=3000, resid_tol=0.02):
                 raise
             # print (('{:.4f} ' * 5).format(e, a, f, m, mist.initial_mass(e, a, f)))
 
+    # vectorized solver agrees with the minimization
+    batch_eeps = ic.get_eep(masses, ages, fehs, return_nan=True, resid_tol=resid_tol, accurate=True)
+    assert batch_eeps.shape == (n,)
+    for e, a, f, m in zip(batch_eeps, ages, fehs, masses):
+        if not np.isnan(e):
+            assert abs(ic.initial_mass(e, a, f) - m) < (resid_tol * 1.1)
+    found = np.isfinite(eeps)
+    assert np.isfinite(batch_eeps[found]).mean() > 0.99
+
     # make sure the minmass edge case works.
     for feh in ic.fehs[1:-1]:  # first and last feh of mist doesn't work.
         try:
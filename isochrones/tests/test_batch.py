@@ -0,0 +1,80 @@
+import os
+import time
+import tempfile
+
+import pytest
+
+from isochrones.batch import run_tasks, Ledger, DONE, RETRY, FAILED
+
+
+def _task(seconds, outcome="ok"):
+    time.sleep(seconds)
+    if outcome == "raise":
+        raise ValueError("failed on purpose")
+    elif outcome == "crash":
+        os._exit(1)
+
+
+def test_run_tasks():
+    filename = os.path.join(tempfile.mkdtemp(), "test.ledger")
+    tasks = [(("slow",), (30,)), (("raise",), (0, "raise")), (("crash",), (0, "crash"))]
+    tasks += [(("fast", str(i)), (0.1,)) for i in range(6)]
+
+    start = time.time()
+    counts = run_tasks(tasks, _task, processes=2, timeout=3, retries=1, ledger=filename)
+    # The slow task does not hold up the others
+    assert time.time() - start < 30
+    assert counts == {DONE: 6, RETRY: 0, FAILED: 3}
+
+    ledger = Ledger(filename)
+    assert ledger.status(("fast", "0")) == DONE
+    for key in ["slow", "raise", "crash"]:
+        assert ledger.status((key,)) == FAILED
+        assert ledger.attempts((key,)) == 2
+    with open(filename) as f:
+        lines = [line.split("\t") for line in f]
+    assert sum(line[1] == RETRY for line in lines) == 3
+    assert any("failed on purpose" in line[4] for line in lines)
+
+    # Reruns only run what is not done, or, with retry_failed, what is not done yet
+    n_lines = len(lines)
+    run_tasks(tasks, _task, processes=2, timeout=1, retries=0, ledger=filename)
+    assert len(open(filename).readlines()) == n_lines
+    run_tasks(tasks[1:], _task, processes=2, retries=0, ledger=filename, retry_failed=True)
+    assert len(open(filename).readlines()) == n_lines + 2
+    assert Ledger(filename).attempts(("raise",)) == 3
+
+
+MPI_SCRIPT = """
+from mpi4py import MPI
+from isochrones.batch import mpi_map
+
+results = []
+mpi_map(lambda x: (MPI.COMM_WORLD.Get_rank(), x ** 2), list(range(20)), results.append)
+if MPI.COMM_WORLD.Get_rank() == 0:
+    print(sorted(x for _, x in results), 0 in set(rank for rank, _ in results))
+"""
+
+
+def test_mpi_map():
+    import sys
+    import shutil
+    import subprocess
+
+    pytest.importorskip("mpi4py")
+    mpirun = shutil.which("mpirun")
+    if mpirun is None:
+        pytest.skip("No mpirun")
+
+    filename = os.path.join(tempfile.mkdtemp(), "mpi_map.py")
+    with open(filename, "w") as f:
+        f.write(MPI_SCRIPT)
+    # Allow running as root, and more ranks than cores, with OpenMPI
+    env = dict(os.environ, OMPI_ALLOW_RUN_AS_ROOT="1", OMPI_ALLOW_RUN_AS_ROOT_CONFIRM="1")
+    env["OMPI_MCA_rmaps_base_oversubscribe"] = "1"
+    env["PYTHONPATH"] = os.pathsep.join(sys.path)
+    output = subprocess.run(
+        [mpirun, "-n", "3", sys.executable, filename], stdout=subprocess.PIPE, env=env, universal_newlines=True
+    ).stdout
+    # All tasks were run, by the worker ranks only
+    assert output.strip().splitlines()[-1] == "{} False".format([x ** 2 for x in range(20)])
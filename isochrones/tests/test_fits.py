@@ -51,6 +51,37 @@ def test_starfit():
             os.remove(f)
 
 
+def test_fit_all():
+    import pandas as pd
+    from isochrones.catalog import StarCatalog, FitResults
+
+    df = pd.DataFrame(
+        dict(J_mag=[3.58, 5.1, 6.2], J_mag_unc=0.05, K_mag=[3.22, 4.6, 5.5], K_mag_unc=0.05),
+        index=["star{}".format(i) for i in range(3)],
+    )
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, "results.h5")
+    if mnest:
+        kwargs = dict(n_live_points=20, max_iter=100, verbose=False)
+    else:
+        kwargs = dict(nburn=20, niter=20, ninitial=10, model_kwargs=dict(use_emcee=True))
+
+    summary = StarCatalog(df.iloc[:2]).fit_all(filename, processes=2, **kwargs)
+    assert sorted(summary.index) == ["star0", "star1"]
+
+    # Finished stars are skipped
+    summary = StarCatalog(df).fit_all(filename, processes=1, **kwargs)
+    assert sorted(summary.index) == ["star0", "star1", "star2"]
+    with FitResults(filename) as results:
+        assert results.done == set(df.index)
+        assert len(results.samples("star2")) > 0
+        assert np.isclose(results.samples("star2")["mass"].median(), summary.loc["star2", "mass_50"])
+
+    # Empty catalog
+    summary = StarCatalog(df.iloc[:0]).fit_all(os.path.join(directory, "empty.h5"), processes=1, **kwargs)
+    assert len(summary) == 0
+
+
 ###############
 
 
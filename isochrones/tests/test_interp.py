@@ -4,7 +4,8 @@ import numpy as np
 import pandas as pd
 from scipy.interpolate import RegularGridInterpolator
 
-from isochrones.interp import DFInterpolator
+from isochrones.interp import DFInterpolator, searchsorted, find_index, uniform_steps, set_parallel, _parallel
+from isochrones.interp import CellCache, interp_eep, interp_eeps, grid_axes
 from isochrones.logger import getLogger
 
 
@@ -44,3 +45,299 @@ def test_interp():
     assert np.allclose(
         df_interp([pts[:, 0], pts[:, 1], pts[:, 2]], ["val"]).ravel(), interp(pts), atol=1e-11
     )
+
+
+def test_interp_nd():
+    rng = np.random.RandomState(42)
+    for ndim in [2, 4, 5]:
+        iis = [np.sort(rng.choice(np.arange(20.0), size=4 + i, replace=False)) for i in range(ndim)]
+        iis[0] = np.arange(5.0) * 0.5  # a uniform axis
+
+        shape = [len(ii) for ii in iis]
+        values = rng.normal(size=shape)
+        idx = pd.MultiIndex.from_product(iis, names=["x{}".format(i) for i in range(ndim)])
+        df = pd.DataFrame({"val": values.ravel()}, index=idx)
+
+        df_interp = DFInterpolator(df)
+        scipy_interp = RegularGridInterpolator(iis, values)
+
+        pts = np.array([rng.uniform(ii[0], ii[-1], size=20) for ii in iis])
+        pts[:, 0] = [ii[-1] for ii in iis]  # upper edge of grid
+        assert np.allclose(df_interp(list(pts), ["val"]).ravel(), scipy_interp(pts.T), atol=1e-11)
+        assert np.isclose(df_interp([float(x) for x in pts[:, 1]], ["val"])[0], scipy_interp(pts[:, 1]))
+
+        pts[0, 2] = iis[0][-1] + 1
+        assert np.isnan(df_interp(list(pts), ["val"])[2, 0])
+
+
+def test_interp_parallel():
+    rng = np.random.RandomState(42)
+    iis = [np.arange(5.0), np.sort(rng.uniform(0, 10, size=7)), np.arange(0, 2, 0.25)]
+    idx = pd.MultiIndex.from_product(iis, names=["x", "y", "z"])
+    df = pd.DataFrame(rng.normal(size=(len(idx), 3)), index=idx, columns=["a", "b", "c"])
+    df_interp = DFInterpolator(df)
+
+    pts = [rng.uniform(ii[0] - 0.1, ii[-1], size=1000) for ii in iis]
+    serial = df_interp(pts)
+
+    settings = dict(_parallel)
+    try:
+        set_parallel(threshold=100, num_threads=2)
+        assert np.allclose(df_interp(pts), serial, equal_nan=True)
+    finally:
+        _parallel.update(settings)
+
+
+def test_find_index():
+    eeps = np.arange(1, 1711, dtype=float)
+    loggs = np.arange(-4, 9.5, 0.5)
+    ages = np.log10(np.logspace(5, 10.3, 107)) ** 2
+    steps = uniform_steps([eeps, loggs, ages])
+    assert steps[0] == 1.0
+    assert steps[1] == 0.5
+    assert steps[2] == 0
+
+    for ii, step in zip([eeps, loggs, ages], steps):
+        xs = np.concatenate([ii, np.random.uniform(ii[0], ii[-1], size=1000)])
+        for x in xs:
+            assert find_index(ii, x, step) == searchsorted(ii, x)
+
+
+def test_interp_metadata(tmpdir):
+    xx, yy, zz = [np.arange(5.0) * n for n in [1, 10, 100]]
+    df = pd.DataFrame(
+        [(x, y, z, x + y * z, x - z) for x, y, z in itertools.product(xx, yy, zz) if x + y < 40],
+        columns=["x", "y", "z", "a", "b"],
+    ).set_index(["x", "y", "z"])
+
+    filename = str(tmpdir.join("grid.npz"))
+    df_interp = DFInterpolator(df, filename=filename)
+    assert DFInterpolator.has_metadata(filename)
+
+    interp = DFInterpolator(filename=filename)
+    assert interp.columns == df_interp.columns
+    assert list(interp.index_names) == list(df_interp.index_names)
+    for ii1, ii2 in zip(interp.index_columns, df_interp.index_columns):
+        assert np.all(ii1 == ii2)
+    for col in ["a", "b", "x"]:
+        assert interp.get_limits(col) == df_interp.get_limits(col)
+    assert interp.get_limits("a") == (df.a.min(), df.a.max())
+
+    pars = [1.5, 12.0, 230.0]
+    assert np.all(interp(pars) == df_interp(pars))
+
+    mm_interp = DFInterpolator(filename=filename, mmap_mode="r")
+    assert isinstance(mm_interp.grid, np.memmap)
+    assert np.all(mm_interp(pars) == df_interp(pars))
+    pts = [np.array([1.5, 2.5]), np.array([12.0, 3.0]), np.array([230.0, 10.0])]
+    assert np.allclose(mm_interp(pts), df_interp(pts), equal_nan=True)
+
+
+def test_interp_subset(tmpdir):
+    xx, yy, zz = [np.arange(5.0) * n for n in [1, 10, 100]]
+    df = pd.DataFrame(
+        [(x, y, z, x + y * z, x - z, y * x) for x, y, z in itertools.product(xx, yy, zz)],
+        columns=["x", "y", "z", "a", "b", "c"],
+    ).set_index(["x", "y", "z"])
+    df_interp = DFInterpolator(df)
+
+    filename = str(tmpdir.join("grid_c-a.npz"))
+    subset = df_interp.subset(["c", "a"], filename=filename)
+    assert subset.grid.shape == df_interp.grid.shape[:-1] + (2,)
+    assert subset.grid.flags["C_CONTIGUOUS"]
+
+    pars = [1.5, 12.0, 230.0]
+    assert np.all(subset(pars, ["a", "c"]) == df_interp(pars, ["a", "c"]))
+    assert np.all(DFInterpolator(filename=filename)(pars) == df_interp(pars, ["c", "a"]))
+
+
+def test_cell_cache():
+    rng = np.random.RandomState(0)
+    iis = [np.sort(rng.uniform(0, 10, size=30)), np.arange(5.0), np.sort(rng.uniform(0, 1, size=20))]
+    idx = pd.MultiIndex.from_product(iis, names=["x", "y", "z"])
+    df = pd.DataFrame(rng.normal(size=(len(idx), 2)), index=idx, columns=["a", "b"])
+    df_interp = DFInterpolator(df)
+
+    # Random walk, which sometimes jumps several cells, and steps off the grid
+    cache = CellCache(3)
+    lo, hi = [ii[0] for ii in iis], [ii[-1] for ii in iis]
+    x = np.array([5.0, 2.0, 0.5])
+    for i in range(1000):
+        x = np.clip(x + rng.normal(scale=[0.1, 0.05, 0.01]), lo, hi)
+        if i % 100 == 0:
+            x[0] = rng.uniform(lo[0], hi[0])
+        if i % 250 == 0:
+            x[2] = hi[2] + 1
+        p = [float(v) for v in x]
+        assert np.array_equal(df_interp(p, cache=cache), df_interp(p), equal_nan=True)
+        if i % 250 == 0:
+            x[2] = hi[2]
+
+    stats = cache.stats()
+    assert stats["hits"] > stats["neighbour_hits"] > stats["misses"] > 10
+    assert stats["hits"] + stats["neighbour_hits"] + stats["misses"] == 1000 - 4
+    cache.reset()
+    assert cache.misses == 0 and np.isnan(cache.hit_rate)
+
+
+def test_interp_grad():
+    rng = np.random.RandomState(1)
+    iis = [np.sort(rng.uniform(0, 10, size=8)), np.arange(5.0), np.sort(rng.uniform(0, 1, size=6))]
+    idx = pd.MultiIndex.from_product(iis, names=["x", "y", "z"])
+    df = pd.DataFrame(rng.normal(size=(len(idx), 2)), index=idx, columns=["a", "b"])
+    df_interp = DFInterpolator(df)
+
+    eps = 1e-7
+    for p in [[rng.uniform(ii[0], ii[-1]) for ii in iis] for _ in range(20)]:
+        values, grad = df_interp.value_and_grad(p)
+        assert np.allclose(values, df_interp(p))
+        for k in range(3):
+            dp = np.eye(3)[k] * eps
+            numerical = (df_interp(list(p + dp)) - df_interp(list(p - dp))) / (2 * eps)
+            assert np.allclose(grad[:, k], numerical, atol=1e-6)
+
+    # Upper edge: derivative of the cell below
+    values, grad = df_interp.value_and_grad([iis[0][-1], 4.0, 0.5])
+    assert np.allclose(values, df_interp([iis[0][-1], 4.0, 0.5]))
+    numerical = (df_interp([iis[0][-1], 4.0, 0.5]) - df_interp([iis[0][-1] - eps, 4.0, 0.5])) / eps
+    assert np.allclose(grad[:, 0], numerical, atol=1e-6)
+    assert np.isnan(df_interp.value_and_grad([11.0, 2.0, 0.5])[1]).all()
+
+
+def test_interp_inverse():
+    # Isochrone-like grid: mass increasing along eep, up to an age-dependent maximum eep
+    rng = np.random.RandomState(2)
+    ages, fehs, eeps = np.sort(rng.uniform(8, 10, size=12)), np.array([-1.0, -0.5, 0.0, 0.3]), np.arange(1.0, 101)
+    rows = []
+    for age, feh in itertools.product(ages, fehs):
+        for eep in eeps[: 100 - int(20 * (age - 8))]:
+            rows.append((age, feh, eep, 0.1 + eep * (0.02 + 0.001 * eep) / age ** 2 + 0.1 * feh, rng.normal()))
+    df = pd.DataFrame(rows, columns=["age", "feh", "eep", "initial_mass", "x"]).set_index(["age", "feh", "eep"])
+    df_interp = DFInterpolator(df)
+
+    n = 10000
+    age, feh = rng.uniform(8, 10, size=n), rng.uniform(-1, 0.3, size=n)
+    mass = rng.uniform(0.0, 0.3, size=n)
+    eep = df_interp.invert(mass, [age, feh], "initial_mass")
+
+    found = np.isfinite(eep)
+    assert 0.2 < found.mean() < 0.9
+    assert np.allclose(df_interp([age[found], feh[found], eep[found]], ["initial_mass"]).ravel(), mass[found])
+
+    # No solution: mass out of range along the (defined part of the) isochrone
+    assert np.isnan(df_interp.invert(10.0, [9.0, 0.0], "initial_mass"))
+    assert np.isnan(df_interp.invert(0.01, [9.0, 0.0], "initial_mass"))
+
+    # ... unless within tol of the column at the end of the search range
+    m_min = df.loc[(ages[-1], 0.0, 1.0), "initial_mass"]
+    assert np.isnan(df_interp.invert(m_min - 0.01, [ages[-1], 0.0], "initial_mass", tol=0.005))
+    assert df_interp.invert(m_min - 0.01, [ages[-1], 0.0], "initial_mass", tol=0.02) == 1.0
+    m_50 = df.loc[(ages[-1], 0.0, 50.0), "initial_mass"]
+    assert np.isnan(df_interp.invert(m_50 + 0.01, [ages[-1], 0.0], "initial_mass", lo=10, hi=50))
+    assert df_interp.invert(m_50 + 0.01, [ages[-1], 0.0], "initial_mass", lo=10, hi=50, tol=0.02) == 50.0
+
+    # Scalar call and restricted range
+    e = df_interp.invert(float(mass[found][0]), [float(age[found][0]), float(feh[found][0])], "initial_mass")
+    assert np.isclose(e, eep[found][0])
+    assert np.isnan(df_interp.find_closest(float(mass[found][0]), 1.0, e - 1, age[found][0], feh[found][0]))
+    assert np.isclose(df_interp.find_closest(float(mass[found][0]), e - 1, e + 1, age[found][0], feh[found][0]), e)
+    assert np.isclose(
+        df_interp.find_closest(float(mass[found][0]), e - 1, e + 1, age[found][0], feh[found][0], debug=True), e
+    )
+
+
+def test_interp_eep():
+    # Isochrone-like arrays of initial mass along eep, starting at an age-dependent eep
+    ages, fehs = np.arange(8.0, 10.01, 0.5), np.array([-1.0, -0.5, 0.0, 0.3])
+    n_eep = 100
+    arrays = np.full((len(ages) * len(fehs), n_eep), np.nan)
+    lengths = np.zeros(len(arrays), dtype=int)
+    first_eeps = np.ones(len(arrays))
+    for i, (age, feh) in enumerate(itertools.product(ages, fehs)):
+        first = 1 + int(10 * (age - 8))
+        eeps = np.arange(first, n_eep + 1 - int(20 * (age - 8)), dtype=float)
+        arrays[i, : len(eeps)] = 0.1 + eeps * (0.02 + 0.001 * eeps) / age ** 2 + 0.1 * feh
+        lengths[i], first_eeps[i] = len(eeps), first
+    args = grid_axes([ages, fehs]) + (arrays, arrays, lengths, first_eeps, uniform_steps([ages, fehs]))
+
+    # Exact at grid nodes
+    i, k = 6, 30
+    age, feh = ages[i // len(fehs)], fehs[i % len(fehs)]
+    assert interp_eep(arrays[i, k], age, feh, *args) == first_eeps[i] + k
+
+    # Close to the eep of interpolated mass in between (to within the resolution of the arrays)
+    masses = np.linspace(0.107, 0.119, 20)
+    eeps = interp_eeps(masses, np.full(20, 9.2), np.full(20, -0.2), *args)
+    corner_eeps = [
+        [np.interp(masses, arrays[j, : lengths[j]], np.arange(lengths[j]) + first_eeps[j]) for j in (k, k + 1)]
+        for k in (2 * len(fehs) + 1, 3 * len(fehs) + 1)
+    ]
+    d_age, d_feh = (9.2 - 9.0) / 0.5, (-0.2 + 0.5) / 0.5
+    expected = (1 - d_age) * ((1 - d_feh) * corner_eeps[0][0] + d_feh * corner_eeps[0][1]) + d_age * (
+        (1 - d_feh) * corner_eeps[1][0] + d_feh * corner_eeps[1][1]
+    )
+    assert np.allclose(eeps, expected, atol=1)
+    assert (np.diff(eeps) >= 0).all() and eeps[-1] > eeps[0] + 5
+    assert np.isnan(interp_eep(np.nan, 9.2, -0.2, *args))
+    assert np.isnan(interp_eep(0.3, 11.0, -0.2, *args))
+
+
+def test_interp_float32(tmpdir):
+    rng = np.random.RandomState(0)
+    iis = [np.arange(5.0), np.sort(rng.uniform(0, 10, size=7)), np.arange(0, 2, 0.25)]
+    idx = pd.MultiIndex.from_product(iis, names=["x", "y", "z"])
+    df = pd.DataFrame(rng.normal(size=(len(idx), 3)) * 1000, index=idx, columns=["a", "b", "c"])
+
+    filename = str(tmpdir.join("grid.npz"))
+    interp64 = DFInterpolator(df, filename=filename)
+    interp32 = DFInterpolator(filename=filename, dtype="float32")
+    assert interp32.grid.dtype == np.float32
+    assert tmpdir.join("grid_float32.npy").exists()
+
+    pts = [rng.uniform(ii[0], ii[-1], size=100) for ii in iis]
+    values = interp32(pts)
+    assert values.dtype == np.float64
+    assert np.allclose(values, interp64(pts), rtol=1e-6, atol=1e-4)
+
+    # The float64 copy of a subset of a float32 grid is still exact
+    subset = interp32.subset(["c", "a"], filename=str(tmpdir.join("grid_c-a.npz")))
+    assert subset.grid.dtype == np.float32
+    subset64 = DFInterpolator(filename=subset.filename)
+    assert np.all(subset64(pts) == interp64(pts, ["c", "a"]))
+
+
+def test_interp_ragged(tmpdir):
+    # Tracks of varying length: (feh, mass, eep), EEPs running from a mass-dependent start to end
+    rng = np.random.RandomState(0)
+    fehs, masses, eeps = np.arange(-1, 0.6, 0.5), np.arange(0.5, 3.0, 0.25), np.arange(1.0, 51)
+    rows = []
+    for feh, mass in itertools.product(fehs, masses):
+        first = 1 + 5 * (mass > 2)
+        last = 50 - int(10 * mass) + rng.randint(3)
+        for eep in eeps[first - 1 : last]:
+            rows.append((feh, mass, eep, feh + mass * eep, mass * np.log(eep)))
+    df = pd.DataFrame(rows, columns=["feh", "mass", "eep", "a", "b"]).set_index(["feh", "mass", "eep"])
+
+    filename = str(tmpdir.join("tracks.npz"))
+    dense = DFInterpolator(df, filename=filename)
+    ragged = DFInterpolator(filename=filename, ragged=True, mmap_mode="r")
+    assert ragged.shape == dense.grid.shape
+    assert ragged.grid.shape == (len(df), 2)
+    assert np.array_equal(ragged.dense_grid, dense.grid, equal_nan=True)
+
+    pts = [rng.uniform(ii[0], ii[-1], size=2000) for ii in dense.index_columns]
+    pts[2][:100] = np.round(pts[2][:100])  # on grid points, next to missing ones
+    assert np.array_equal(ragged(pts), dense(pts), equal_nan=True)
+    assert np.isnan(dense(pts)).any() and not np.isnan(dense(pts)).all()
+
+    subset = ragged.subset(["b"], filename=str(tmpdir.join("tracks_b.npz")))
+    assert np.array_equal(subset(pts), dense(pts, ["b"]), equal_nan=True)
+    assert np.array_equal(subset(pts), DFInterpolator(filename=subset.filename)(pts), equal_nan=True)
+
+
+def test_warmup():
+    from isochrones import warmup
+
+    timings = warmup(verbose=False)
+    for name in ["interp_value_nd", "interp_mag", "star_lnlike", "calc_lnlike_grid"]:
+        assert name in timings
@@ -55,3 +55,153 @@ def test_compare_spec():
 
 def test_compare_phot():
     test_compare_starmodels(props_phot)
+
+
+def test_lnlike_grad(props=props):
+    for N, pars in [(1, [300, 9.8, 0.01, 100, 0.1]), (2, [300, 280, 9.8, 0.01, 100, 0.1])]:
+        mod = BasicStarModel(mist, **props, N=N)
+        lnlike, grad = mod.lnlike_and_grad(pars)
+        assert np.isclose(lnlike, mod.lnlike(pars))
+
+        pars = np.array(pars, dtype=float)
+        for i in range(len(pars)):
+            eps = 1e-6 * max(abs(pars[i]), 1)
+            dp = np.zeros(len(pars))
+            dp[i] = eps
+            numerical = (mod.lnlike(pars + dp) - mod.lnlike(pars - dp)) / (2 * eps)
+            assert np.isclose(grad[i], numerical, rtol=1e-4, atol=1e-4)
+
+
+def test_lnpost_batch(props=props):
+    for N in [1, 2, 3]:
+        mod = BasicStarModel(mist, **props, N=N)
+        P = mod.sample_from_prior(20, values=True)
+        P[0, N] = 20.0  # out of age bounds
+        lnpost = mod.lnpost_batch(P)
+        assert lnpost.shape == (20,)
+        assert lnpost[0] == -np.inf
+        assert np.allclose(lnpost, [mod.lnpost(p) for p in P], equal_nan=True)
+        assert np.allclose(mod.lnlike_batch(P[1:]), [mod.lnlike(p) for p in P[1:]], equal_nan=True)
+
+
+def test_lnlike_context(props=props):
+    import pickle
+    from isochrones.priors import DistancePrior
+
+    mod = BasicStarModel(mist, **props, N=2)
+    pars = [300, 280, 9.8, 0.01, 100, 0.1]
+    lnlike, lnprior = mod.lnlike(pars), mod.lnprior(pars)
+    assert mod._lnlike_context is not None
+
+    mod.reset_lnlike_context()
+    assert mod._lnlike_context is None
+    assert mod.lnlike(pars) == lnlike
+    assert mod.lnprior(pars) == lnprior
+
+    # Changing a prior rebuilds the context
+    mod.set_prior(distance=DistancePrior(1000))
+    assert mod._lnlike_context is None
+    assert mod.lnprior(pars) != lnprior
+
+    cube = np.full(mod.n_params, 0.5)
+    mod.mnest_prior(cube, mod.n_params, mod.n_params)
+    assert np.allclose(cube, [np.mean(mod.bounds(p)) for p in mod.param_names])
+
+    mod2 = pickle.loads(pickle.dumps(mod))
+    assert mod2._lnlike_context is None
+    assert np.isclose(mod2.lnpost(pars), mod.lnpost(pars))
+
+
+def test_compiled_lnpost(props=props):
+    for N in [1, 2, 3]:
+        mod = BasicStarModel(mist, **props, N=N)
+        P = mod.sample_from_prior(20, values=True)
+        P[0, N] = 20.0  # out of age bounds
+        lnpost = [mod.lnpost(p) for p in P]
+
+        mod.compiled_lnpost = True
+        assert np.allclose([mod.lnpost(p) for p in P], lnpost)
+        assert mod.lnpost(P[0]) == -np.inf
+
+
+def test_eep_order(props=props):
+    for N in [2, 3, 4]:
+        mod = BasicStarModel(mist, **props, N=N)
+        pars = mod.sample_from_prior(1, values=True)[0]
+        assert np.isfinite(mod.lnpost(pars))
+        for i in range(1, N):
+            unsorted = pars.copy()
+            unsorted[i - 1], unsorted[i] = pars[i], pars[i - 1]
+            assert mod.lnprior(unsorted) == -np.inf
+            assert mod.lnpost(unsorted) == -np.inf
+            mod.compiled_lnpost = True
+            assert mod.lnpost(unsorted) == -np.inf
+            mod.compiled_lnpost = False
+
+
+def test_asteroseismology(props=props):
+    from isochrones.likelihood import gauss_lnprob
+
+    mod = BasicStarModel(mist, **props, nu_max=(3090, 30), delta_nu=(135.1, 0.5))
+    P = mod.sample_from_prior(10, values=True)
+    pars = P[0]
+    model_nu_max, model_delta_nu = mist.interp_value(pars, ["nu_max", "delta_nu"])
+    astero = gauss_lnprob(3090, 30, model_nu_max) + gauss_lnprob(135.1, 0.5, model_delta_nu)
+    no_astero = BasicStarModel(mist, **props)
+    assert np.isclose(mod.lnlike(pars), no_astero.lnlike(pars) + astero)
+
+    lnpost = [mod.lnpost(p) for p in P]
+    assert np.allclose(mod.lnpost_batch(P), lnpost)
+    mod.compiled_lnpost = True
+    assert np.allclose([mod.lnpost(p) for p in P], lnpost)
+
+
+def test_multiple_stars(props=props):
+    from isochrones.utils import addmags
+    from isochrones.likelihood import gauss_lnprob
+
+    for N in [4, 5]:
+        mod = BasicStarModel(mist, **props, N=N)
+        assert mod.param_names == tuple("eep_{}".format(i) for i in range(N)) + ("age", "feh", "distance", "AV")
+
+        P = mod.sample_from_prior(10, values=True)
+        assert (np.diff(P[:, :N], axis=1) <= 0).all()
+        lnpost = mod.lnpost_batch(P)
+        assert np.isfinite(lnpost).all()
+        assert np.allclose(lnpost, [mod.lnpost(p) for p in P])
+
+        # Unresolved magnitudes are the flux sum of the components
+        pars = P[0]
+        mags = [mist.interp_mag([pars[i]] + list(pars[N:]), ["J", "K"])[3] for i in range(N)]
+        J, K = addmags(*mags)
+        Teff, logg = mist.interp_mag([pars[0]] + list(pars[N:]), ["J", "K"])[:2]
+        lnlike = 0
+        for (val, unc), model in zip([props["Teff"], props["logg"], props["J"], props["K"]], [Teff, logg, J, K]):
+            lnlike += gauss_lnprob(val, unc, model)
+        lnlike += gauss_lnprob(*props["parallax"], 1000 / pars[N + 2])
+        assert np.isclose(mod.lnlike(pars), lnlike)
+
+        mod.compiled_lnpost = True
+        assert np.allclose([mod.lnpost(p) for p in P], lnpost)
+
+
+def test_tree_lnlike():
+    import os
+
+    folder = os.path.join(os.path.dirname(__file__), "star3")
+    for mod in [StarModel(mist, **props, N=2), StarModel.from_ini(mist, folder=folder, index=[0, 0, 1])]:
+        P = mod.sample_from_prior(20)
+        for p in P:
+            pardict = mod.obs.p2pardict(p)
+            model_values = {}
+            for star, pars in pardict.items():
+                Teff, logg, feh, mags = mist.interp_mag(pars, mod.bands)
+                model_values[star] = dict(Teff=Teff, logg=logg, feh=feh, **dict(zip(mod.bands, mags)))
+            lnlike = mod.obs.lnlike(pardict, model_values)
+            assert np.isclose(mod.lnlike(p), lnlike) or mod.lnlike(p) == lnlike
+
+        # Flattened tree is cached until the tree changes
+        flat = mod.obs.flatten(mod.bands)
+        assert mod.obs.flatten(mod.bands) is flat
+        mod.obs.add_spectroscopy(feh=(0.0, 0.1))
+        assert mod.obs.flatten(mod.bands) is not flat
@@ -0,0 +1,61 @@
+import numpy as np
+
+from isochrones.observation import ObservationTree, Observation, ObsNode, Source
+
+
+def crowded_observations(n_sources=50, seed=0):
+    """Observations from low to high resolution, of a field of stars within 5 arcsec
+    """
+    rng = np.random.RandomState(seed)
+    separation = np.concatenate([[0], rng.uniform(0, 5, n_sources - 1)])
+    pa = np.concatenate([[0], rng.uniform(0, 360, n_sources - 1)])
+    mag = np.concatenate([[10], rng.uniform(11, 18, n_sources - 1)])
+
+    observations = [Observation("2MASS", "J", 4.0, sources=[Source(10, 0.02)])]
+    observations.append(Observation("2MASS", "K", 4.0, sources=[Source(9.5, 0.02)]))
+    for name, band, resolution, n in [("Seeing", "J", 1.0, 10), ("AO", "K", 0.1, None), ("AO", "J", 0.1, None)]:
+        sources = [
+            Source(m - mag[0], 0.05, separation=sep, pa=p, relative=True)
+            for sep, p, m in zip(separation[:n], pa[:n], mag[:n])
+        ]
+        observations.append(Observation(name, band, resolution, sources=sources, relative=True))
+    return observations
+
+
+def scan_tree(tree):
+    """Rebuilds the tree finding each parent with `_find_closest`, as `_build_tree` did before the index
+    """
+    tree._clear_all_leaves()
+    tree.children = []
+    for i, o in enumerate(tree._observations):
+        ref_node = ObsNode(o, o.brightest)
+        for s in o.sources:
+            if s.relative and not s.is_reference:
+                node = ObsNode(o, s, ref_node=ref_node)
+            elif s.relative and s.is_reference:
+                node = ref_node
+            else:
+                node = ObsNode(o, s)
+            parent = tree if i == 0 else tree._find_closest(node)
+            parent.add_child(node)
+    return tree
+
+
+def parents(tree):
+    return [(n.source, getattr(n.parent, "source", None)) for n in tree.get_obs_nodes()]
+
+
+def test_build_tree():
+    for n_sources in [3, 8, 100]:
+        tree = ObservationTree(crowded_observations(n_sources))
+        tree_parents = parents(tree)
+        assert tree_parents == parents(scan_tree(tree))
+        if n_sources == 3:
+            # The unresolved reference source descends from each previous observation in turn
+            assert [n.instrument for n in tree.get_obs_nodes() if n.source.separation == 0][::-1] == [
+                "2MASS",
+                "2MASS",
+                "Seeing",
+                "AO",
+                "AO",
+            ]
@@ -57,3 +57,22 @@ def test_chabrier():
     chabrier_prior = ChabrierPrior()
     chabrier_prior.test_integral()
     chabrier_prior.test_sampling()
+
+
+def test_compiled_lnpdf():
+    import numpy as np
+    from isochrones.priors import AgePrior, DistancePrior, AVPrior, FehPrior, ChabrierPrior, GaussianPrior
+    from isochrones.priors import prior_lnpdf
+
+    feh_prior = FehPrior()
+    feh_prior.bounds = (-3, 0.25)
+    chabrier_prior = ChabrierPrior()
+    chabrier_prior.bounds = (0.1, 20)
+    priors = [AgePrior(), DistancePrior(), AVPrior(), feh_prior, chabrier_prior, GaussianPrior(0.1, 0.3, bounds=(-1, 1))]
+
+    x = np.concatenate([np.linspace(-4, 12, 321), np.linspace(0, 30, 301)])
+    for prior in priors:
+        params = prior.lnpdf_params()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            expected = [prior.lnpdf(v) for v in x]
+        assert np.allclose([prior_lnpdf(params, v) for v in x], expected, equal_nan=True)
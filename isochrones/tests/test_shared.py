@@ -0,0 +1,50 @@
+import itertools
+import pickle
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from isochrones.interp import DFInterpolator
+from isochrones.shared import SharedGridRegistry, SharedArray
+
+
+def _make_interp():
+    xx, yy, zz = [np.arange(6.0) * n for n in [1, 10, 100]]
+    df = pd.DataFrame(
+        [(x, y, z, x * y + z, x - z) for x, y, z in itertools.product(xx, yy, zz)],
+        columns=["x", "y", "z", "a", "b"],
+    ).set_index(["x", "y", "z"])
+    return DFInterpolator(df)
+
+
+def _call(args):
+    interp, pars = args
+    return interp.grid.base is not None, interp(pars)
+
+
+def test_shared_grid():
+    interp = _make_interp()
+    pars = [1.5, 12.0, 230.0]
+    expected = interp(pars)
+
+    with SharedGridRegistry() as registry:
+        registry.share_array(interp, "grid")
+        assert len(registry) == 1
+        assert interp.is_shared
+
+        state = pickle.dumps(interp)
+        assert len(state) < interp.grid.nbytes
+        assert isinstance(interp.__getstate__()["grid"], SharedArray)
+
+        attached = pickle.loads(state)
+        assert np.all(attached(pars) == expected)
+
+        # Forking after numba has started its parallel threads may hang, so spawn.
+        with multiprocessing.get_context("spawn").Pool(2) as pool:
+            for is_view, values in pool.map(_call, [(interp, pars)] * 4):
+                assert is_view
+                assert np.all(values == expected)
+
+    assert not interp.is_shared
+    assert np.all(interp(pars) == expected)
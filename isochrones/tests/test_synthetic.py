@@ -0,0 +1,267 @@
+import numpy as np
+import pandas as pd
+
+from isochrones.models import StellarModelGrid, IsochroneInterpolator
+from isochrones.bc import BolometricCorrectionGrid
+from isochrones.starmodel import BasicStarModel
+
+
+class ToyIsochroneGrid(StellarModelGrid):
+    """Small isochrone grid of smooth functions of (age, feh, eep), for tests that don't need MIST
+    """
+
+    name = "toy"
+    eep_col = "eep"
+    index_cols = ("age", "feh", "eep")
+    ages = np.arange(8.0, 10.01, 0.25)
+    fehs = np.array([-1.0, -0.5, 0.0, 0.3])
+    eeps = np.arange(1.0, 401.0)
+
+    @property
+    def df(self):
+        if self._df is None:
+            self._df = self.get_df()
+        return self._df
+
+    @property
+    def interp_grid_npz_filename(self):
+        return None
+
+    def get_df(self, orig=False):
+        age, feh, eep = [a.ravel() for a in np.meshgrid(self.ages, self.fehs, self.eeps, indexing="ij")]
+        x = eep / 400
+        scale = 3.0 * 10 ** (-0.3 * (age - 8) + 0.05 * feh)
+        Teff = 3000 + 4000 * x - 300 * feh + 100 * (age - 9) + 500 * np.sin(3 * x)
+        logg = 5.0 - 1.5 * x ** 1.2 - 0.1 * (age - 8)
+        df = pd.DataFrame(
+            dict(
+                age=age,
+                feh=feh,
+                eep=eep,
+                mass=0.98 * (0.1 + scale * x ** 2),
+                initial_mass=0.1 + scale * x ** 2,
+                Teff=Teff,
+                logg=logg,
+                Mbol=10 - 8 * x + 0.2 * feh + np.cos(5 * x),
+                dm_deep=2 * scale * x / 400,
+                nu_max=3090 * 10 ** (logg - 4.44) * (Teff / 5777) ** -0.5,
+                delta_nu=135 * (1.5 - x) ** 2 * (1 + 0.1 * feh),
+            )
+        )
+        df["feh"] = feh - 0.05 * (age - 8)
+        df.index = pd.MultiIndex.from_arrays([age, feh, eep], names=self.index_cols)
+        return df
+
+
+class ToyBolometricCorrectionGrid(BolometricCorrectionGrid):
+    """Bolometric corrections in J, H, and K as smooth functions of (Teff, logg, [Fe/H], Av)
+    """
+
+    name = "toy"
+    index_cols = ("Teff", "logg", "[Fe/H]", "Av")
+    default_bands = ("J", "H", "K")
+
+    @property
+    def interp_grid_npz_filename(self):
+        return None
+
+    def get_df(self):
+        axes = [
+            np.arange(2000.0, 9001, 250),
+            np.arange(0.0, 6.1, 0.5),
+            np.arange(-2.0, 0.6, 0.25),
+            np.arange(0, 2.1, 0.25),
+        ]
+        Teff, logg, feh, Av = [a.ravel() for a in np.meshgrid(*axes, indexing="ij")]
+        t = (Teff - 5000) / 1000
+        coeffs = dict(J=(1.0, 0.28), H=(1.3, 0.18), K=(1.5, 0.11))
+        df = pd.DataFrame(
+            {
+                b: a * t - 0.2 * t ** 2 + 0.05 * logg - 0.1 * feh * (1 + 0.1 * t) - k * Av
+                for b, (a, k) in coeffs.items()
+                if b in self.bands
+            }
+        )
+        df.index = pd.MultiIndex.from_arrays([Teff, logg, feh, Av], names=self.index_cols)
+        return df
+
+
+class ToyIsochrone(IsochroneInterpolator):
+    grid_type = ToyIsochroneGrid
+    bc_type = ToyBolometricCorrectionGrid
+    eep_bounds = (1, 400)
+
+
+toy = ToyIsochrone()
+
+props = dict(
+    Teff=(4950, 100),
+    logg=(4.4, 0.1),
+    feh=(0.0, 0.1),
+    J=(11.55, 0.05),
+    H=(11.5, 0.05),
+    K=(11.45, 0.05),
+    parallax=(10, 0.5),
+)
+
+
+def test_lnlike_grad():
+    from isochrones.mags import interp_mag, interp_mag_and_grad
+
+    model_interp = toy.get_subset_interp(("Teff", "logg", "feh", "Mbol"))
+    bc_interp = toy.bc_grid.interp
+    i_mags = np.array([bc_interp.column_index[b] for b in "JHK"])
+    args = (
+        toy.param_index_order,
+        *[model_interp.column_index[c] for c in ("Teff", "logg", "feh", "Mbol")],
+        *model_interp.layout,
+        i_mags,
+        *bc_interp.layout,
+        toy.bc_Rv,
+    )
+
+    def values(p):
+        Teff, logg, feh, mags = interp_mag(p, *args)
+        return np.concatenate([[Teff, logg, feh], mags])
+
+    # Points inside grid cells, so that the finite differences don't cross cell boundaries
+    for pars in [[120.3, 9.13, -0.21, 98.0, 0.33], [301.7, 8.61, 0.12, 117.0, 0.71]]:
+        pars = np.array(pars)
+        Teff, logg, feh, mags, d_props, d_mags = interp_mag_and_grad(pars, *args)
+        assert np.allclose(np.concatenate([[Teff, logg, feh], mags]), values(pars))
+
+        grad = np.concatenate([d_props, d_mags])
+        for i in range(len(pars)):
+            eps = 1e-6 * max(abs(pars[i]), 1)
+            dp = np.zeros(len(pars))
+            dp[i] = eps
+            numerical = (values(pars + dp) - values(pars - dp)) / (2 * eps)
+            assert np.allclose(grad[:, i], numerical, rtol=1e-5, atol=1e-6)
+
+    for N, pars in [
+        (1, [120.3, 9.13, -0.21, 98.0, 0.33]),
+        (2, [301.7, 120.3, 9.13, -0.21, 98.0, 0.33]),
+        (3, [301.7, 201.4, 120.3, 8.61, 0.12, 117.0, 0.71]),
+    ]:
+        mod = BasicStarModel(toy, **props, N=N)
+        lnlike, grad = mod.lnlike_and_grad(pars)
+        assert np.isclose(lnlike, mod.lnlike(pars))
+
+        pars = np.array(pars, dtype=float)
+        for i in range(len(pars)):
+            eps = 1e-6 * max(abs(pars[i]), 1)
+            dp = np.zeros(len(pars))
+            dp[i] = eps
+            numerical = (mod.lnlike(pars + dp) - mod.lnlike(pars - dp)) / (2 * eps)
+            assert np.isclose(grad[i], numerical, rtol=1e-4, atol=1e-4)
+
+
+def test_lnpost_batch():
+    from isochrones.interp import set_parallel, _parallel
+
+    for N in [1, 2, 3]:
+        mod = BasicStarModel(toy, **props, N=N)
+        P = mod.sample_from_prior(20, values=True)
+        P[0, N] = 20.0  # out of age bounds
+        if N > 1:
+            P[1, :N] = np.sort(P[1, :N])  # EEPs in increasing order
+        else:
+            P[1, 0] = 500.0  # out of EEP bounds
+        lnpost = [mod.lnpost(p) for p in P]
+        assert np.allclose(mod.lnpost_batch(P), lnpost)
+
+        mod.compiled_lnpost = True
+        assert np.allclose([mod.lnpost(p) for p in P], lnpost)
+        assert np.allclose(mod.lnpost_batch(P), lnpost)
+        assert mod.lnpost_batch(P)[:2].tolist() == [-np.inf, -np.inf]
+
+        settings = dict(_parallel)
+        try:
+            set_parallel(threshold=1, num_threads=2)
+            assert np.allclose(mod.lnpost_batch(P), lnpost)
+        finally:
+            _parallel.update(settings)
+
+
+def test_compiled_lnpost():
+    from isochrones.likelihood import star_lnpost
+
+    for N in [1, 2, 3]:
+        mod = BasicStarModel(toy, **props, nu_max=(3050, 50), delta_nu=(190, 2), N=N)
+        mod.set_bounds(mass=(0.3, 1.2))
+        P = mod.sample_from_prior(20, values=True)
+        P[0, 0] = 20.0  # initial mass below the bounds of the mass prior
+        P[1, :N] = 390.0  # above them
+        P[1, N] = 8.0
+        if N > 1:
+            P[2, :N] = np.sort(P[2, :N])  # EEPs in increasing order
+        args = mod._lnpost_args()
+        for i, p in enumerate(P):
+            lnprior = mod.lnprior(p)
+            lnpost = star_lnpost(p, *args)
+            if i < (3 if N > 1 else 2):
+                assert lnprior == -np.inf
+            if np.isfinite(lnprior):
+                assert np.isclose(lnpost, lnprior + mod.lnlike(p))
+            else:
+                assert lnpost == -np.inf
+
+
+def test_multiple_stars():
+    from isochrones.utils import addmags
+    from isochrones.likelihood import star_lnlike, gauss_lnprob
+
+    bands = ["J", "H", "K"]
+    for N in [4, 5]:
+        mod = BasicStarModel(toy, **props, N=N)
+        P = mod.sample_from_prior(5, values=True)
+        assert (np.diff(P[:, :N], axis=1) <= 0).all()
+        assert np.isfinite([mod.lnprior(p) for p in P]).all()
+
+        args = mod._lnlike_args()
+        for pars in P:
+            # Unresolved magnitudes are the flux sum of the components; spectroscopy is of the primary
+            mags = [toy.interp_mag([pars[i]] + list(pars[N:]), bands)[3] for i in range(N)]
+            Teff, logg, feh = toy.interp_mag([pars[0]] + list(pars[N:]), bands)[:3]
+            lnlike = 0
+            for prop, model in zip(["Teff", "logg", "feh"] + bands, [Teff, logg, feh] + list(addmags(*mags))):
+                lnlike += gauss_lnprob(*props[prop], model)
+            assert np.isclose(star_lnlike(pars, *args), lnlike)
+
+
+def test_tree_lnlike():
+    from isochrones.starmodel import StarModel
+    from isochrones.observation import ObservationTree, Observation, Source
+
+    # Unresolved photometry of two systems, resolved by AO relative to the brighter one
+    observations = [Observation("2MASS", b, 4.0, sources=[Source(*props[b])]) for b in ["J", "H", "K"]]
+    ao_sources = [Source(0.0, 0.02, relative=True), Source(1.2, 0.05, separation=0.4, pa=30.0, relative=True)]
+    observations.append(Observation("AO", "K", 0.1, sources=ao_sources, relative=True))
+    tree = ObservationTree(observations)
+    tree.define_models(toy, N=[2, 1], index=[0, 1])
+    tree.add_spectroscopy(Teff=props["Teff"], logg=props["logg"])
+    tree.add_limit(label="1_0", logg=(4.0, None))
+    tree.add_parallax(props["parallax"])
+    tree.add_parallax((10.2, 0.5), system=1)
+    assert len(tree.systems) == 2
+    assert any(n.relative and n.reference is None for n in tree.get_obs_nodes())
+
+    for mod in [StarModel(toy, **props, N=2), StarModel(toy, obs=tree)]:
+        P = mod.sample_from_prior(20)
+        if mod.obs is tree:
+            # Evolved companion, below the logg limit
+            pardict = tree.p2pardict(P[0])
+            pardict["1_0"][0] = 390.0
+            P = np.concatenate([P, [tree.pardict2p(pardict)]])
+            assert mod.lnlike(P[-1]) == -np.inf
+        n_finite = 0
+        for p in P:
+            pardict = mod.obs.p2pardict(p)
+            model_values = {}
+            for star, pars in pardict.items():
+                Teff, logg, feh, mags = toy.interp_mag(pars, mod.bands)
+                model_values[star] = dict(Teff=Teff, logg=logg, feh=feh, **dict(zip(mod.bands, mags)))
+            lnlike = mod.obs.lnlike(pardict, model_values)
+            assert np.isclose(mod.lnlike(p), lnlike) or mod.lnlike(p) == lnlike
+            n_finite += np.isfinite(lnlike)
+        assert n_finite > 0
@@ -64,7 +64,7 @@ def addmags(*mags):
         return totmag
 
 
-@nb.jit(nopython=True)
+@nb.jit(nopython=True, cache=True)
 def fast_addmags(mags):
     """
     mags is list of magnitudes
@@ -93,7 +93,7 @@ def distance(pos0, pos1):
     return np.sqrt(dra ** 2 + ddec ** 2)
 
 
-@nb.jit(nopython=True)
+@nb.jit(nopython=True, cache=True)
 def trapz(y, x):
     n = len(y)
     tot = 0
@@ -105,7 +105,7 @@ def trapz(y, x):
     return tot
 
 
-@nb.jit(nopython=True)
+@nb.jit(nopython=True, cache=True)
 def polyval(p, x):
     N = len(p)
     result = 0
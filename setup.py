@@ -42,6 +42,7 @@ setup(
     scripts=[
         "scripts/starfit",
         "scripts/batch_starfit",
+        "scripts/mpi_starfit",
         "scripts/starmodel-select",
         "scripts/starfit-summarize",
         "scripts/isochrones-dartmouth_write_tri",